@@ -1,5 +1,7 @@
 import xml.etree.ElementTree as ET
+import io
 import os 
+import platform
 from pyshacl import validate
 from rdflib import *
 from os import *
@@ -8,10 +10,11 @@ import time
 
 folder_path = os.path.dirname(__file__) + '/'
         
-def ProProcessingStep1(file_name):
+def ProProcessingStep1(file_name, iterparse=False, write=True):
+    # file_name: the message in folder_path, or its parsed ElementTree, which
+    # is then enriched in place. Without write the tree is returned instead
+    # of being written to PreINVOIC.xml.
     file_namefull = folder_path + str(file_name)
-    preTree = ET.parse(file_namefull)
-    preRoot = preTree.getroot()
     val = -1
     val2 = 0
     mid = 0
@@ -67,22 +70,60 @@ def ProProcessingStep1(file_name):
     Group = Segments + DataElementGroup
     Elements = Segments + DataElementGroup + DataElement+ Groups + EANCOMStructureDataElements
     Elementse = ItemGruppe + DataElementGroup + DataElement + NIDgroups
+
+    # The parent of every element and, in the order they got their id (or
+    # mid), the elements carrying each (tag, id) and each Message mid: what
+    # .//{tag}[@id="..."]/.. and Message[@mid="..."] find, without searching
+    # the whole tree for every element
+    parentMap = {}
+    idIndex = {}
+    messageIndex = {}
+    # iterparse: explain elements added to an element that is still being
+    # parsed, appended (and visited) when it ends
+    pending = {}
+
+    def setId(element, value):
+        old = element.get("id")
+        if old == value:
+            return
+        indexed = idIndex.get((element.tag, old), [])
+        if element in indexed:
+            indexed.remove(element)
+        element.set("id", value)
+        idIndex.setdefault((element.tag, value), []).append(element)
+
+    def findParent(tag, FixId):
+        return parentMap[idIndex[(tag, FixId)][0]]
+
+    def addChild(parent, DataElementName):
+        added = ET.Element(str(DataElementName))
+        parentMap[added] = parent
+        if parent in pending:
+            pending[parent].append(added)
+        else:
+            parent.append(added)
+        return added
+
     def addExplainElement(DataElementName,DataElementText):
         FixId = elem.attrib['id']
-        added= ET.SubElement(preRoot.find(f'.//{elem.tag}[@id="{FixId}"]/..'), str(DataElementName))
+        added= addChild(findParent(elem.tag, FixId), DataElementName)
         added.text = str(DataElementText)
-        added.set("id", str(FixId))
+        setId(added, str(FixId))
         return added
 
     def addExplainMessageElement(DataElementName,DataElementText):
         Mids = elem.attrib['mid']
-        added= ET.SubElement(preRoot.find(f'Message[@mid="{Mids}"]'), str(DataElementName))
+        added= addChild(messageIndex[Mids], DataElementName)
         added.text = str(DataElementText)
         added.set("mid", str(Mids))
         return added  
 
+    elem = None
+    type = None
 
-    for elem in preTree.iter():
+    def visit(current):
+        nonlocal elem, val, val2, mid, group, org, details, type
+        elem = current
         if elem.tag == "Message": 
             details += 1
         if elem.tag in Segments:  
@@ -96,7 +137,7 @@ def ProProcessingStep1(file_name):
         if elem.tag in ["Message", "S_NAD", "S_LIN", "S_UNH" ]:
             elem.set("details", "Invoice"+ str(details))
         if elem.tag in Elements:
-            elem.set("id", str(val))
+            setId(elem, str(val))
         if elem.tag in ["G_Group_15", "S_ALC","D_AlcEx","G_Group_17","S_QTY", "G_Group18", "S_PCD", "D_5245","G_Group_19", "S_MOA","D_5025", "G_Group_20", "S_RTE", "G_Group_21",
                         "S_TAX", "S_MOA", "S_ALI", "G_Group_39", "G_Group_40", "S_PCD", "G_Group_41","G_Group_42", "S_TDT" ,"G_Group_38", "G_Group_51", 
                         "G_Group_1", "G_Group_29", "G_Group_49", "D_2005", "D_ReFu", "D_2380"]:
@@ -106,7 +147,7 @@ def ProProcessingStep1(file_name):
             elem.set('organisation', "Role"+str(org))
         if elem.tag in ParentSegment:  
             s = "S_"
-            parentname = preRoot.find(f'.//{elem.tag}[@id="{str(val)}"]/..').tag 
+            parentname = findParent(elem.tag, str(val)).tag 
             for x in range(len(s)): 
                 parentname = parentname.replace(s[x],"")    
             elem.set("parent",parentname)
@@ -118,6 +159,8 @@ def ProProcessingStep1(file_name):
                 elem.set("eancomstructure", "Structure"+str(eancomstructure))
             else:
                 elem.set("mid", "InvoiceDetail"+str(mid)) 
+                if elem.tag == "Message":
+                    messageIndex.setdefault(elem.attrib["mid"], elem)
         if elem.tag == "D_1153":
             if elem.text == "AAB":
                 addExplainElement("D_ReFu","Proforma_Rechnungsnummer") 
@@ -519,43 +562,164 @@ def ProProcessingStep1(file_name):
                 addExplainElement("D_Wae", "Euro")
             else: 
                 addExplainElement("D_Wae", elem.text+ "nicht_vorhanden")
+
+    if iterparse and not isinstance(file_name, ET.ElementTree):
+        with io.open(folder_path + 'PreINVOIC.xml', 'wb') as out:
+            _streamStep1(file_namefull, out, visit, parentMap, idIndex, messageIndex, pending)
+        return None
+
+    preTree = file_name if isinstance(file_name, ET.ElementTree) else ET.parse(file_namefull)
+    preRoot = preTree.getroot()
+    for parent in preRoot.iter():
+        for child in parent:
+            parentMap[child] = parent
+    for current in preTree.iter():
+        visit(current)
+    if not write:
+        return preTree
     return preTree.write(folder_path + 'PreINVOIC.xml')
 
 
-def ProProcessingStep2():
-    tree = ET.parse(folder_path + 'PreINVOIC.xml')
+def _streamStep1(file_namefull, out, visit, parentMap, idIndex, messageIndex, pending):
+    # ProProcessingStep1 over iterparse events for messages too large to hold
+    # as a whole: every child of the root (S_UNB, each Message, S_UNZ) is
+    # written out and dropped as soon as it is complete. Elements are visited
+    # in the same (document) order as preTree.iter() visits them, once their
+    # text has been read, and the output is the same.
+    stack = []
+    unvisited = None
+    complete = None
+    root = None
+    started = False
+
+    def startTag(element):
+        shell = ET.Element(element.tag, element.attrib)
+        shell.text = element.text
+        return ET.tostring(shell, short_empty_elements=False)[:-len(element.tag) - 3]
+
+    def writeChild(child):
+        out.write(ET.tostring(child))
+        root.remove(child)
+        for element in child.iter():
+            parentMap.pop(element, None)
+            indexed = idIndex.get((element.tag, element.get("id")), [])
+            if element in indexed:
+                indexed.remove(element)
+            if element.tag == "Message" and messageIndex.get(element.get("mid")) is element:
+                del messageIndex[element.get("mid")]
+
+    for event, current in ET.iterparse(file_namefull, events=("start", "end")):
+        # the text of the last element started, and the tail of the last
+        # one completed, are known by the next event
+        if unvisited is not None:
+            visit(unvisited)
+            unvisited = None
+        if complete is not None:
+            writeChild(complete)
+            complete = None
+        if event == "start":
+            if stack:
+                parentMap[current] = stack[-1]
+            else:
+                root = current
+            stack.append(current)
+            pending[current] = []
+            unvisited = current
+            continue
+
+        stack.pop()
+        queue = pending[current]
+        while queue:
+            added = queue.pop(0)
+            current.append(added)
+            visit(added)
+        del pending[current]
+        if len(stack) == 1:
+            if not started:
+                out.write(startTag(root))
+                started = True
+            complete = current
+
+    if not started:
+        out.write(ET.tostring(root))
+        return
+    for child in list(root):
+        writeChild(child)
+    out.write(f"</{root.tag}>".encode("us-ascii"))
+
+
+def ProProcessingStep2(tree=None, write=True):
+    # Enriches tree in place, or PreINVOIC.xml; as ProProcessingStep1
+    if tree is None:
+        tree = ET.parse(folder_path + 'PreINVOIC.xml')
     root = tree.getroot()
 
+    # What the helpers look up, indexed in one pass instead of searching the
+    # tree for every reference: the parent of every element, the first
+    # element (in document order, as root.find returns it) per tag and
+    # id/group, also per parent tag, and the Message per mid. Only
+    # explanation elements are added below and those are never looked up,
+    # so the index stays valid while the tree grows.
+    parentMap = {}
+    firstIndex = {}
+    messageIndex = {}
+    for element in root.iter():
+        for child in element:
+            parentMap[child] = element
+        if element is root:
+            continue
+        for name in ("id", "group"):
+            value = element.get(name)
+            if value is not None:
+                firstIndex.setdefault((None, element.tag, name, value), element)
+                firstIndex.setdefault((parentMap[element].tag, element.tag, name, value), element)
+    for element in root:
+        if element.tag == "Message":
+            messageIndex.setdefault(element.get("mid"), element)
+
+    def find(tag, name, value, parentTag=None):
+        # root.find(f'.//{parentTag}/{tag}[@{name}="{value}"]')
+        return firstIndex.get((parentTag, tag, name, str(value)))
+
+    def findParent(tag, name, value, parentTag=None):
+        # root.find(f'.//{parentTag}/{tag}[@{name}="{value}"]/..')
+        found = find(tag, name, value, parentTag)
+        return None if found is None else parentMap[found]
+
+    def findMessage(mid):
+        # root.find(f'Message[@mid="{mid}"]')
+        return messageIndex.get(str(mid))
+
     def addExplainSubjectD1004(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//D_1004[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_1004[@id="{FixIds}"]').text
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_1004", "id", FixIds) != None:
+            added.text =find("D_1004", "id", FixIds).text
     
     def addExplainSubjectDTM(DataElementName):
         nIds = elem.attrib['group']
         Ids = elem.attrib['id']
         if elem.text == "171":
-            added= ET.SubElement(root.find(f'.//{elem.tag}[@group="{nIds}"]/..'), str(DataElementName)+ "_"+ root.find(f'.//C_C506/D_ReFu[@group="{nIds}"]').text)
-            if root.find(f'.//C_C507/D_2380[@group="{nIds}"]') != None:    
-                added.text = root.find(f'.//C_C507/D_2380[@group="{nIds}"]').text
+            added= ET.SubElement(findParent(elem.tag, "group", nIds), str(DataElementName)+ "_"+ find("D_ReFu", "group", nIds, "C_C506").text)
+            if find("D_2380", "group", nIds, "C_C507") != None:    
+                added.text = find("D_2380", "group", nIds, "C_C507").text
         else:
-            added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{Ids}"]/..'), str(DataElementName))
-            if root.find(f'.//C_C507/D_2380[@id="{Ids}"]') != None:    
-                added.text = root.find(f'.//C_C507/D_2380[@id="{Ids}"]').text
+            added= ET.SubElement(findParent(elem.tag, "id", Ids), str(DataElementName))
+            if find("D_2380", "id", Ids, "C_C507") != None:    
+                added.text = find("D_2380", "id", Ids, "C_C507").text
     def addExplainMessageDTM(DataElementName):
         Ids = elem.attrib['id']
         mIds = elem.attrib['mid']
         nIds = elem.attrib['group']
         if elem.text == "171":
-            added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName)+ "_"+ root.find(f'.//C_C506/D_ReFu[@group="{nIds}"]').text)
-            if root.find(f'.//C_C507/D_2380[@group="{nIds}"]') != None:    
-                added.text = root.find(f'.//C_C507/D_2380[@group="{nIds}"]').text
+            added= ET.SubElement(findMessage(mIds), str(DataElementName)+ "_"+ find("D_ReFu", "group", nIds, "C_C506").text)
+            if find("D_2380", "group", nIds, "C_C507") != None:    
+                added.text = find("D_2380", "group", nIds, "C_C507").text
         else:
-            added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-            if root.find(f'.//C_C507/D_2380[@id="{Ids}"]') != None:    
-                added.text = root.find(f'.//C_C507/D_2380[@id="{Ids}"]').text
+            added= ET.SubElement(findMessage(mIds), str(DataElementName))
+            if find("D_2380", "id", Ids, "C_C507") != None:    
+                added.text = find("D_2380", "id", Ids, "C_C507").text
 
     def PositionOrMessageDTM(NewName):
         if parentgroupDTM in [ "Message", "GGroup1", "GGroup7", "GGroup8", "GGroup50" ]: 
@@ -568,11 +732,11 @@ def ProProcessingStep2():
         Mids = elem.attrib['mid'] 
         org = elem.attrib['organisation']
         if parentgroupRFF == "GGroup3" or parentgroupRFF == "GGroup29"  :    
-            added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))  
+            added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))  
         else:
-            added= ET.SubElement(root.find(f'Message[@mid="{Mids}"]'), str(DataElementName))
-        if root.find(f'.//C_C506/D_1154[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C506/D_1154[@id="{FixIds}"]').text 
+            added= ET.SubElement(findMessage(Mids), str(DataElementName))
+        if find("D_1154", "id", FixIds, "C_C506") != None:
+            added.text =find("D_1154", "id", FixIds, "C_C506").text 
             added.set("organisation", str(org))
 
     def PositionOrMessageNAD(NewName):
@@ -582,7 +746,7 @@ def ProProcessingStep2():
 
     def AgentRole(AttributName):
         pid = elem.attrib['id']
-        AgentRole = root.find(f'.//S_NAD[@id="{pid}"]')
+        AgentRole = find("S_NAD", "id", pid)
         AgentRole.set(str('agentRole'), str(AttributName + 'Role'))  
     
     def addNADattribut(AttributName):
@@ -590,74 +754,74 @@ def ProProcessingStep2():
         mIds = elem.attrib['mid']
         nIds = elem.attrib['nid']
         organisation = elem.attrib['organisation']
-        Message = root.find(f'Message[@mid="{mIds}"]')
+        Message = findMessage(mIds)
         Message.set(str(AttributName), str(organisation)) 
             
     def addNADGLN(DataElementName): 
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//C_C082/D_3039[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C082/D_3039[@id="{FixIds}"]').text
-            added.attrib = root.find(f'Message[@mid="{mIds}"]').attrib
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_3039", "id", FixIds, "C_C082") != None:
+            added.text =find("D_3039", "id", FixIds, "C_C082").text
+            added.attrib = findMessage(mIds).attrib
     
 
     def addExplainSubjectFII(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C088/D_3432[@id="{FixIds}"]') != None:
-            if root.find(f'.//C_C078/D_3194[@id="{FixIds}"]').text != None:
-                added.text =root.find(f'.//C_C088/D_3432[@id="{FixIds}"]').text + " - " +root.find(f'.//C_C078/D_3194[@id="{FixIds}"]').text 
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_3432", "id", FixIds, "C_C088") != None:
+            if find("D_3194", "id", FixIds, "C_C078").text != None:
+                added.text =find("D_3432", "id", FixIds, "C_C088").text + " - " +find("D_3194", "id", FixIds, "C_C078").text 
             else:
-                added.text =root.find(f'.//C_C088/D_3432[@id="{FixIds}"]').text
+                added.text =find("D_3432", "id", FixIds, "C_C088").text
 
     def addExplainSubjectFTX(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C108/D_4440[@id="{FixIds}"]') != None:
-            if root.find(f'.//C_C108/D_4440_2[@id="{FixIds}"]') != None:
-                if root.find(f'.//C_C108/D_4440_3[@id="{FixIds}"]') != None:
-                    if root.find(f'.//C_C108/D_4440_4[@id="{FixIds}"]') != None:
-                        added.text =root.find(f'.//C_C108/D_4440[@id="{FixIds}"]').text+ root.find(f'.//C_C108/D_4440_2[@id="{FixIds}"]').text + root.find(f'.//C_C108/D_4440_3[@id="{FixIds}"]').text+ root.find(f'.//C_C108/D_4440_4[@id="{FixIds}"]').text
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_4440", "id", FixIds, "C_C108") != None:
+            if find("D_4440_2", "id", FixIds, "C_C108") != None:
+                if find("D_4440_3", "id", FixIds, "C_C108") != None:
+                    if find("D_4440_4", "id", FixIds, "C_C108") != None:
+                        added.text =find("D_4440", "id", FixIds, "C_C108").text+ find("D_4440_2", "id", FixIds, "C_C108").text + find("D_4440_3", "id", FixIds, "C_C108").text+ find("D_4440_4", "id", FixIds, "C_C108").text
                     else:
-                        added.text =root.find(f'.//C_C108/D_4440[@id="{FixIds}"]').text+ root.find(f'.//C_C108/D_4440_2[@id="{FixIds}"]').text + root.find(f'.//C_C108/D_4440_3[@id="{FixIds}"]').text
+                        added.text =find("D_4440", "id", FixIds, "C_C108").text+ find("D_4440_2", "id", FixIds, "C_C108").text + find("D_4440_3", "id", FixIds, "C_C108").text
                 else:
-                    added.text =root.find(f'.//C_C108/D_4440[@id="{FixIds}"]').text + root.find(f'.//C_C108/D_4440_2[@id="{FixIds}"]').text 
+                    added.text =find("D_4440", "id", FixIds, "C_C108").text + find("D_4440_2", "id", FixIds, "C_C108").text 
             else:
-                added.text =root.find(f'.//C_C108/D_4440[@id="{FixIds}"]').text 
+                added.text =find("D_4440", "id", FixIds, "C_C108").text 
            
 
     def addExplainSubjectCTA(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C056/D_3412[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C056/D_3412[@id="{FixIds}"]').text 
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_3412", "id", FixIds, "C_C056") != None:
+            added.text =find("D_3412", "id", FixIds, "C_C056").text 
 
     def addExplainSubjectCOM(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//D_3148[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_3148[@id="{FixIds}"]').text  
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_3148", "id", FixIds) != None:
+            added.text =find("D_3148", "id", FixIds).text  
 
     def addExplainSubjectTOD(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//C_C100/D_4052[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C100/D_4052[@id="{FixIds}"]').text 
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_4052", "id", FixIds, "C_C100") != None:
+            added.text =find("D_4052", "id", FixIds, "C_C100").text 
 
     def addExplainSubjectMOA(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C516/D_5004[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C516/D_5004[@id="{FixIds}"]').text 
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_5004", "id", FixIds, "C_C516") != None:
+            added.text =find("D_5004", "id", FixIds, "C_C516").text 
             
     def addExplainMessageMOA(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//C_C516/D_5004[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C516/D_5004[@id="{FixIds}"]').text  
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_5004", "id", FixIds, "C_C516") != None:
+            added.text =find("D_5004", "id", FixIds, "C_C516").text  
 
     def PositionOrMessageMOA(NewName):
         if parentgroupMOA in ["GGroup19","GGroup48","GGroup50"]: 
@@ -669,58 +833,58 @@ def ProProcessingStep2():
     def addExplainSubjectC212(DataElementName):
         mIds = elem.attrib['mid']
         nIds = elem.attrib['nid']
-        Message = root.find(f'Message[@mid="{mIds}"]')
+        Message = findMessage(mIds)
         Message.set('Item', str(nIds))
         FixIds = elem.attrib['id']
         intFixID = int(FixIds)
-        if root.find(f'.//C_C212/D_7140[@id="{FixIds}"]') != None:
-            added= ET.SubElement(root.find(f'.//C_C212/D_7140[@id="{FixIds}"]/..'), str(DataElementName))
-            added.text =root.find(f'.//C_C212/D_7140[@id="{FixIds}"]').text 
-        elif root.find(f'.//C_C212_2/D_7140[@id="{FixIds}"]') != None:
-            added= ET.SubElement(root.find(f'.//C_C212/D_7140[@id="{str(intFixID -1)}"]/..'), str(DataElementName))
-            added.text =root.find(f'.//C_C212_2/D_7140[@id="{FixIds}"]').text 
-        elif root.find(f'.//C_C212_3/D_7140[@id="{FixIds}"]') != None:
-            added= ET.SubElement(root.find(f'.//C_C212/D_7140[@id="{str(intFixID -2)}"]/..'), str(DataElementName))
-            added.text =root.find(f'.//C_C212_3/D_7140[@id="{FixIds}"]').text
-        elif root.find(f'.//C_C212_4/D_7140[@id="{FixIds}"]') != None:
-            added= ET.SubElement(root.find(f'.//C_C212/D_7140[@id="{str(intFixID -3)}"]/..'), str(DataElementName))
-            added.text =root.find(f'.//C_C212_4/D_7140[@id="{FixIds}"]').text 
+        if find("D_7140", "id", FixIds, "C_C212") != None:
+            added= ET.SubElement(findParent("D_7140", "id", FixIds, "C_C212"), str(DataElementName))
+            added.text =find("D_7140", "id", FixIds, "C_C212").text 
+        elif find("D_7140", "id", FixIds, "C_C212_2") != None:
+            added= ET.SubElement(findParent("D_7140", "id", str(intFixID -1), "C_C212"), str(DataElementName))
+            added.text =find("D_7140", "id", FixIds, "C_C212_2").text 
+        elif find("D_7140", "id", FixIds, "C_C212_3") != None:
+            added= ET.SubElement(findParent("D_7140", "id", str(intFixID -2), "C_C212"), str(DataElementName))
+            added.text =find("D_7140", "id", FixIds, "C_C212_3").text
+        elif find("D_7140", "id", FixIds, "C_C212_4") != None:
+            added= ET.SubElement(findParent("D_7140", "id", str(intFixID -3), "C_C212"), str(DataElementName))
+            added.text =find("D_7140", "id", FixIds, "C_C212_4").text 
 
     def addExplainSubjectQTY(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'),"Menge"+ str(DataElementName))
-        if root.find(f'.//C_C186/D_6060[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C186/D_6060[@id="{FixIds}"]').text  
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds),"Menge"+ str(DataElementName))
+        if find("D_6060", "id", FixIds, "C_C186") != None:
+            added.text =find("D_6060", "id", FixIds, "C_C186").text  
 
     def addExplainSubjectQTY2(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C186/D_6060[@id="{FixIds}"]') != None:
-            if root.find(f'.//C_C186/D_QTYMaEinheit[@id="{FixIds}"]') != None:
-                added.text =root.find(f'.//C_C186/D_6060[@id="{FixIds}"]').text+ " "  + root.find(f'.//C_C186/D_QTYMaEinheit[@id="{FixIds}"]').text   
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_6060", "id", FixIds, "C_C186") != None:
+            if find("D_QTYMaEinheit", "id", FixIds, "C_C186") != None:
+                added.text =find("D_6060", "id", FixIds, "C_C186").text+ " "  + find("D_QTYMaEinheit", "id", FixIds, "C_C186").text   
             else:
-                added.text =root.find(f'.//C_C186/D_6060[@id="{FixIds}"]').text 
+                added.text =find("D_6060", "id", FixIds, "C_C186").text 
     
     def addExplainSubjectPRI(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//{elem.tag}[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C509/D_5118[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C509/D_5118[@id="{FixIds}"]').text  
+        added= ET.SubElement(findParent(elem.tag, "id", FixIds), str(DataElementName))
+        if find("D_5118", "id", FixIds, "C_C509") != None:
+            added.text =find("D_5118", "id", FixIds, "C_C509").text  
 
     def addExplainSubjectMEA(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//D_6311[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C502/D_MaDim[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//C_C502/D_MaDim[@id="{FixIds}"]').text  
+        added= ET.SubElement(findParent("D_6311", "id", FixIds), str(DataElementName))
+        if find("D_MaDim", "id", FixIds, "C_C502") != None:
+            added.text =find("D_MaDim", "id", FixIds, "C_C502").text  
 
     def addExplainSubjectMEA2(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//C_C174[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//C_C174/D_6314[@id="{FixIds}"]') != None:
-            if root.find(f'.//C_C174/D_MaEinheit[@id="{FixIds}"]') != None:
-                added.text =root.find(f'.//C_C174/D_6314[@id="{FixIds}"]').text +  " " + root.find(f'.//C_C174/D_MaEinheit[@id="{FixIds}"]').text 
+        added= ET.SubElement(findParent("C_C174", "id", FixIds), str(DataElementName))
+        if find("D_6314", "id", FixIds, "C_C174") != None:
+            if find("D_MaEinheit", "id", FixIds, "C_C174") != None:
+                added.text =find("D_6314", "id", FixIds, "C_C174").text +  " " + find("D_MaEinheit", "id", FixIds, "C_C174").text 
             else: 
-                added.text =root.find(f'.//C_C174/D_6314[@id="{FixIds}"]').text
+                added.text =find("D_6314", "id", FixIds, "C_C174").text
 
     def PositionOrMessageALC(NewName):
         if parentgroupALC in ["GGroup15"]: 
@@ -731,20 +895,20 @@ def ProProcessingStep2():
     def addExplainMessageALC(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//D_AlcRea[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_AlcRea[@id="{FixIds}"]').text
-        if root.find(f'.//D_7160[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_7160[@id="{FixIds}"]').text
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_AlcRea", "id", FixIds) != None:
+            added.text =find("D_AlcRea", "id", FixIds).text
+        if find("D_7160", "id", FixIds) != None:
+            added.text =find("D_7160", "id", FixIds).text
 
     def addExplainSubjectALC(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'.//D_5463[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//D_AlcRea[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_AlcRea[@id="{FixIds}"]').text
-        if root.find(f'.//D_7160[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_7160[@id="{FixIds}"]').text
+        added= ET.SubElement(findParent("D_5463", "id", FixIds), str(DataElementName))
+        if find("D_AlcRea", "id", FixIds) != None:
+            added.text =find("D_AlcRea", "id", FixIds).text
+        if find("D_7160", "id", FixIds) != None:
+            added.text =find("D_7160", "id", FixIds).text
 
     def PositionOrMessagePCD(NewName):
         if parentgroupPCD in ["GGroup40"]: 
@@ -757,65 +921,65 @@ def ProProcessingStep2():
     def addExplainSubjectPCD(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'.//C_C501/D_5245[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//D_5482[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_5482[@id="{FixIds}"]').text
+        added= ET.SubElement(findParent("D_5245", "id", FixIds, "C_C501"), str(DataElementName))
+        if find("D_5482", "id", FixIds) != None:
+            added.text =find("D_5482", "id", FixIds).text
     def addExplainSubjectPCD2(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'.//C_C501/D_5245[@id="{FixIds}"]/..'), str(DataElementName)+"Zahlungsbedingungen")
-        if root.find(f'.//D_5482[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_5482[@id="{FixIds}"]').text
+        added= ET.SubElement(findParent("D_5245", "id", FixIds, "C_C501"), str(DataElementName)+"Zahlungsbedingungen")
+        if find("D_5482", "id", FixIds) != None:
+            added.text =find("D_5482", "id", FixIds).text
     def addExplainMessagePCD(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//D_5482[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_5482[@id="{FixIds}"]').text
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_5482", "id", FixIds) != None:
+            added.text =find("D_5482", "id", FixIds).text
 
     def addExplainSubjectC112(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//C_C112/D_2152[@id="{FixIds}"]') != None:
-            if root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]') != None:
-                if root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]') != None:
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text =root.find(f'.//C_C112/D_2152[@id="{FixIds}"]').text + root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_2152", "id", FixIds, "C_C112") != None:
+            if find("ArtZeitspanne", "id", FixIds, "C_C112") != None:
+                if find("Zeitbezug", "id", FixIds, "C_C112") != None:
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text =find("D_2152", "id", FixIds, "C_C112").text + find("ArtZeitspanne", "id", FixIds, "C_C112").text + find("Zeitbezug", "id", FixIds, "C_C112").text + find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
-                        added.text =root.find(f'.//C_C112/D_2152[@id="{FixIds}"]').text + root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text
+                        added.text =find("D_2152", "id", FixIds, "C_C112").text + find("ArtZeitspanne", "id", FixIds, "C_C112").text + find("Zeitbezug", "id", FixIds, "C_C112").text
                 else: 
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text =root.find(f'.//C_C112/D_2152[@id="{FixIds}"]').text + root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text =find("D_2152", "id", FixIds, "C_C112").text + find("ArtZeitspanne", "id", FixIds, "C_C112").text + find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
-                        added.text =root.find(f'.//C_C112/D_2152[@id="{FixIds}"]').text + root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text
+                        added.text =find("D_2152", "id", FixIds, "C_C112").text + find("ArtZeitspanne", "id", FixIds, "C_C112").text
             else: 
-                if root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]') != None:
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text =root.find(f'.//C_C112/D_2152[@id="{FixIds}"]').text  + root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+                if find("Zeitbezug", "id", FixIds, "C_C112") != None:
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text =find("D_2152", "id", FixIds, "C_C112").text  + find("Zeitbezug", "id", FixIds, "C_C112").text + find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
-                        added.text =root.find(f'.//C_C112/D_2152[@id="{FixIds}"]').text  + root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text 
+                        added.text =find("D_2152", "id", FixIds, "C_C112").text  + find("Zeitbezug", "id", FixIds, "C_C112").text 
         else: 
-            if root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]') != None:
-                if root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]') != None:
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text = root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+            if find("ArtZeitspanne", "id", FixIds, "C_C112") != None:
+                if find("Zeitbezug", "id", FixIds, "C_C112") != None:
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text = find("ArtZeitspanne", "id", FixIds, "C_C112").text + find("Zeitbezug", "id", FixIds, "C_C112").text + find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
-                        added.text = root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text
+                        added.text = find("ArtZeitspanne", "id", FixIds, "C_C112").text + find("Zeitbezug", "id", FixIds, "C_C112").text
                 else: 
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text = root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text = find("ArtZeitspanne", "id", FixIds, "C_C112").text + find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
-                        added.text = root.find(f'.//C_C112/ArtZeitspanne[@id="{FixIds}"]').text 
+                        added.text = find("ArtZeitspanne", "id", FixIds, "C_C112").text 
             else: 
-                if root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]') != None:
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text = root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text + root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+                if find("Zeitbezug", "id", FixIds, "C_C112") != None:
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text = find("Zeitbezug", "id", FixIds, "C_C112").text + find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
-                        added.text = root.find(f'.//C_C112/Zeitbezug[@id="{FixIds}"]').text
+                        added.text = find("Zeitbezug", "id", FixIds, "C_C112").text
                 else: 
-                    if root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]') != None:
-                        added.text = root.find(f'.//C_C112/Zahlungsbezugstermin[@id="{FixIds}"]').text 
+                    if find("Zahlungsbezugstermin", "id", FixIds, "C_C112") != None:
+                        added.text = find("Zahlungsbezugstermin", "id", FixIds, "C_C112").text 
                     else: 
                         None
                    
@@ -824,54 +988,54 @@ def ProProcessingStep2():
         FixIds1 = str(int(elem.attrib['id'])+1)
         FixIds2 = str(int(elem.attrib['id'])+2)
         FixIds3 = str(int(elem.attrib['id'])+3)
-        if root.find(f'.//C_C212[@id="{FixIds1}"]/..') != None:
-            added= ET.SubElement(root.find(f'.//C_C212[@id="{FixIds1}"]/..'), str(DataElementName))
-            if root.find(f'.//D_EC212[@id="{FixIds1}"]') != None:
-                added.text =root.find(f'.//D_EC212[@id="{FixIds1}"]').text 
-        if root.find(f'.//C_C212_2[@id="{FixIds2}"]/..') != None:
-            added= ET.SubElement(root.find(f'.//C_C212_2[@id="{FixIds2}"]/..'), str(DataElementName))
-            if root.find(f'.//D_EC212[@id="{FixIds2}"]') != None:
-                added.text =root.find(f'.//D_EC212[@id="{FixIds2}"]').text
-        if root.find(f'.//C_C212_3[@id="{FixIds3}"]/..') != None:
-            added= ET.SubElement(root.find(f'.//C_C212_3[@id="{FixIds3}"]/..'), str(DataElementName))
-            if root.find(f'.//D_EC212[@id="{FixIds3}"]') != None:
-                added.text =root.find(f'.//D_EC212[@id="{FixIds3}"]').text
+        if findParent("C_C212", "id", FixIds1) != None:
+            added= ET.SubElement(findParent("C_C212", "id", FixIds1), str(DataElementName))
+            if find("D_EC212", "id", FixIds1) != None:
+                added.text =find("D_EC212", "id", FixIds1).text 
+        if findParent("C_C212_2", "id", FixIds2) != None:
+            added= ET.SubElement(findParent("C_C212_2", "id", FixIds2), str(DataElementName))
+            if find("D_EC212", "id", FixIds2) != None:
+                added.text =find("D_EC212", "id", FixIds2).text
+        if findParent("C_C212_3", "id", FixIds3) != None:
+            added= ET.SubElement(findParent("C_C212_3", "id", FixIds3), str(DataElementName))
+            if find("D_EC212", "id", FixIds3) != None:
+                added.text =find("D_EC212", "id", FixIds3).text
     def addExplainSubject43475(DataElementName):
         FixIds = elem.attrib['id']
         FixIds4 = str(int(elem.attrib['id']) -1)
         FixIds5 = str(int(elem.attrib['id']) -2)
-        if root.find(f'.//C_C212[@id="{FixIds4}"]/..') != None:
-            if root.find(f'.//D_4347[@id="{FixIds5}"]/..') == None: 
-                added= ET.SubElement(root.find(f'.//C_C212[@id="{FixIds4}"]/..'), str(DataElementName))
-                if root.find(f'.//D_EC212[@id="{FixIds4}"]') != None:
-                    added.text =root.find(f'.//D_EC212[@id="{FixIds4}"]').text
-        if root.find(f'.//C_C212_2[@id="{FixIds4}"]/..') != None:
-            if root.find(f'.//D_4347[@id="{FixIds5}"]/..') == None:
-                added= ET.SubElement(root.find(f'.//C_C212[@id="{FixIds}"]/..'), str(DataElementName))
-                if root.find(f'.//D_EC212[@id="{FixIds}"]') != None:
-                    added.text =root.find(f'.//D_EC212[@id="{FixIds4}"]').text
-        if root.find(f'.//C_C212_3[@id="{FixIds4}"]/..') != None:
-            if root.find(f'.//D_4347[@id="{FixIds5}"]/..') == None:
-                added= ET.SubElement(root.find(f'.//C_C212[@id="{FixIds}"]/..'), str(DataElementName))
-                if root.find(f'.//D_EC212[@id="{FixIds}"]') != None:
-                    added.text =root.find(f'.//D_EC212[@id="{FixIds4}"]').text
-        if root.find(f'.//C_C212_4[@id="{FixIds4}"]/..') != None:
-            if root.find(f'.//D_4347[@id="{FixIds5}"]/..') == None:
-                added= ET.SubElement(root.find(f'.//C_C212[@id="{FixIds}"]/..'), str(DataElementName))
-                if root.find(f'.//D_EC212[@id="{FixIds}"]') != None:
-                    added.text =root.find(f'.//D_EC212[@id="{FixIds4}"]').text      
+        if findParent("C_C212", "id", FixIds4) != None:
+            if findParent("D_4347", "id", FixIds5) == None: 
+                added= ET.SubElement(findParent("C_C212", "id", FixIds4), str(DataElementName))
+                if find("D_EC212", "id", FixIds4) != None:
+                    added.text =find("D_EC212", "id", FixIds4).text
+        if findParent("C_C212_2", "id", FixIds4) != None:
+            if findParent("D_4347", "id", FixIds5) == None:
+                added= ET.SubElement(findParent("C_C212", "id", FixIds), str(DataElementName))
+                if find("D_EC212", "id", FixIds) != None:
+                    added.text =find("D_EC212", "id", FixIds4).text
+        if findParent("C_C212_3", "id", FixIds4) != None:
+            if findParent("D_4347", "id", FixIds5) == None:
+                added= ET.SubElement(findParent("C_C212", "id", FixIds), str(DataElementName))
+                if find("D_EC212", "id", FixIds) != None:
+                    added.text =find("D_EC212", "id", FixIds4).text
+        if findParent("C_C212_4", "id", FixIds4) != None:
+            if findParent("D_4347", "id", FixIds5) == None:
+                added= ET.SubElement(findParent("C_C212", "id", FixIds), str(DataElementName))
+                if find("D_EC212", "id", FixIds) != None:
+                    added.text =find("D_EC212", "id", FixIds4).text      
 
     def addExplainSubjectTAX(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//C_C243[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//D_5278[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_5278[@id="{FixIds}"]').text
+        added= ET.SubElement(findParent("C_C243", "id", FixIds), str(DataElementName))
+        if find("D_5278", "id", FixIds) != None:
+            added.text =find("D_5278", "id", FixIds).text
     def addExplainMessageTAX(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//D_5278[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_5278[@id="{FixIds}"]').text
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_5278", "id", FixIds) != None:
+            added.text =find("D_5278", "id", FixIds).text
     def PositionOrMessageTAX(NewName):
         if parentgroupTAX == "GGroup48" or parentgroupTAX == "GGroup50": 
                 addExplainMessageTAX(str(NewName))
@@ -880,22 +1044,22 @@ def ProProcessingStep2():
 
     def addExplainSubjectCUX(DataElementName):
         FixIds = elem.attrib['id']
-        added= ET.SubElement(root.find(f'.//C_C504[@id="{FixIds}"]/..'), str(DataElementName))
-        if root.find(f'.//D_Wae[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_Wae[@id="{FixIds}"]').text
+        added= ET.SubElement(findParent("C_C504", "id", FixIds), str(DataElementName))
+        if find("D_Wae", "id", FixIds) != None:
+            added.text =find("D_Wae", "id", FixIds).text
     def addExplainMessageCUX(DataElementName):
         FixIds = elem.attrib['id']
         mIds = elem.attrib['mid']
-        added= ET.SubElement(root.find(f'Message[@mid="{mIds}"]'), str(DataElementName))
-        if root.find(f'.//D_Wae[@id="{FixIds}"]') != None:
-            added.text =root.find(f'.//D_Wae[@id="{FixIds}"]').text
+        added= ET.SubElement(findMessage(mIds), str(DataElementName))
+        if find("D_Wae", "id", FixIds) != None:
+            added.text =find("D_Wae", "id", FixIds).text
     
     for elem in tree.iter():
         if elem.tag == "D_1004":
             addExplainSubjectD1004("Dokumentennummer")
         if elem.tag == "D_2005":
-            parentDTM = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
-            parentgroupDTM =(root.find(f'.//{parentDTM.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentDTM = findParent(elem.tag, "id", elem.attrib["id"])
+            parentgroupDTM =(findParent(parentDTM.tag, "id", elem.attrib["id"]).attrib["parent"])
             if elem.text == "2":
                 PositionOrMessageDTM("geforderter_Liefertermin")
             elif elem.text == "3":
@@ -935,7 +1099,7 @@ def ProProcessingStep2():
             else: 
                 PositionOrMessageDTM("nicht_vorhanden")
         if elem.tag == "D_3035":
-            parentNAD = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
+            parentNAD = findParent(elem.tag, "id", elem.attrib["id"])
             parentgroupNAD = parentNAD.attrib["parent"]
             if elem.text == "AB":
                 PositionOrMessageNAD("Verkaufs_Agent")
@@ -1005,8 +1169,8 @@ def ProProcessingStep2():
             else: 
                 PositionOrMessageNAD("nicht_vorhanden")
         if elem.tag == "D_1153":
-            parentRFF = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
-            parentgroupRFF =(root.find(f'.//{parentRFF.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentRFF = findParent(elem.tag, "id", elem.attrib["id"])
+            parentgroupRFF =(findParent(parentRFF.tag, "id", elem.attrib["id"]).attrib["parent"])
             if elem.text == "AAB":
                 PositionOrMessageRFF("Proforma_Rechnungsnummer") 
             elif elem.text == "AAJ":
@@ -1158,12 +1322,12 @@ def ProProcessingStep2():
                 addExplainSubjectTOD("nicht_vorhanden")
         if elem.tag == "D_5025":
             group = elem.attrib['group']
-            parentMOA = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
-            parentgroupMOA =(root.find(f'.//{parentMOA.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentMOA = findParent(elem.tag, "id", elem.attrib["id"])
+            parentgroupMOA =(findParent(parentMOA.tag, "id", elem.attrib["id"]).attrib["parent"])
             if elem.text == "1":
                 PositionOrMessageMOA("Umsatzsteuer_erster_Wert")
             elif elem.text == "8":
-                PositionOrMessageMOA( root.find(f'.//D_AlcEx[@group="{group}"]').text + "sbetrag") 
+                PositionOrMessageMOA( find("D_AlcEx", "group", group).text + "sbetrag") 
             elif elem.text == "9":
                 PositionOrMessageMOA("Faelliger_Betrag_oder_zahlbarerBetrag")
             elif elem.text == "12":
@@ -1325,7 +1489,7 @@ def ProProcessingStep2():
             else: 
                 addExplainSubjectMEA2("nicht_vorhanden")
         if elem.tag == "D_5463":
-            parentgroupALC = (root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentgroupALC = (findParent(elem.tag, "id", elem.attrib["id"]).attrib["parent"])
             if elem.text == "A":
                 PositionOrMessageALC("Abschlag")
             elif elem.text == "C":
@@ -1336,14 +1500,14 @@ def ProProcessingStep2():
                 PositionOrMessageALC("nicht_vorhanden")
         if elem.tag == "D_5245":
             group = elem.attrib['group']
-            parentPCD = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
-            parentgroupPCD =(root.find(f'.//{parentPCD.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentPCD = findParent(elem.tag, "id", elem.attrib["id"])
+            parentgroupPCD =(findParent(parentPCD.tag, "id", elem.attrib["id"]).attrib["parent"])
             if elem.text == "1":
                 PositionOrMessagePCD("AbschlagProzentsatz")
             elif elem.text == "2":
                 PositionOrMessagePCD("ZuschlagProzentsatz")
             elif elem.text == "3":
-                surdis = root.find(f'.//D_AlcEx[@group="{group}"]').text
+                surdis = find("D_AlcEx", "group", group).text
                 PositionOrMessagePCD( str(surdis)+"Prozentsatz")
             elif elem.text == "7":
                 PositionOrMessagePCD("RechnungsProzentsatz")
@@ -1369,11 +1533,11 @@ def ProProcessingStep2():
         if elem.tag == "D_5305":
             if elem.text == "E":
                 FixIds = elem.attrib['id']
-                added = ET.SubElement(root.find(f'.//C_C243[@id="{FixIds}"]'), "D_5278")
+                added = ET.SubElement(find("C_C243", "id", FixIds), "D_5278")
                 added.text == "0"
         if elem.tag == "D_5153":
-            parentTAX = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
-            parentgroupTAX =(root.find(f'.//{parentTAX.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentTAX = findParent(elem.tag, "id", elem.attrib["id"])
+            parentgroupTAX =(findParent(parentTAX.tag, "id", elem.attrib["id"]).attrib["parent"])
             if elem.text == "GST":
                 PositionOrMessageTAX("Waren_Dienstleistungssteuer")
             elif elem.text == "VAT":
@@ -1392,17 +1556,22 @@ def ProProcessingStep2():
             else: 
                 addExplainMessageCUX("nicht_vorhanden")
         if elem.tag == "D_6347":
-            parentCUX = root.find(f'.//{elem.tag}[@id="{elem.attrib["id"]}"]/..')
-            parentgroupCUX =(root.find(f'.//{parentCUX.tag}[@id="{elem.attrib["id"]}"]/..').attrib["parent"])
+            parentCUX = findParent(elem.tag, "id", elem.attrib["id"])
+            parentgroupCUX =(findParent(parentCUX.tag, "id", elem.attrib["id"]).attrib["parent"])
             if parentgroupCUX == "GGroup7":
                 addExplainMessageCUX("Waehrung")
             else: 
                 addExplainSubjectCUX("Waehrung")
         
+    if not write:
+        return tree
     return tree.write(folder_path + 'INVOIC1.xml')
 
-def ProProcessingStep3():
-    tree1 = ET.parse(folder_path +'INVOIC1.xml')
+def ProProcessingStep3(tree1=None, write=True):
+    # Enriches tree1 in place, or INVOIC1.xml; returns the result of writing
+    # INVOIC2.xml (or the tree, without write) and the process to validate
+    if tree1 is None:
+        tree1 = ET.parse(folder_path +'INVOIC1.xml')
     root1 = tree1.getroot()
 
     def addProcess():
@@ -1433,9 +1602,22 @@ def ProProcessingStep3():
         if elem.tag == "ProcessIdentification":
             process = elem.text 
         
+    if not write:
+        return (tree1, process)
     return (tree1.write(folder_path + 'INVOIC2.xml'),process)
 
 
+def ProProcessing(file_name):
+    # ProProcessingStep1-3 on one tree in memory: the message is parsed once
+    # and only INVOIC2.xml, which the mapping reads, is written. Returns the
+    # enriched tree and the process to validate.
+    tree = ProProcessingStep1(file_name, write=False)
+    ProProcessingStep2(tree, write=False)
+    tree, process = ProProcessingStep3(tree, write=False)
+    tree.write(folder_path + 'INVOIC2.xml')
+    return (tree, process)
+
+
 def yarrrmlparser_bash():
     p = Popen([folder_path + 'yarrrmlparser.sh'], stdout = PIPE , stderr = PIPE)
     p.communicate()
@@ -1481,3 +1663,57 @@ def validates(process):
 
     return v_text
 
+
+
+class PipelineResult:
+    # What one run of the pipeline on a message has produced so far, handed
+    # from stage to stage: the enriched tree, the process to validate
+    # against, the validation report and the seconds each stage took. A
+    # stage that has run is not run again.
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.tree = None
+        self.process = None
+        self.report = None
+        self.timings = {}
+
+    def run(self, stage, function):
+        if stage not in self.timings:
+            start = time.perf_counter()
+            function(self)
+            self.timings[stage] = time.perf_counter() - start
+        return self
+
+
+def mappingTools():
+    # yarrrml-parser and RMLMapper for this platform
+    if platform.system() == "Windows":
+        return yarrrmlparser_batch, rmlmapper_batch
+    if platform.system() in ["Darwin", "Linux"]:
+        return yarrrmlparser_bash, rmlmapper_bash
+    raise RuntimeError("Unknown system")
+
+
+def enrichStage(result):
+    result.tree, result.process = ProProcessing(result.file_name)
+
+def yarrrmlStage(result):
+    mappingTools()[0]()
+
+def rmlStage(result):
+    mappingTools()[1]()
+
+def validationStage(result):
+    result.report = validates(result.process)
+
+
+def runPipeline(file_name):
+    # Enrichment, mapping and validation of one message, each stage once
+    result = PipelineResult(file_name)
+    mappingTools()  # fail before any work on an unknown platform
+    result.run("enrichment", enrichStage)
+    result.run("yarrrml", yarrrmlStage)
+    result.run("rml", rmlStage)
+    result.run("validation", validationStage)
+    return result
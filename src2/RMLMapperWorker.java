@@ -0,0 +1,125 @@
+// RMLMapperWorker.java
+//
+// Long-lived RMLMapper process driven by rmlmapper_worker.py, so the JVM is
+// started (and its JIT warmed up) once instead of once per invoice. Reads one
+// request per line from stdin and answers each with one line on stdout:
+//
+//   PING                                            -> PONG
+//   MAP <tab> base dir <tab> mapping <tab> output   -> OK | ERR <message>
+//
+// Run in source-file mode (Java 11+) with the RMLMapper jar on the class path:
+//   java -Djava.security.manager=allow -cp rmlmapper-6.1.3-r367-all.jar RMLMapperWorker.java
+//
+// RMLMapper's command line entry point calls System.exit when a mapping
+// fails, which would end the worker. A security manager turns the exit into
+// an exception while a mapping runs; Java 18 to 23 only allow installing one
+// with -Djava.security.manager=allow (Java 12+ know the value, which Java 11
+// does not need). Where none can be installed (Java 24+), an exit still ends
+// the worker and rmlmapper_worker.py starts a new one.
+
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+
+public class RMLMapperWorker {
+
+    /** Thrown instead of exiting the JVM while a mapping runs. */
+    static class ExitBlocked extends SecurityException {
+        final int status;
+
+        ExitBlocked(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    /** Blocks System.exit while armed and permits everything else. */
+    static class ExitTrap extends SecurityManager {
+        volatile boolean armed;
+
+        @Override
+        public void checkExit(int status) {
+            if (armed) {
+                throw new ExitBlocked(status);
+            }
+        }
+
+        @Override
+        public void checkPermission(Permission perm) {
+        }
+
+        @Override
+        public void checkPermission(Permission perm, Object context) {
+        }
+    }
+
+    static ExitTrap exitTrap;
+
+    public static void main(String[] args) throws Exception {
+        PrintStream replies = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        // RMLMapper logs to stdout; keep it out of the replies
+        System.setOut(System.err);
+        try {
+            ExitTrap trap = new ExitTrap();
+            System.setSecurityManager(trap);
+            exitTrap = trap;
+        } catch (UnsupportedOperationException | SecurityException e) {
+            System.err.println("RMLMapperWorker: cannot block System.exit: " + e);
+        }
+
+        // The command line entry point, with the directory relative sources
+        // (the enriched XML) are resolved against
+        Method mapper = Class.forName("be.ugent.rml.cli.Main").getMethod("main", String[].class, String.class);
+
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        replies.println("READY");
+        String line;
+        while ((line = requests.readLine()) != null) {
+            String[] request = line.split("\t", -1);
+            if (request[0].equals("PING")) {
+                replies.println("PONG");
+            } else if (request[0].equals("MAP") && request.length == 4) {
+                replies.println(map(mapper, request[1], request[2], request[3]));
+            } else {
+                replies.println("ERR bad request");
+            }
+        }
+    }
+
+    static String map(Method mapper, String baseDir, String mapping, String output) {
+        File outputFile = new File(output);
+        outputFile.delete();
+        if (exitTrap != null) {
+            exitTrap.armed = true;
+        }
+        try {
+            mapper.invoke(null, new String[] {"-s", "turtle", "-m", mapping, "-o", output}, baseDir);
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (!(cause instanceof ExitBlocked)) {
+                return "ERR " + oneLine(cause);
+            }
+            if (((ExitBlocked) cause).status != 0) {
+                return "ERR RMLMapper exited with status " + ((ExitBlocked) cause).status;
+            }
+        } catch (Exception e) {
+            return "ERR " + oneLine(e);
+        } finally {
+            if (exitTrap != null) {
+                exitTrap.armed = false;
+            }
+        }
+        return outputFile.isFile() ? "OK" : "ERR no output written";
+    }
+
+    static String oneLine(Throwable e) {
+        return String.valueOf(e).replace('\n', ' ').replace('\r', ' ');
+    }
+}
@@ -0,0 +1,3 @@
+# Benchmarks for the EDIFACT-VAL pipeline. Run the modules from src2, e.g.
+#   python -m benchmark.converter ../example/Anonymized.edi
+#   python -m benchmark.suite --check
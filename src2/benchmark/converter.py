@@ -0,0 +1,61 @@
+# converter.py
+#
+# Micro-benchmark for the EDIFACT to enriched XML converter: tokenizes and
+# converts one interchange repeatedly and reports segments per second.
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edifact_tokenizer import SegmentTokenizer
+from general_edifact_to_enriched_xml import EDIFACTToEnrichedXMLConverter, folder_path
+from rml_engine import GraphSink, load_mapping
+
+default_input = os.path.join(folder_path, os.pardir, "example", "Anonymized.edi")
+
+
+def run(edi_data, repeat, make_sink=None):
+    """Best wall time of `repeat` conversions, in seconds."""
+    best = float("inf")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            sink = make_sink() if make_sink else None
+            start = time.perf_counter()
+            EDIFACTToEnrichedXMLConverter(edi_data, sink=sink).convert()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converter segments/s micro-benchmark")
+    parser.add_argument("input", nargs="?", default=default_input)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--graph", action="store_true",
+                        help="convert straight to RDF instead of building XML")
+    args = parser.parse_args(argv)
+
+    with io.open(args.input, encoding="utf-8") as f:
+        edi_data = f.read()
+    segments = sum(1 for _ in SegmentTokenizer(edi_data))
+
+    make_sink = None
+    if args.graph:
+        # ill-typed literals in the data are reported by rdflib on every run
+        logging.getLogger("rdflib.term").setLevel(logging.CRITICAL)
+        mapping = load_mapping()
+        make_sink = lambda: GraphSink(mapping)
+
+    best = run(edi_data, args.repeat, make_sink)
+    mode = "graph" if args.graph else "xml"
+    print(f"{os.path.basename(args.input)} ({mode}): {segments} segments, "
+          f"best {best * 1000:.3f} ms, {segments / best:,.0f} segments/s")
+
+
+if __name__ == "__main__":
+    main()
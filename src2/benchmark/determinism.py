@@ -0,0 +1,81 @@
+# determinism.py
+#
+# Checks that the validation report does not depend on PYTHONHASHSEED: runs
+# edifact-val.py on the example interchange in a fresh interpreter per seed
+# and fails (exit status 1) if the reports differ or do not have the expected
+# number of results. pyshacl's SPARQL constraints see the data graph in
+# insertion order, and before the graph was handed over in canonical order
+# the float sum of :SumNetPrice gave 14 or 15 results depending on the seed.
+#
+#   python -m benchmark.determinism
+#   python -m benchmark.determinism --seeds 0 1 2 3 4 5 --shacl-engine native
+
+import argparse
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+folder_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_input = os.path.join(folder_path, os.pardir, "example", "Anonymized.edi")
+
+# Results of ProcessExample on example/Anonymized.edi
+EXPECTED_RESULTS = 14
+
+
+def run_report(edi_file, seed, output_dir, process, options):
+    """The validation report text of edifact-val.py run with PYTHONHASHSEED=seed."""
+    env = dict(os.environ, PYTHONHASHSEED=str(seed))
+    command = [sys.executable, os.path.join(folder_path, "edifact-val.py"), edi_file,
+               "--output-dir", output_dir, "--workers", "1", "--process", process] + options
+    subprocess.run(command, cwd=folder_path, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    name = os.path.splitext(os.path.basename(edi_file))[0]
+    with io.open(os.path.join(output_dir, f"{name}_{process}_validation_report.ttl"), encoding="utf-8") as f:
+        return f.read()
+
+
+def result_count(report):
+    """The number in the 'Results (n):' line of a report, or None."""
+    match = re.search(r"^Results \((\d+)\):", report, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the validation report does not depend on PYTHONHASHSEED")
+    parser.add_argument("input", nargs="?", default=default_input)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2, 3, 4, 5])
+    parser.add_argument("--expected", type=int, default=EXPECTED_RESULTS,
+                        help="number of results every report must have")
+    parser.add_argument("--process", default="ProcessExample")
+    parser.add_argument("--inference", choices=["rdfs", "precomputed", "none"], default="rdfs")
+    parser.add_argument("--shacl-engine", choices=["pyshacl", "native"], default="pyshacl")
+    parser.add_argument("--no-split", action="store_true")
+    args = parser.parse_args(argv)
+
+    options = ["--inference", args.inference, "--shacl-engine", args.shacl_engine]
+    if args.no_split:
+        options.append("--no-split")
+    edi_file = os.path.abspath(args.input)
+    reports = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for seed in args.seeds:
+            reports[seed] = run_report(edi_file, seed, os.path.join(tmp, str(seed)), args.process, options)
+            print(f"PYTHONHASHSEED={seed}: {result_count(reports[seed])} results")
+
+    failures = [f"PYTHONHASHSEED={seed}: {result_count(report)} results, expected {args.expected}"
+                for seed, report in reports.items() if result_count(report) != args.expected]
+    first = args.seeds[0]
+    failures += [f"PYTHONHASHSEED={seed}: report differs from PYTHONHASHSEED={first}"
+                 for seed, report in reports.items() if report != reports[first]]
+    for failure in failures:
+        print("Failure:", failure)
+    if failures:
+        raise SystemExit(1)
+    print(f"Identical reports with {args.expected} results for {len(args.seeds)} seeds")
+
+
+if __name__ == "__main__":
+    main()
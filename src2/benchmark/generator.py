@@ -0,0 +1,192 @@
+# generator.py
+#
+# Synthetic INVOIC interchanges for the benchmarks, built from the segments
+# of a real one (example/Anonymized.edi by default). The size is scaled
+# along the dimensions the pipeline cost depends on: messages per
+# interchange, LIN line items per message, NAD parties per message,
+# allowance/charge groups (TAX, ALC, MOA) per line item and the characters
+# of free text (FTX) per message. The output only depends on the template
+# and the parameters, so a benchmark run can be reproduced anywhere.
+
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edifact_tokenizer import split_interchange, segment_tag
+from general_edifact_to_enriched_xml import folder_path
+
+default_template = os.path.join(folder_path, os.pardir, "example", "Anonymized.edi")
+
+# Party qualifiers (D_3035) for parties beyond those of the template
+EXTRA_ROLES = ("PE", "II", "UC", "OB", "CO", "DL", "PR", "SE")
+
+# FTX text components are an..512, at most five per segment
+FTX_COMPONENT = 512
+FTX_COMPONENTS = 5
+FILLER = "Synthetic free text for the EDIFACT-VAL benchmarks. "
+
+
+class InvoiceTemplate:
+    """
+    The parts of a template interchange a synthetic one is assembled from:
+    the message head (UNH up to the first NAD), the party groups (NAD with
+    its RFF), the segments between parties and line items (CUX, PAT, ...),
+    the line items split into their own segments and their allowance/charge
+    group (from TAX on), and the summary section (UNS up to UNT).
+    """
+
+    def __init__(self, edi_data):
+        interchange = split_interchange(edi_data)
+        if not interchange.messages:
+            raise ValueError("template has no UNH..UNT message")
+        self.una = interchange.tokenizer.una or ""
+        self.service = interchange.tokenizer.service
+        self.header = interchange.header
+        self.trailer = interchange.trailer
+        self.parties, self.items = [], []
+        first = interchange.messages[0]
+        self.head, self.middle, self.summary = [], [], []
+        section = self.head
+        for segment in first[:-1]:
+            tag = self.tag(segment)
+            if tag == "NAD":
+                self.parties.append([])
+                section = self.parties[-1]
+            elif tag == "LIN":
+                break
+            elif section is not self.head and tag not in ("RFF", "CTA", "COM"):
+                section = self.middle
+            section.append(segment)
+        for segments in interchange.messages:
+            self._read_items(segments)
+        if not self.parties or not self.items:
+            raise ValueError("template message needs NAD parties and LIN line items")
+
+    def tag(self, segment):
+        return segment_tag(segment, self.service)
+
+    def _read_items(self, segments):
+        item = None
+        for segment in segments[:-1]:
+            tag = self.tag(segment)
+            if tag == "LIN":
+                item = ([segment], [])
+                self.items.append(item)
+            elif tag == "UNS":
+                if not self.summary:
+                    self.summary = segments[segments.index(segment):-1]
+                return
+            elif item is not None:
+                # the allowance/charge group starts with the line's TAX or ALC
+                if item[1] or tag in ("TAX", "ALC"):
+                    item[1].append(segment)
+                else:
+                    item[0].append(segment)
+
+    def replace_element(self, segment, index, value):
+        """The segment with data element `index` (tag = 0) set to value."""
+        elements = segment.split(self.service.data)
+        elements[index] = value
+        return self.service.data.join(elements)
+
+    def free_text(self, characters):
+        """FTX segments holding `characters` characters of general information."""
+        text = (FILLER * (characters // len(FILLER) + 1))[:characters]
+        segments = []
+        per_segment = FTX_COMPONENT * FTX_COMPONENTS
+        for start in range(0, len(text), per_segment):
+            chunk = text[start:start + per_segment]
+            components = [chunk[i:i + FTX_COMPONENT] for i in range(0, len(chunk), FTX_COMPONENT)]
+            segments.append(self.service.data.join(["FTX", "AAI", "", "", self.service.component.join(components)]))
+        return segments
+
+    def message(self, number, lines, parties, charges, text):
+        segments = []
+        for segment in self.head:
+            tag = self.tag(segment)
+            if tag == "UNH":
+                segment = self.replace_element(segment, 1, str(number))
+            elif tag == "BGM":
+                document = segment.split(self.service.data)[2]
+                if document.isdigit():
+                    segment = self.replace_element(segment, 2, str(int(document) + number - 1))
+            segments.append(segment)
+        segments.extend(self.free_text(text) if text else [])
+        for index in range(parties):
+            group = self.parties[index % len(self.parties)]
+            if index >= len(self.parties):
+                role = EXTRA_ROLES[(index - len(self.parties)) % len(EXTRA_ROLES)]
+                group = [self.replace_element(group[0], 1, role)] + group[1:]
+            segments.extend(group)
+        segments.extend(self.middle)
+        for index in range(lines):
+            item, charge_group = self.items[index % len(self.items)]
+            segments.append(self.replace_element(item[0], 1, str(index + 1)))
+            segments.extend(item[1:])
+            for _ in range(charges):
+                segments.extend(charge_group)
+        segments.extend(self.summary)
+        reference = segments[0].split(self.service.data)[1]
+        segments.append(self.service.data.join(["UNT", str(len(segments) + 1), reference]))
+        return segments
+
+    def interchange(self, messages=1, lines=10, parties=4, charges=1, text=0):
+        segments = list(self.header)
+        for number in range(1, messages + 1):
+            segments.extend(self.message(number, lines, parties, charges, text))
+        for segment in self.trailer:
+            if self.tag(segment) == "UNZ":
+                segment = self.replace_element(segment, 1, str(messages))
+            segments.append(segment)
+        terminator = self.service.segment
+        return (self.una + "\n" if self.una else "") + "".join(segment + terminator + "\n" for segment in segments)
+
+
+_templates = {}
+
+
+def load_template(template=default_template):
+    path = os.path.abspath(template)
+    if path not in _templates:
+        with io.open(path, encoding="utf-8") as f:
+            _templates[path] = InvoiceTemplate(f.read())
+    return _templates[path]
+
+
+def generate_invoic(messages=1, lines=10, parties=4, charges=1, text=0, template=default_template):
+    """
+    An INVOIC interchange with `messages` messages of `lines` line items,
+    `parties` NAD parties, `charges` allowance/charge groups per line item
+    and `text` characters of free text, as EDIFACT text.
+    """
+    if min(messages, lines, parties) < 1 or min(charges, text) < 0:
+        raise ValueError("messages, lines and parties must be at least 1, charges and text not negative")
+    return load_template(template).interchange(messages, lines, parties, charges, text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic INVOIC interchange")
+    parser.add_argument("output", nargs="?", help="file to write (default: standard output)")
+    parser.add_argument("--template", default=default_template)
+    parser.add_argument("--messages", type=int, default=1)
+    parser.add_argument("--lines", type=int, default=10, help="LIN line items per message")
+    parser.add_argument("--parties", type=int, default=4, help="NAD parties per message")
+    parser.add_argument("--charges", type=int, default=1,
+                        help="TAX/ALC/MOA allowance or charge groups per line item")
+    parser.add_argument("--text", type=int, default=0, help="characters of FTX free text per message")
+    args = parser.parse_args(argv)
+
+    edi_data = generate_invoic(args.messages, args.lines, args.parties, args.charges, args.text,
+                               template=args.template)
+    if args.output:
+        with io.open(args.output, "w", encoding="utf-8") as f:
+            f.write(edi_data)
+    else:
+        sys.stdout.write(edi_data)
+
+
+if __name__ == "__main__":
+    main()
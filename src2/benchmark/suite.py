@@ -0,0 +1,321 @@
+# suite.py
+#
+# Benchmark suite: runs the pipeline over synthetic interchanges of growing
+# size (generator.py), as a whole and stage by stage, and writes the results
+# in the schema of evaluation/data_*.csv. With --check the results are
+# compared with a stored baseline and the run fails (exit status 1) if a
+# time grew beyond the threshold, so it can gate a CI job:
+#
+#   python -m benchmark.suite --output-dir bench --check
+#   python -m benchmark.suite --update-baseline    # after an intended change
+#
+# Times are averaged over --repeat runs after one warm-up run, so the mapping
+# compilation and the parsing of the shapes (cached per process) are not
+# part of them. Each run also times a fixed calibration workload that does
+# not depend on this code; the check compares times relative to it, so a
+# baseline recorded on one machine holds on a faster or slower one. It is
+# still only comparable with the options it was recorded with.
+
+import argparse
+import contextlib
+import csv
+import gc
+import io
+import logging
+import os
+import sys
+import time
+
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import XSD
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edifact_tokenizer import SegmentTokenizer, count_data_elements
+from general_edifact_to_enriched_xml import EDIFACTToEnrichedXMLConverter, validation_results
+from pipeline import interchange_parts, validate_edifact
+from resource_sampler import ResourceSampler, aggregate_cpu_summary, cpu_summary_row, write_cpu_summary
+from rml_engine import GraphSink, load_mapping
+from stage_timer import StageTimer, stage
+
+from benchmark.generator import generate_invoic
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline")
+
+# Interchange sizes: (messages, line items per message, parties per message,
+# allowance/charge groups per line item, characters of free text per message)
+SIZES = (
+    (1, 1, 2, 1, 0),
+    (1, 10, 4, 1, 0),
+    (1, 25, 4, 2, 500),
+    (2, 25, 6, 2, 1000),
+    (4, 50, 8, 3, 2000),
+)
+
+DATA_FILE = "data_benchmark.csv"
+DATA_HEADER = ["EDIFACT Data Elements", "Data Items", "Average KG Construction",
+               "Average Validation", "Average Total Time"]
+
+# Stages run in isolation, each on the output of the one before
+STAGES_FILE = "stages_benchmark.csv"
+STAGES_HEADER = ["EDIFACT Data Elements", "Tokenize", "XML Conversion", "XML Mapping",
+                 "Graph Conversion", "Validation"]
+
+# CPU and memory use per pipeline run with --sample-interval (not part of the baseline)
+CPU_FILE = "cpu_summary_benchmark.csv"
+
+# Seconds of the calibration workload on the machine the results are from
+CALIBRATION_FILE = "calibration_benchmark.csv"
+CALIBRATION_HEADER = ["Calibration"]
+
+# Pipeline stages (stage_timer.STAGES) counted as building the knowledge graph
+KG_STAGES = ("parse", "convert", "serialize", "mapping compile", "mapping", "graph load")
+VALIDATION_STAGES = ("inference", "validate")
+
+# Differences below this many seconds are taken as noise
+NOISE = 0.002
+
+
+def average(function, repeat):
+    """
+    Mean wall time of `repeat` calls after a warm-up call, and the warm-up's
+    result. As in timeit, the garbage collector is off while timing, so a
+    collection cycle of earlier work does not land on a stage.
+    """
+    result = function()
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    return elapsed / repeat, result
+
+
+def calibration_workload(nodes=4000, segments=20000):
+    """
+    A fixed amount of the kind of work the pipeline does (rdflib graphs and
+    terms, float literals, splitting strings), independent of this code.
+    """
+    ex = Namespace("http://example.com/calibration/")
+    graph = Graph()
+    for i in range(nodes):
+        node = ex[f"node{i}"]
+        graph.add((node, ex.amount, Literal(f"{i % 97}.{i % 13}", datatype=XSD.float)))
+        graph.add((node, ex.next, ex[f"node{(i * 7) % nodes}"]))
+    total = sum(float(o) for s, p, o in sorted(graph) if p == ex.amount)
+    text = "'".join(f"SEG+{i}:{i * 3}+TEXT {i}" for i in range(segments))
+    return total, len([segment.split("+") for segment in text.split("'")])
+
+
+def calibrate(repeat=5):
+    """Seconds of the calibration workload, best of `repeat` runs after a warm-up run."""
+    calibration_workload()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calibration_workload()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_pipeline(edi_data, options):
+    """Seconds per stage of one run as edifact-val.py does it, one job after the other."""
+    with StageTimer() as timer:
+        with stage("parse"):
+            parts = interchange_parts(edi_data)
+        for number, text, offsets in parts:
+            timer.add(validate_edifact(text, offsets, **options)[3])
+    return timer.seconds
+
+
+def measure_pipeline(edi_data, options, repeat, sample_interval=None):
+    """
+    Average seconds of KG construction, validation and in total, and with
+    sample_interval the CPU and memory summary of each run.
+    """
+    run_pipeline(edi_data, options)  # warm-up
+    runs, summaries = [], []
+    for _ in range(repeat):
+        if sample_interval:
+            with ResourceSampler(sample_interval) as sampler:
+                runs.append(run_pipeline(edi_data, options))
+            summaries.append(sampler.summary())
+        else:
+            runs.append(run_pipeline(edi_data, options))
+    kg = sum(run[name] for run in runs for name in KG_STAGES) / repeat
+    validation = sum(run[name] for run in runs for name in VALIDATION_STAGES) / repeat
+    total = sum(sum(run.values()) for run in runs) / repeat
+    return kg, validation, total, summaries
+
+
+def measure_stages(edi_data, options, repeat):
+    """Seconds of each stage in isolation, and the triples in the data graph."""
+    mapping = load_mapping()
+
+    def convert(sink=None):
+        converter = EDIFACTToEnrichedXMLConverter(edi_data, sink=sink)
+        converter.convert()
+        return converter
+
+    tokenize, _ = average(lambda: list(SegmentTokenizer(edi_data)), repeat)
+    xml_conversion, converter = average(convert, repeat)
+    xml_mapping, _ = average(lambda: mapping.execute(converter.root), repeat)
+    graph_conversion, converter = average(lambda: convert(GraphSink(mapping)), repeat)
+    data_graph = converter.to_graph()
+    validation, _ = average(lambda: validation_results(options["process"], data_graph,
+                                                       inference=options["inference"],
+                                                       engine=options["shacl_engine"]), repeat)
+    return [tokenize, xml_conversion, xml_mapping, graph_conversion, validation], len(data_graph)
+
+
+def run_suite(sizes=SIZES, repeat=5, sample_interval=None, **options):
+    """
+    (data rows, stage rows, CPU summary rows): one data and one stage row
+    per size, and with sample_interval a CPU summary row per pipeline run.
+    """
+    data_rows, stage_rows, cpu_rows = [], [], []
+    for size in sizes:
+        edi_data = generate_invoic(*size)
+        data_elements = count_data_elements(edi_data)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            stages, data_items = measure_stages(edi_data, options, repeat)
+            kg, validation, total, summaries = measure_pipeline(edi_data, options, repeat, sample_interval)
+        data_rows.append([data_elements, data_items] + [round(seconds, 4) for seconds in (kg, validation, total)])
+        stage_rows.append([data_elements] + [round(seconds, 4) for seconds in stages])
+        cpu_rows.extend(cpu_summary_row(data_elements, run, summary)
+                        for run, summary in enumerate(summaries, 1) if summary is not None)
+        print(f"{data_elements} data elements {size}: total {total:.4f} s, "
+              + ", ".join(f"{name} {seconds:.4f} s" for name, seconds in zip(STAGES_HEADER[1:], stages)))
+    return data_rows, stage_rows, cpu_rows
+
+
+def write_table(path, header, rows):
+    with io.open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def read_table(path):
+    """{data elements: {column: value}} of a results file."""
+    with io.open(path, encoding="utf-8", newline="") as f:
+        return {int(row["EDIFACT Data Elements"]): row for row in csv.DictReader(f)}
+
+
+def read_calibration(directory):
+    """The calibration seconds stored with results, or None."""
+    try:
+        with io.open(os.path.join(directory, CALIBRATION_FILE), encoding="utf-8", newline="") as f:
+            return float(next(csv.DictReader(f))[CALIBRATION_HEADER[0]])
+    except (OSError, StopIteration, KeyError, ValueError):
+        return None
+
+
+def regressions(baseline, rows, header, threshold, scale=1.0):
+    """
+    (data elements, description) of the times in rows that exceed the
+    baseline, times scale (this machine's calibration over the baseline's),
+    by more than threshold.
+    """
+    found = []
+    for row in rows:
+        base = baseline.get(row[0])
+        if base is None:
+            print(f"No baseline for {row[0]} data elements")
+            continue
+        for column, value in zip(header[1:], row[1:]):
+            if column == "Data Items":
+                if int(base[column]) != value:
+                    print(f"{row[0]} data elements: {value} data items, baseline {base[column]}")
+                continue
+            reference = float(base[column]) * scale
+            if value > reference * (1 + threshold) and value - reference > NOISE:
+                found.append((row[0], f"{row[0]} data elements, {column}: {value:.4f} s, "
+                                      f"baseline {reference:.4f} s scaled (+{100 * (value / reference - 1):.0f}%)"))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EDIFACT-VAL benchmark suite")
+    parser.add_argument("--output-dir", default="benchmark_results")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, nargs=5, action="append", dest="sizes",
+                        metavar=("MESSAGES", "LINES", "PARTIES", "CHARGES", "TEXT"),
+                        help="interchange size to run instead of the default sizes (repeatable)")
+    parser.add_argument("--process", default="ProcessExample")
+    parser.add_argument("--inference", choices=["rdfs", "precomputed", "none"], default="rdfs")
+    parser.add_argument("--shacl-engine", choices=["pyshacl", "native"], default="pyshacl")
+    parser.add_argument("--sample-interval", type=float, metavar="SECONDS",
+                        help="sample CPU and memory use of the pipeline runs (Linux)")
+    parser.add_argument("--baseline", default=default_baseline, help="directory of the baseline results")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="allowed slowdown against the baseline (0.5 = 50%%)")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="times a size that looks slower is measured again before it counts")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    # ill-typed literals in the data are reported by rdflib on every run
+    logging.getLogger("rdflib.term").setLevel(logging.CRITICAL)
+    options = {"process": args.process, "inference": args.inference, "shacl_engine": args.shacl_engine}
+    sizes = [tuple(size) for size in args.sizes or SIZES]
+    calibration = calibrate()
+    print(f"Calibration: {calibration:.4f} s")
+    data_rows, stage_rows, cpu_rows = run_suite(sizes, args.repeat, args.sample_interval, **options)
+    # the better of the calibrations before and after, should the machine's load have changed
+    calibration = min(calibration, calibrate())
+    tables = ((DATA_FILE, DATA_HEADER, data_rows), (STAGES_FILE, STAGES_HEADER, stage_rows))
+
+    check = args.check and not args.update_baseline
+    if check:
+        baseline = {name: read_table(os.path.join(args.baseline, name)) for name, header, rows in tables}
+        baseline_calibration = read_calibration(args.baseline)
+        if baseline_calibration:
+            scale = calibration / baseline_calibration
+            print(f"Calibration {calibration:.4f} s, baseline {baseline_calibration:.4f} s: "
+                  f"baseline times scaled by {scale:.2f}")
+        else:
+            scale = 1.0
+            print(f"No {CALIBRATION_FILE} in the baseline: times compared as they are")
+        find = lambda: [regression for name, header, rows in tables
+                        for regression in regressions(baseline[name], rows, header, args.threshold, scale)]
+        found = find()
+        # A slowdown has to show again to count: on a shared machine a single
+        # run can be slowed down by other work. Each time keeps its best run.
+        for _ in range(args.retries):
+            if not found:
+                break
+            slow = {data_elements for data_elements, description in found}
+            indices = [index for index, row in enumerate(data_rows) if row[0] in slow]
+            print(f"Measuring {len(indices)} size(s) again")
+            again = run_suite([sizes[index] for index in indices], args.repeat, **options)
+            for (name, header, rows), new_rows in zip(tables, again[:2]):
+                for index, new_row in zip(indices, new_rows):
+                    rows[index] = [min(old, new) for old, new in zip(rows[index], new_row)]
+            found = find()
+
+    for directory in [args.output_dir] + ([args.baseline] if args.update_baseline else []):
+        os.makedirs(directory, exist_ok=True)
+        for name, header, rows in tables:
+            write_table(os.path.join(directory, name), header, rows)
+        write_table(os.path.join(directory, CALIBRATION_FILE), CALIBRATION_HEADER, [[round(calibration, 4)]])
+        print(f"Results saved to {directory}")
+    if cpu_rows:
+        write_cpu_summary(os.path.join(args.output_dir, CPU_FILE), cpu_rows)
+        write_cpu_summary(os.path.join(args.output_dir, "aggregated_" + CPU_FILE), aggregate_cpu_summary(cpu_rows))
+
+    if check:
+        for data_elements, description in found:
+            print("Regression:", description)
+        if found:
+            raise SystemExit(1)
+        print(f"No regressions beyond {100 * args.threshold:.0f}% of the baseline")
+
+if __name__ == "__main__":
+    main()
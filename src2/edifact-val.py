@@ -1,66 +1,80 @@
-import platform
+import argparse
 import os
-import shutil
 
-from general_edifact_to_enriched_xml import (
-    EDIFACTToEnrichedXMLConverter,
-    yarrrmlparser_bash, rmlmapper_bash,
-    yarrrmlparser_batch, rmlmapper_batch,
-    validates
-)
+from pipeline import find_edifact_files, run_batch
 
-if __name__ == '__main__':
-    edi_files = ["ProcessTest.edi"]
-    ttl_file = "ProcessExample"
-
-    for edi_file in edi_files:
-        if not os.path.isfile(edi_file):
-            print(f"File not found: {edi_file}")
-            continue
-
-        base_name = os.path.splitext(os.path.basename(edi_file))[0]
-        xml_output_file = "enriched_output.xml"
-
-        print(f"\n--- Processing {edi_file} ---")
 
-        try:
-            with open(edi_file, "r", encoding="utf-8") as f:
-                edi_data = f.read()
-        except UnicodeDecodeError:
-            print("UTF-8 decoding failed, trying ISO-8859-1")
-            with open(edi_file, "r", encoding="iso-8859-1") as f:
-                edi_data = f.read()
-
-        converter = EDIFACTToEnrichedXMLConverter(edi_data)
-        converter.convert()
-        enriched_xml = converter.to_string()
-
-        with open(xml_output_file, "w", encoding="utf-8") as f:
-            f.write(enriched_xml)
-        print(f"Enriched XML written to {xml_output_file}")
-
-        print("Running transformation and validation")
-        if platform.system() == "Windows":
-            yarrrmlparser_batch()
-            rmlmapper_batch()
-        elif platform.system() in ["Darwin", "Linux"]:
-            yarrrmlparser_bash()
-            rmlmapper_bash()
-        else:
-            print("Unsupported platform")
-            continue
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate EDIFACT invoices against SHACL shapes")
+    parser.add_argument("inputs", nargs="*", default=["ProcessTest.edi"],
+                        help="EDIFACT files, directories or glob patterns")
+    parser.add_argument("--process", default="ProcessExample",
+                        help="shapes file (without .ttl) to validate against")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of files processed in parallel")
+    parser.add_argument("--output-dir", default="evaluation",
+                        help="directory for the reports and other output files")
+    parser.add_argument("--java", action="store_true", dest="use_java_mapper",
+                        help="run the Java RMLMapper via rmlmapper.sh/.bat instead of the in-process engine")
+    parser.add_argument("--write-xml", action="store_true", dest="write_enriched_xml",
+                        help="also write the enriched XML of each file (debugging)")
+    parser.add_argument("--direct-graph", action="store_true", dest="direct_graph",
+                        help="emit the RDF graph while converting instead of mapping the in-memory XML tree "
+                             "(same graph; holds less, but is not faster)")
+    parser.add_argument("--pretty-xml", action="store_true", dest="pretty_xml",
+                        help="indent the XML written by --write-xml (slower; for reading it)")
+    parser.add_argument("--write-data-graph", action="store_true", dest="write_data_graph",
+                        help="also write the data graph of each file as <name>.ttl (debugging)")
+    parser.add_argument("--no-split", action="store_false", dest="split_messages",
+                        help="validate each interchange as a whole instead of each message as a job of its own")
+    parser.add_argument("--inference", choices=["rdfs", "precomputed", "none"], default="rdfs",
+                        help="RDFS inference before validation: owlrl on every graph (rdfs), the entailments "
+                             "the shapes can observe added in one pass (precomputed), or none")
+    parser.add_argument("--shacl-engine", choices=["pyshacl", "native"], default="pyshacl",
+                        help="evaluate the SHACL core constraints with compiled shapes (native); anything else "
+                             "is still validated by pyshacl")
+    parser.add_argument("--stream", action="store_true", dest="streaming",
+                        help="validate each file one message at a time in constant memory, writing the report "
+                             "while reading (for very large interchanges)")
+    parser.add_argument("--serve", action="store_true",
+                        help="run as a resident validation service instead of processing files: POST EDIFACT "
+                             "to /validate on --host/--port or on the Unix --socket")
+    parser.add_argument("--host", default="127.0.0.1", help="address the service listens on")
+    parser.add_argument("--port", type=int, default=8080, help="port the service listens on")
+    parser.add_argument("--socket", dest="socket_path",
+                        help="Unix socket the service listens on, instead of --host/--port")
+    parser.add_argument("--timings", action="store_true",
+                        help="write the seconds spent per stage as <name>_runtime_breakdown.csv and "
+                             "aggregated_runtime_breakdown.csv (the schema of evaluation/), and the wall time "
+                             "per file as elapsed_time.csv")
+    parser.add_argument("--sample-interval", type=float, metavar="SECONDS",
+                        help="sample CPU (per core) and memory use from /proc every SECONDS while the batch "
+                             "runs and write cpu_summary.csv (Linux only)")
+    parser.add_argument("--max-pending", type=int,
+                        help="requests validated at a time in service mode (default: twice --workers)")
+    args = parser.parse_args()
 
-        validation_output = validates(ttl_file)
+    if args.serve:
+        from validation_service import ValidationService, serve
+        service = ValidationService(workers=args.workers, max_pending=args.max_pending,
+                                    process=args.process, use_java_mapper=args.use_java_mapper,
+                                    split_messages=args.split_messages,
+                                    inference=args.inference, shacl_engine=args.shacl_engine,
+                                    direct_graph=args.direct_graph)
+        serve(service, host=args.host, port=args.port, socket_path=args.socket_path)
+        raise SystemExit(0)
 
-        validation_report_file = os.path.join("evaluation", f"{base_name}_{ttl_file}_validation_report.ttl")
-        os.makedirs("evaluation", exist_ok=True)
-        with open(validation_report_file, "w", encoding="utf-8") as f:
-            f.write(validation_output)
-        print(f"Validation report saved to {validation_report_file}")
+    edi_files = find_edifact_files(args.inputs)
+    results = run_batch(edi_files, workers=args.workers, process=args.process,
+                        output_dir=args.output_dir, use_java_mapper=args.use_java_mapper,
+                        write_enriched_xml=args.write_enriched_xml, pretty_xml=args.pretty_xml,
+                        split_messages=args.split_messages,
+                        write_data_graph=args.write_data_graph,
+                        inference=args.inference, shacl_engine=args.shacl_engine,
+                        timings=args.timings, sample_interval=args.sample_interval,
+                        streaming=args.streaming, direct_graph=args.direct_graph)
 
-        final_output_file = os.path.join("evaluation", f"{base_name}.ttl")
-        if os.path.isfile("invoice.ttl"):
-            shutil.move("invoice.ttl", final_output_file)
-            print(f"Final output file saved as {final_output_file}")
-        else:
-            print("invoice.ttl file not found.")
+    failed = [edi_file for edi_file, result in results.items() if isinstance(result, Exception)]
+    print(f"\n{len(results) - len(failed)} of {len(results)} files processed")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,340 @@
+# edifact_tokenizer.py
+#
+# Streaming segment tokenizer for EDIFACT interchanges. Reads from a string,
+# a text stream or bytes (decoded chunk by chunk, see EdifactReader) in
+# chunks, honours the UNA service string advice and the release character,
+# and yields one segment at a time.
+
+import codecs
+import mmap
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Bytes searched for the UNB syntax identifier
+HEADER_BYTES = 1024
+
+# Character sets of the UNB syntax identifiers (ISO 9735) beyond ASCII
+# (UNOA, UNOB) and UTF-8 (UNOY)
+SYNTAX_CHARSETS = {
+    "UNOC": "iso-8859-1", "UNOD": "iso-8859-2", "UNOE": "iso-8859-5", "UNOF": "iso-8859-7",
+    "UNOG": "iso-8859-3", "UNOH": "iso-8859-4", "UNOI": "iso-8859-6", "UNOJ": "iso-8859-8",
+    "UNOK": "iso-8859-9",
+}
+
+
+class ServiceCharacters:
+    def __init__(self, component=":", data="+", decimal=".", release="?", reserved=" ", segment="'"):
+        self.component = component
+        self.data = data
+        self.decimal = decimal
+        self.release = release
+        self.reserved = reserved
+        self.segment = segment
+
+    @classmethod
+    def from_una(cls, una):
+        # UNA followed by exactly six characters: : + . ? (space) '
+        component, data, decimal, release, reserved, segment = una[3:9]
+        return cls(component, data, decimal, release, reserved, segment)
+
+
+class DataElement(str):
+    """
+    A data element as read by the tokenizer. It compares and prints like the
+    plain text (components joined with ':'); `components` gives the split
+    that honours the release character, so escaped separators stay intact.
+    """
+
+    @property
+    def components(self):
+        return self.split(":")
+
+
+class ReleasedDataElement(DataElement):
+    # Elements with release characters (or non-default separators) keep the
+    # components worked out by the tokenizer instead of re-splitting.
+    components = None
+
+    def __new__(cls, components):
+        element = super().__new__(cls, ":".join(components))
+        element.components = components
+        return element
+
+
+def syntax_identifier(head):
+    """The UNB syntax identifier (e.g. UNOC) in the first bytes of an interchange, or None."""
+    head = bytes(head[:HEADER_BYTES])
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    text = head.decode("ascii", errors="replace").lstrip(" \t\r\n")
+    component, data = ":", "+"
+    if text.startswith("UNA") and len(text) >= 9:
+        component, data = text[3], text[4]
+    index = text.find("UNB" + data)
+    if index < 0:
+        return None
+    return text[index + 4:].split(data, 1)[0].split(component, 1)[0]
+
+
+def fallback_encoding(identifier):
+    """The codec for an interchange that is not UTF-8: its declared 8-bit character set, or ISO-8859-1."""
+    return SYNTAX_CHARSETS.get(identifier, "iso-8859-1")
+
+
+class EdifactReader:
+    """
+    A text stream decoding an interchange held as bytes (or a memory map)
+    chunk by chunk, as the tokenizer reads it. The bytes are taken as UTF-8,
+    since interchanges declaring UNOC are often written in UTF-8 (so is
+    example/Anonymized.edi); if they are not, the character set of the UNB
+    syntax identifier is used instead. Switching codecs is only possible
+    while nothing but ASCII has been read; later, read() raises
+    UnicodeDecodeError and the caller starts over with `fallback`.
+    `encoding` sets the codec instead, and `errors` how it handles bytes
+    it cannot decode (as in bytes.decode).
+    """
+
+    def __init__(self, data, encoding=None, errors="strict"):
+        self.data = data
+        self.errors = errors
+        self.identifier = syntax_identifier(data)
+        self.fallback = fallback_encoding(self.identifier)
+        self.fixed = encoding is not None
+        self.position = 0
+        self.ascii = True  # only ASCII decoded so far
+        self._use(encoding or "utf-8")
+
+    def _use(self, encoding):
+        self.encoding = encoding
+        self.decoder = codecs.getincrementaldecoder(encoding)(self.errors)
+
+    def read(self, size=-1):
+        text = ""
+        while not text and self.position < len(self.data):
+            if size is None or size < 0:
+                size = len(self.data)
+            chunk = self.data[self.position:self.position + size]
+            self.position += len(chunk)
+            final = self.position >= len(self.data)
+            pending = self.decoder.getstate()[0]
+            try:
+                text = self.decoder.decode(chunk, final)
+            except UnicodeDecodeError:
+                if self.fixed or not self.ascii or self.encoding == self.fallback:
+                    raise
+                # all read so far was ASCII and reads the same in the fallback
+                self._use(self.fallback)
+                text = self.decoder.decode(pending + chunk, final)
+            if self.ascii and not text.isascii():
+                self.ascii = False
+        return text
+
+
+class SegmentTokenizer:
+    """
+    Iterate over (tag, data_elements) pairs. `source` is the interchange as a
+    string, bytes or a memory map (decoded by an EdifactReader), or any
+    object with a read() method returning text. The UNA segment is consumed
+    and exposed as `una` / `service`.
+    """
+
+    def __init__(self, source, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.service = ServiceCharacters()
+        self.una = None
+
+    def _chunks(self):
+        if isinstance(self.source, str):
+            yield self.source
+            return
+        source = self.source
+        if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            source = EdifactReader(source)
+        while True:
+            chunk = source.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def __iter__(self):
+        for segment in self.raw_segments():
+            yield self.tokenize(segment)
+
+    def raw_segments(self):
+        """Segment texts without terminator, release characters left in place."""
+        chunks = self._chunks()
+        buffer = ""
+        header_done = False
+        for chunk in chunks:
+            buffer += chunk
+            if not header_done:
+                stripped = buffer.lstrip("\ufeff \t\r\n")
+                if len(stripped) < 9 and stripped.startswith("UNA"[:len(stripped)]):
+                    continue  # not enough text yet to read the UNA segment
+                header_done = True
+                if stripped.startswith("UNA"):
+                    self.una = stripped[:9]
+                    self.service = ServiceCharacters.from_una(self.una)
+                    stripped = stripped[9:]
+                buffer = stripped
+            start = 0
+            for segment, start in self._split_segments(buffer):
+                yield segment
+            buffer = buffer[start:]
+        if not header_done and buffer.lstrip("\ufeff \t\r\n").startswith("UNA"):
+            # truncated UNA: nothing but the service string advice
+            return
+        if buffer.strip():
+            # last segment without a terminator
+            yield buffer.strip()
+
+    def _split_segments(self, buffer):
+        """Complete segments in buffer, with the offset after each one."""
+        terminator = self.service.segment
+        release = self.service.release
+        start = position = 0
+        while True:
+            index = buffer.find(terminator, position)
+            if index < 0:
+                return
+            # a terminator preceded by an odd number of release characters is escaped
+            escapes = 0
+            while index - escapes > start and buffer[index - escapes - 1] == release:
+                escapes += 1
+            if escapes % 2:
+                position = index + 1
+                continue
+            segment = buffer[start:index].strip()
+            start = position = index + 1
+            if segment:
+                yield segment, start
+
+    def tokenize(self, segment):
+        """Split one raw segment into (tag, data_elements)."""
+        service = self.service
+        if service.release not in segment and service.component == ":":
+            elements = list(map(DataElement, segment.split(service.data)))
+        elif service.release not in segment:
+            elements = [ReleasedDataElement(element.split(service.component))
+                        for element in segment.split(service.data)]
+        else:
+            elements = self._tokenize_released(segment)
+        return str(elements[0]), elements[1:]
+
+    def _tokenize_released(self, segment):
+        service = self.service
+        elements, components, current = [], [], []
+        characters = iter(segment)
+        for c in characters:
+            if c == service.release:
+                current.append(next(characters, ""))
+            elif c == service.component:
+                components.append("".join(current))
+                current = []
+            elif c == service.data:
+                components.append("".join(current))
+                elements.append(ReleasedDataElement(components))
+                components, current = [], []
+            else:
+                current.append(c)
+        components.append("".join(current))
+        elements.append(ReleasedDataElement(components))
+        return elements
+
+
+def iter_segments(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    return iter(SegmentTokenizer(source, chunk_size))
+
+
+def segment_tag(segment, service):
+    return segment.split(service.data, 1)[0]
+
+
+def count_data_elements(source):
+    """
+    The size of an interchange as in the evaluation: its non-empty data
+    elements, counting each component of a composite on its own.
+    """
+    return sum(1 for tag, data in SegmentTokenizer(source)
+               for element in data for component in element.components if component)
+
+
+class SplitInterchange:
+    """
+    An interchange cut at message boundaries: `header` holds the raw
+    segments before the first UNH (UNB), `messages` one list of raw segments
+    per UNH..UNT, and `trailer` what follows the last UNT (UNZ).
+    """
+
+    def __init__(self, tokenizer, header, messages, trailer):
+        self.tokenizer = tokenizer
+        self.header = header
+        self.messages = messages
+        self.trailer = trailer
+
+    def message_text(self, index):
+        """The interchange reduced to a single message, envelope included."""
+        return _interchange_text(self.tokenizer, self.header + self.messages[index] + self.trailer)
+
+
+def split_interchange(source):
+    tokenizer = SegmentTokenizer(source)
+    header, messages, trailer = [], [], []
+    current = None
+    for segment in tokenizer.raw_segments():
+        tag = segment_tag(segment, tokenizer.service)
+        if tag == "UNH":
+            current = [segment]
+            messages.append(current)
+        elif current is not None:
+            current.append(segment)
+            if tag == "UNT":
+                current = None
+        elif messages:
+            trailer.append(segment)
+        else:
+            header.append(segment)
+    return SplitInterchange(tokenizer, header, messages, trailer)
+
+
+class InterchangeStream:
+    """
+    split_interchange for interchanges too large to hold in memory:
+    iterating yields the raw segments of one UNH..UNT message at a time,
+    reading the source only as far as needed. `header` is complete once the
+    first message has been yielded; the `trailer` (UNZ) lies at the end of
+    the source and is set by the caller, e.g. from the end of the file.
+    """
+
+    def __init__(self, source, trailer=()):
+        self.tokenizer = SegmentTokenizer(source)
+        self.header = []
+        self.trailer = list(trailer)
+
+    def __iter__(self):
+        current = None
+        in_header = True
+        for segment in self.tokenizer.raw_segments():
+            tag = segment_tag(segment, self.tokenizer.service)
+            if tag == "UNH":
+                current = [segment]
+                in_header = False
+            elif current is not None:
+                current.append(segment)
+                if tag == "UNT":
+                    yield current
+                    current = None
+            elif in_header:
+                self.header.append(segment)
+        if current is not None:
+            yield current  # a message without UNT, as split_interchange keeps it
+
+    def message_text(self, segments):
+        """A message, as yielded, as an interchange of its own (envelope included)."""
+        return _interchange_text(self.tokenizer, self.header + segments + self.trailer)
+
+
+def _interchange_text(tokenizer, segments):
+    terminator = tokenizer.service.segment
+    return (tokenizer.una or "") + "".join(segment + terminator + "\n" for segment in segments)
@@ -1,20 +1,229 @@
 # general_edifact_to_enriched_xml.py
 
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
 from collections import defaultdict
+from types import MappingProxyType
+import copy
+import io
 import os 
-from pyshacl import validate
 from rdflib import *
 from os import *
 from subprocess import *
 import time 
+from rml_engine import mapping_digest, cache_path, atomic_write
+from edifact_tokenizer import SegmentTokenizer
+from shapes_registry import shapes_registry
+from rdfs_inference import precomputed_inference
+from native_shacl import validate_native
+from validation_results import validate_report
+from stage_timer import stage
 
 folder_path = os.path.dirname(os.path.abspath(__file__)) + os.sep
 
+# Codelists used by the segment handlers. They are built once at import and
+# frozen so that handlers neither rebuild nor accidentally modify them.
+
+BGM_TAGS = ("Dokumentenart", "Dokumentennummer", "Dokumentenfunktion")
+
+BGM_TRANSLATIONS = MappingProxyType({
+    "Dokumentenart": MappingProxyType({
+        "380": "Rechnung",
+        "381": "Gutschrift",
+        "383": "Lastschrift",
+        "382": "Rechnungskorrektur",
+        "385": "Proformarechnung",
+        "389": "Selbstfakturierung"
+    }),
+    "Dokumentenfunktion": MappingProxyType({
+        "9": "Original",
+        "7": "Duplikat",
+        "31": "Abschlagsrechnung",
+        "46": "Korrigierte Rechnung"
+    })
+})
+
+PCD_QUALIFIERS = MappingProxyType({
+    "1": "AbschlagProzentsatz",
+    "2": "ZuschlagProzentsatz",
+    "7": "RechnungsProzentsatz",
+    "12": "AbzugProzentsatz",
+    "15": "StrafProzentsatz"
+})
+
+ALC_REASON_LABELS = MappingProxyType({
+    "AAJ": "Kupferzuschlag", "ADS": "Palettenweise Bestellung", "ADQ": "Produktmix",
+    "ADR": "Andere Dienste", "AG": "Silberzuschlag", "DI": "Rabatt", "FC": "Frachtkosten",
+    "HD": "Bearbeitung der Sendung", "RAA": "Ermaessigung", "SC": "Zuschlag",
+    "SF": "Spezial Rabatt", "SH": "Spezielle Handhabungsdienstleistungen", "TD": "Handelsrabatt",
+    "ZD1": "Gegenseitig definiert", "ZS1": "Gegenseitig definiert", "ZZZ": "Gegenseitig definiert"
+})
+
+CUX_CURRENCY_QUALIFIERS = MappingProxyType({
+    "4": "WaehrungRechnung",
+    "9": "WaehrungBestellung",
+    "10": "WaehrungPreisangabe",
+    "11": "WaehrungZahlung"
+})
+
+PAT_TERMS_TYPES = MappingProxyType({
+    "1": "Wie ueblich",
+    "3": "Fixdatum",
+    "7": "Verlaengert",
+    "20": "Vertragsstrafen",
+    "22": "Abzug",
+    "ZZZ": "Gemeinsam festgelegt"
+})
+
+PAT_REFERENCES = MappingProxyType({
+    "5": "Rechnungsdatum",
+    "9": "Rechnungseingangsdatum"
+})
+
+PAT_RELATIONS = MappingProxyType({
+    "1": "",
+    "2": "vor ",
+    "3": "nach "
+})
+
+PAT_UNITS = MappingProxyType({
+    "D": "Tag(e)",
+    "M": "Monat(e)",
+    "Y": "Jahr(e)"
+})
+
+NAD_AGENT_ROLES = MappingProxyType({
+    "AB": "SalesAgentRole", "BO": "BrokerOrSalesOfficeRole",
+    "BS": "CalculateAndDeliverToRole", "BY": "BuyerRole",
+    "CN": "RecipientRole", "CPE": "Zentralregulierer_EAN_CodeRole",
+    "DP": "DeliveryPartyRole", "II": "InvoicingPartyRole",
+    "IV": "InvoiceeRole", "PE": "PaymentRecipientRole",
+    "PR": "PayeeRole", "PW": "DespatchPartyRole",
+    "RE": "RecipientOfInvoiceRegulationRole", "RG": "RegulatorRole",
+    "SCO": "SuppliersCompanyHeadquarterRole", "SE": "SellerRole",
+    "SN": "WarehouseNumberRole", "SR": "RepresentativeOrAgentOfSupplierRole",
+    "ST": "SendToRole", "SU": "SupplierRole", "WS": "WholesalerRole",
+    "UC": "FinalConsigneeRole"
+})
+
+NAD_FIELDS = (
+    (1, "PartyID", True, ("PartyID", "CodeListQualifier", "CodeListResponsibleAgency")),
+    (2, "NameAddressLine", False, "NameAddressLine"),
+    (3, "PartyName", False, "PartyName"),
+    (4, "Street", False, "Street"),
+    (5, "City", False, "City"),
+    (6, "CountrySubEntity", False, "CountrySubEntity"),
+    (7, "PostalCode", False, "PostalCode"),
+    (8, "CountryCode", False, "CountryCode")
+)
+
+TOD_FUNCTIONS = MappingProxyType({
+    "2": "Transport",
+    "3": "Lieferbedingung",
+    "4": "Transportkosten",
+    "5": "LieferbedingungenVereinbart"
+    # Add more as needed
+})
+
+PRODUCT_ID_QUALIFIERS = MappingProxyType({
+    "BP": "Teilnummer_des_Kaeufers",
+    "EN": "International_Article_Number",
+    "PV": "Nummer_der_Aktionsvariante",
+    "HS": "Harmonisiertes_System",
+    "GN": "Nationaler_Produktgruppencode",
+    "IN": "Artikelnummer_des_Kaeufers",
+    "MF": "Artikelnummer_des_Herstellers",
+    "LI": "Positionszeilennummer",
+    "SA": "Artikelnummer_des_Lieferanten",
+    "UP": "Universal_Product_Code"
+})
+
+QTY_QUALIFIERS = MappingProxyType({
+    "1": "Diskrete_Menge",
+    "12": "Ausgelieferte_Menge",
+    "46": "Gelieferte_Menge",
+    "47": "Berechnete_Menge",
+    "59": "Verbrauchereinheiten",
+    "61": "Retourmenge",
+    "131": "Liefermenge",
+    "192": "Menge_ohne_Berechnung",
+    "194": "Erhalten_und_akzeptiert"
+})
+
+QTY_UNITS = MappingProxyType({
+    "PCE": "Stueck",
+    "C62": "Einheit",
+    "KGM": "Kilogramm",
+    "LTR": "Liter",
+    "MTR": "Meter",
+    "HUR": "Stunde",
+    "DAY": "Tag"
+    # Add more as needed
+})
+
+CTA_FUNCTIONS = MappingProxyType({
+    "AD": "Sachbearbeiter",
+    "IC": "Informationskontakt",
+    "PD": "LeiterEinkauf",
+    "AP": "Kontaktperson",
+    "OD": "Bestellkontakt"
+    # Add more as needed
+})
+
+COM_CHANNELS = MappingProxyType({
+    "EM": "EmailAdresse",
+    "TE": "TelefonNummer",
+    "FX": "TelefaxNummer",
+    "ED": "EDI-Adresse"
+    # Add more as needed
+})
+
+PRI_TYPES = MappingProxyType({
+    "AAA": "Nettokalkulation",
+    "AAB": "Bruttokalkulation",
+    "GRP": "Bruttopreis_pro_Einheit",
+    "INV": "Rechnungspreis",
+    "NTP": "Nettopreis_pro_Einheit"
+})
+
+PRI_SOURCES = MappingProxyType({
+    "CT": "Katalog",
+    "AA": "Herstellerangabe",
+    "AB": "Verkaeuferangabe",
+    "AC": "Kaeuferangabe"
+    # Add more as needed
+})
+
+PRI_UNITS = MappingProxyType({
+    "M": "Meter",
+    "PCE": "Stueck",
+    "PK": "Packet",
+    "PR": "Paar",
+    "CEL": "Celsius",
+    "GRM": "Gramm",
+    "MMT": "Millimeter",
+    "MTK": "Quadratmeter"
+})
+
+
 class EDIFACTToEnrichedXMLConverter:
-    def __init__(self, edifact_text):
+    # Segment tag -> handler method; unknown tags are reported and skipped.
+    SEGMENT_HANDLERS = MappingProxyType({
+        "UNB": "handle_unb", "UNH": "handle_unh", "BGM": "handle_bgm",
+        "DTM": "handle_dtm", "NAD": "handle_nad", "RFF": "handle_rff",
+        "MOA": "handle_moa", "TAX": "handle_tax", "CUX": "handle_cux",
+        "ALC": "handle_alc", "PCD": "handle_pcd", "PAT": "handle_pat",
+        "LIN": "handle_lin", "PIA": "handle_pia", "CTA": "handle_cta",
+        "TOD": "handle_tod", "IMD": "handle_imd", "QTY": "handle_qty",
+        "COM": "handle_com", "PRI": "handle_pri", "FTX": "handle_ftx",
+        "UNT": "handle_unt", "UNS": "handle_uns", "UNZ": "handle_unz"
+    })
+
+    def __init__(self, edifact_text, sink=None):
+        # With a sink (rml_engine.GraphSink) the converter emits RDF directly
+        # and no XML tree is kept; without one it builds the enriched XML.
+        # edifact_text is the interchange as a string or an open text stream.
         self.text = edifact_text
+        self.sink = sink
         self.segments = []
         self.message_counter = 1
         self.message = None
@@ -29,86 +238,72 @@ class EDIFACTToEnrichedXMLConverter:
         self.last_pat_type = None  # From D_4279
         self.last_pat_date = None  # From D_2475
         self.last_nad_role = None
+        self.last_party_element = None
         self.structure_id = "Structure0"
-        self.root = ET.Element("Interchange", format="EDIFACT", eancomstructure=self.structure_id)
+        self.handlers = {tag: getattr(self, name) for tag, name in self.SEGMENT_HANDLERS.items()}
+        root_attrib = {"format": "EDIFACT", "eancomstructure": self.structure_id}
+        if sink is None:
+            self.sub_element = ET.SubElement
+            self.root = ET.Element("Interchange", root_attrib)
+        else:
+            self.sub_element = sink.element
+            self.root = sink.root("Interchange", root_attrib)
+
+    def start_at(self, message_number, line_counter=0, organisation_counters=None):
+        # Continue the numbering of an interchange whose earlier messages are
+        # converted elsewhere, so node IRIs match a whole-interchange run.
+        self.message_counter = self.mid_counter = message_number
+        self.line_counter = line_counter
+        self.organisation_counters.update(organisation_counters or {})
 
     def parse_segments(self):
-        self.segments = [seg.strip() for seg in self.text.strip().split("'") if seg.strip()]
+        self.segments = list(SegmentTokenizer(self.text))
 
     def convert(self):
-        self.parse_segments()
-        for segment in self.segments:
-            tag, *data = segment.split('+')
+        # Segments are tokenized lazily, so a stream is never held in memory
+        # as a whole; data elements carry their release-aware components.
+        handlers = self.handlers
+        for tag, data in SegmentTokenizer(self.text):
 
             # Reset LineItem context if a new LIN or UNS segment starts
             if tag in {"LIN", "UNS"}:
+                self.close_node(self.current_item)
                 self.current_item = None
 
-            if tag == "UNB":
-                self.handle_unb(data)
-            elif tag == "UNH":
-                self.handle_unh(data)
-            elif tag == "BGM":
-                self.handle_bgm(data)
-            elif tag == "DTM":
-                self.handle_dtm(data)
-            elif tag == "NAD":
-                self.handle_nad(data)
-            elif tag == "RFF":
-                self.handle_rff(data)
-            elif tag == "MOA":
-                self.handle_moa(data)
-            elif tag == "TAX":
-                self.handle_tax(data)
-            elif tag == "CUX":
-                self.handle_cux(data)
-            elif tag == "ALC":
-                self.handle_alc(data)
-            elif tag == "PCD":
-                self.handle_pcd(data)
-            elif tag == "PAT":
-                self.handle_pat(data)
-            elif tag == "LIN":
-                self.handle_lin(data)
-            elif tag == "PIA":
-                self.handle_pia(data)
-            elif tag == "CTA":
-                self.handle_cta(data)
-            elif tag == "TOD":
-                self.handle_tod(data)
-            elif tag == "IMD":
-                self.handle_imd(data)
-            elif tag == "QTY":
-                self.handle_qty(data)
-            elif tag == "COM":
-                self.handle_com(data)
-            elif tag == "PRI":
-                self.handle_pri(data)
-            elif tag == "FTX":
-                self.handle_ftx(data)
-            elif tag == "UNT":
-                self.handle_unt(data)
-            elif tag == "UNS":
-                self.handle_uns(data)
-            elif tag == "UNZ":
-                self.handle_unz(data)
+            handler = handlers.get(tag)
+            if handler is not None:
+                handler(data)
             else:
                 print("Unknown segment:", tag)
 
         for code, (tag, val) in self.party_roles.items():
-            ET.SubElement(self.message, tag).text = val
+            self.sub_element(self.message, tag).text = val
+
+        for node in (self.current_item, self.last_party_element, self.message, self.root):
+            self.close_node(node)
+
+    def close_node(self, node):
+        # Nodes are complete once the converter moves past them; in direct
+        # graph mode that is when their triples are emitted.
+        if self.sink is not None and node is not None:
+            self.sink.close(node)
+
+    def to_graph(self):
+        if self.sink is None:
+            raise ValueError("Converter was created without a graph sink")
+        return self.sink.graph
 
     def add_meta(self, name, value):
         if value:
-            ET.SubElement(self.root, name).text = value
+            self.sub_element(self.root, name).text = value
 
     def handle_unb(self, data):
-        self.add_meta("synatxIdentifier", data[0].split(':')[0])
-        self.add_meta("synatxVersion", data[0].split(':')[1])
-        self.add_meta("senderIndicator", data[1].split(':')[0])
-        self.add_meta("recipientIndicator", data[2].split(':')[0])
-        self.add_meta("creationDate", data[3].split(':')[0])
-        self.add_meta("creationTime", data[3].split(':')[1])
+        self.add_meta("synatxIdentifier", data[0].components[0])
+        self.add_meta("synatxVersion", data[0].components[1])
+        self.add_meta("senderIndicator", data[1].components[0])
+        self.add_meta("recipientIndicator", data[2].components[0])
+        self.add_meta("creationDate", data[3].components[0])
+        self.add_meta("creationTime", data[3].components[1])
         self.add_meta("dataExchangeReference", data[4])
 
     def handle_unh(self, data):
@@ -119,7 +314,8 @@ class EDIFACTToEnrichedXMLConverter:
         details_value = f"Invoice{self.message_counter}"
         self.message_counter += 1
 
-        self.message = ET.SubElement(self.root, "Message", {
+        self.close_node(self.message)
+        self.message = self.sub_element(self.root, "Message", {
             "details": details_value,
             "type": "INVOIC",
             "version": "D",
@@ -127,9 +323,9 @@ class EDIFACTToEnrichedXMLConverter:
             "mid": mid_value, 
             "eancomstructure": self.structure_id
         })
-        ET.SubElement(self.message, "ProcessIdentification").text = "None"
+        self.sub_element(self.message, "ProcessIdentification").text = "None"
         self.add_meta("messageReferenceNumber", data[0])
-        parts = data[1].split(':')
+        parts = data[1].components
         self.add_meta("messageTypeIdentifier", parts[0])
         self.add_meta("versionNumberMessageType", parts[1])
         self.add_meta("releaseNumberMessageType", parts[2])
@@ -140,38 +336,18 @@ class EDIFACTToEnrichedXMLConverter:
         Handle BGM segment and replace numeric qualifiers with translations.
         """
 
-        # XML tags in order
-        tags = ["Dokumentenart", "Dokumentennummer", "Dokumentenfunktion"]
-
-        # Translation maps for relevant tags
-        translation_maps = {
-            "Dokumentenart": {
-                "380": "Rechnung",
-                "381": "Gutschrift",
-                "383": "Lastschrift",
-                "382": "Rechnungskorrektur",
-                "385": "Proformarechnung",
-                "389": "Selbstfakturierung"
-            },
-            "Dokumentenfunktion": {
-                "9": "Original",
-                "7": "Duplikat",
-                "31": "Abschlagsrechnung",
-                "46": "Korrigierte Rechnung"
-            }
-        }
-
-        for i, tag in enumerate(tags):
+        for i, tag in enumerate(BGM_TAGS):
             if i < len(data):
                 val = data[i]
                 # Replace with translation if available
-                translation = translation_maps.get(tag, {}).get(val, val)
-                elem = ET.SubElement(self.message, tag)
+                codelist = BGM_TRANSLATIONS.get(tag)
+                translation = codelist.get(val, val) if codelist else val
+                elem = self.sub_element(self.message, tag)
                 elem.text = translation
 
     def handle_dtm(self, data):
         for item in data:
-            parts = item.split(':')
+            parts = item.components
             if len(parts) >= 2:
                 qualifier, value = parts[0], parts[1]
 
@@ -181,25 +357,16 @@ class EDIFACTToEnrichedXMLConverter:
                     tag = f"DTM_{qualifier}"
 
                 target = self.current_item if self.current_item is not None else self.message
-                ET.SubElement(target, tag).text = value
+                self.sub_element(target, tag).text = value
                 
     def handle_pcd(self, data):
         if not data or len(data) == 0:
             return
 
         # Always split first entry by ':', fallback to data[1] if no ':'
-        parts = data[0].split(':', 1)
+        parts = data[0].components
         qualifier = parts[0]
-        value = parts[1] if len(parts) > 1 else (data[1] if len(data) > 1 else "")
-
-        # Direct mapping for most qualifiers
-        tag_map = {
-            "1": "AbschlagProzentsatz",
-            "2": "ZuschlagProzentsatz",
-            "7": "RechnungsProzentsatz",
-            "12": "AbzugProzentsatz",
-            "15": "StrafProzentsatz"
-        }
+        value = ":".join(parts[1:]) if len(parts) > 1 else (data[1] if len(data) > 1 else "")
 
         # Determine tag name
         if qualifier == "3":
@@ -216,18 +383,18 @@ class EDIFACTToEnrichedXMLConverter:
                 tag = f"PCD_{qualifier}"
                 base_tag = f"PCD_{qualifier}"
         else:
-            tag = tag_map.get(qualifier, f"PCD_{qualifier}")
-            base_tag = tag_map.get(qualifier, f"PCD_{qualifier}")
-
+            # Direct mapping for most qualifiers
+            tag = PCD_QUALIFIERS.get(qualifier, f"PCD_{qualifier}")
+            base_tag = tag
 
         # ✅ Use current_item if exists, else fallback to message
         target = self.current_item if self.current_item is not None else self.message
-        ET.SubElement(target, tag).text = value
+        self.sub_element(target, tag).text = value
 
         # ✅ Add extra element if PAT segment present
         if self.last_pat_type and base_tag:
             additional_tag = f"{base_tag}Zahlungsbedingungen"
-            ET.SubElement(target, additional_tag).text = value
+            self.sub_element(target, additional_tag).text = value
 
 
                 
@@ -245,22 +412,14 @@ class EDIFACTToEnrichedXMLConverter:
         else:
             return  # Skip unknown type codes
 
-        reason_label_map = {
-            "AAJ": "Kupferzuschlag", "ADS": "Palettenweise Bestellung", "ADQ": "Produktmix",
-            "ADR": "Andere Dienste", "AG": "Silberzuschlag", "DI": "Rabatt", "FC": "Frachtkosten",
-            "HD": "Bearbeitung der Sendung", "RAA": "Ermaessigung", "SC": "Zuschlag",
-            "SF": "Spezial Rabatt", "SH": "Spezielle Handhabungsdienstleistungen", "TD": "Handelsrabatt",
-            "ZD1": "Gegenseitig definiert", "ZS1": "Gegenseitig definiert", "ZZZ": "Gegenseitig definiert"
-        }
-
-        reason_label = reason_label_map.get(reason_code, "")
+        reason_label = ALC_REASON_LABELS.get(reason_code, "")
 
         self.last_alc_reason_label = reason_label
         self.last_alc_type_code = alc_type_code
 
         # ✅ Use current_item if it exists, else fallback to message
         target = self.current_item if self.current_item is not None else self.message
-        ET.SubElement(target, tag_name).text = reason_label
+        self.sub_element(target, tag_name).text = reason_label
 
 
 
@@ -269,7 +428,7 @@ class EDIFACTToEnrichedXMLConverter:
             return
 
         tax_type = data[1]  # D_5153, e.g. 'VAT' or 'GST'
-        tax_components = data[4].split(':') if len(data) > 4 else []
+        tax_components = data[4].components if len(data) > 4 else []
 
         if not tax_type or len(tax_components) < 4 or not tax_components[3]:
             return
@@ -278,14 +437,14 @@ class EDIFACTToEnrichedXMLConverter:
 
         tag_name = f"TAX_{tax_type}"
         target = self.current_item if self.current_item is not None else self.message
-        ET.SubElement(target, tag_name).text = tax_value
+        self.sub_element(target, tag_name).text = tax_value
         
 
     def handle_moa(self, data):
-        if not data or ':' not in data[0]:
+        if not data:
             return
 
-        parts = data[0].split(':')
+        parts = data[0].components
         if len(parts) < 2:
             return
 
@@ -301,25 +460,18 @@ class EDIFACTToEnrichedXMLConverter:
             tag = f"MOA_{code}"
 
         target = self.current_item if self.current_item is not None else self.message
-        ET.SubElement(target, tag).text = value
+        self.sub_element(target, tag).text = value
 
         if currency:
-            ET.SubElement(target, "Waehrung").text = currency
+            self.sub_element(target, "Waehrung").text = currency
         
     def handle_cux(self, data):
         if not data or len(data) == 0:
             return
         print(data)
 
-        currency_tag_map = {
-            "4": "WaehrungRechnung",
-            "9": "WaehrungBestellung",
-            "10": "WaehrungPreisangabe",
-            "11": "WaehrungZahlung"
-        }
-
         for entry in data:
-            parts = entry.split(":")
+            parts = entry.components
             if len(parts) == 3:
                 d_6347, d_6345, d_6343 = parts
             elif len(parts) == 2:
@@ -330,11 +482,11 @@ class EDIFACTToEnrichedXMLConverter:
 
             # Always add general currency tag based on D_6347
             if d_6347:
-                ET.SubElement(self.message, "Waehrung").text = d_6345
+                self.sub_element(self.message, "Waehrung").text = d_6345
 
             # Add specific tag if D_6343 is recognized
-            if d_6343 in currency_tag_map:
-                ET.SubElement(self.message, currency_tag_map[d_6343]).text = d_6345
+            if d_6343 in CUX_CURRENCY_QUALIFIERS:
+                self.sub_element(self.message, CUX_CURRENCY_QUALIFIERS[d_6343]).text = d_6345
 
             
     def handle_pat(self, data):
@@ -342,42 +494,19 @@ class EDIFACTToEnrichedXMLConverter:
             return 
         self.last_pat_type = data[0]
         # D_4279: ZahlungsbedingungsArt
-        terms_type_map = {
-            "1": "Wie ueblich",
-            "3": "Fixdatum",
-            "7": "Verlaengert",
-            "20": "Vertragsstrafen",
-            "22": "Abzug",
-            "ZZZ": "Gemeinsam festgelegt"
-        }
-        ET.SubElement(self.message, "ZahlungsbedingungsArt").text = terms_type_map.get(data[0], f"{data[0]} nicht_vorhanden")
+        self.sub_element(self.message, "ZahlungsbedingungsArt").text = PAT_TERMS_TYPES.get(data[0], f"{data[0]} nicht_vorhanden")
 
         # C112: D_2475:D_2009:D_2151:D_2152
         if len(data) > 2 and data[2]:
-            c112_parts = (data[2].split(':') + [""] * 4)[:4]
+            c112_parts = (data[2].components + [""] * 4)[:4]
             ref_code, relation_code, unit_code, number = c112_parts
 
-            reference_map = {
-                "5": "Rechnungsdatum",
-                "9": "Rechnungseingangsdatum"
-            }
-            relation_map = {
-                "1": "",
-                "2": "vor ",
-                "3": "nach "
-            }
-            unit_map = {
-                "D": "Tag(e)",
-                "M": "Monat(e)",
-                "Y": "Jahr(e)"
-            }
-
             if number:
-                ref_label = reference_map.get(ref_code, f"{ref_code} nicht_vorhanden")
-                relation_prefix = relation_map.get(relation_code, f"{relation_code} nicht_vorhanden ")
-                unit_label = unit_map.get(unit_code, f"{unit_code} nicht_vorhanden")
+                ref_label = PAT_REFERENCES.get(ref_code, f"{ref_code} nicht_vorhanden")
+                relation_prefix = PAT_RELATIONS.get(relation_code, f"{relation_code} nicht_vorhanden ")
+                unit_label = PAT_UNITS.get(unit_code, f"{unit_code} nicht_vorhanden")
                 text = f"{number} {unit_label} {relation_prefix}{ref_label}".strip()
-                ET.SubElement(self.message, "ZahlungsbezugsterminTage").text = text
+                self.sub_element(self.message, "ZahlungsbezugsterminTage").text = text
 
 
     def handle_imd(self, data):
@@ -385,7 +514,7 @@ class EDIFACTToEnrichedXMLConverter:
         description = data[2].lstrip(':').strip()
 
         if description:
-            ET.SubElement(self.current_item, "Description").text = description
+            self.sub_element(self.current_item, "Description").text = description
 
     def handle_nad(self, data):
         if not data or self.message is None:
@@ -399,26 +528,14 @@ class EDIFACTToEnrichedXMLConverter:
         org_value = f"{party_qualifier}{count}"
 
         # 3. Human-readable agentRole mapping
-        agent_role_labels = {
-            "AB": "SalesAgentRole", "BO": "BrokerOrSalesOfficeRole",
-            "BS": "CalculateAndDeliverToRole", "BY": "BuyerRole",
-            "CN": "RecipientRole", "CPE": "Zentralregulierer_EAN_CodeRole",
-            "DP": "DeliveryPartyRole", "II": "InvoicingPartyRole",
-            "IV": "InvoiceeRole", "PE": "PaymentRecipientRole",
-            "PR": "PayeeRole", "PW": "DespatchPartyRole",
-            "RE": "RecipientOfInvoiceRegulationRole", "RG": "RegulatorRole",
-            "SCO": "SuppliersCompanyHeadquarterRole", "SE": "SellerRole",
-            "SN": "WarehouseNumberRole", "SR": "RepresentativeOrAgentOfSupplierRole",
-            "ST": "SendToRole", "SU": "SupplierRole", "WS": "WholesalerRole",
-            "UC": "FinalConsigneeRole"
-        }
-        readable_role = agent_role_labels.get(party_qualifier, party_qualifier)
+        readable_role = NAD_AGENT_ROLES.get(party_qualifier, party_qualifier)
 
         # 4. Add role attribute directly to the <Message> element
         self.message.attrib[readable_role] = org_value
 
         # 5. Create <Party> element with `details` attribute from <Message>
-        self.last_party_element = ET.SubElement(
+        self.close_node(self.last_party_element)
+        self.last_party_element = self.sub_element(
             self.message,
             "Party",
             attrib={
@@ -429,29 +546,18 @@ class EDIFACTToEnrichedXMLConverter:
         )
 
         # 6. Strict mapping of EDIFACT NAD segment fields
-        field_map = {
-            1: ("PartyID", True, ["PartyID", "CodeListQualifier", "CodeListResponsibleAgency"]),
-            2: ("NameAddressLine", False, "NameAddressLine"),
-            3: ("PartyName", False, "PartyName"),
-            4: ("Street", False, "Street"),
-            5: ("City", False, "City"),
-            6: ("CountrySubEntity", False, "CountrySubEntity"),
-            7: ("PostalCode", False, "PostalCode"),
-            8: ("CountryCode", False, "CountryCode")
-        }
-
-        for idx, (label, is_list, tags) in field_map.items():
+        for idx, label, is_list, tags in NAD_FIELDS:
             val = data[idx] if len(data) > idx and data[idx] else ""
             if not val:
                 continue
 
             if is_list:
-                parts = val.split(':')
+                parts = val.components
                 for tag, content in zip(tags, parts):
                     if content:
-                        ET.SubElement(self.last_party_element, tag).text = content
+                        self.sub_element(self.last_party_element, tag).text = content
             else:
-                ET.SubElement(self.last_party_element, tags).text = val
+                self.sub_element(self.last_party_element, tags).text = val
 
         # Save the last role for later usage (e.g., in handle_rff)
         self.last_nad_role = party_qualifier
@@ -465,19 +571,12 @@ class EDIFACTToEnrichedXMLConverter:
         # D_4055: Delivery or Transport Terms Function Code
         delivery_function_code = data[0].strip() if len(data) > 0 else ""
 
-        delivery_function_map = {
-            "2": "Transport",
-            "3": "Lieferbedingung",
-            "4": "Transportkosten",
-            "5": "LieferbedingungenVereinbart"
-            # Add more as needed
-        }
-        delivery_function_text = delivery_function_map.get(delivery_function_code, f"Lieferbedingung_{delivery_function_code}")
+        delivery_function_text = TOD_FUNCTIONS.get(delivery_function_code, f"Lieferbedingung_{delivery_function_code}")
 
         # C100: D_4053:D_1131:D_3055
         delivery_terms = ""
         if len(data) > 2 and data[2]:
-            parts = data[2].split(':')
+            parts = data[2].components
             if len(parts) >= 1:
                 delivery_terms = parts[0].strip()  # Usually the Incoterm (e.g., DAP)
 
@@ -485,17 +584,17 @@ class EDIFACTToEnrichedXMLConverter:
         target = self.message
 
         # Add function code element
-        ET.SubElement(target, "LieferbedingungenFunktion").text = delivery_function_text
+        self.sub_element(target, "LieferbedingungenFunktion").text = delivery_function_text
 
         # Add delivery terms element if present
         if delivery_terms:
-            ET.SubElement(target, "Lieferbedingung").text = delivery_terms
+            self.sub_element(target, "Lieferbedingung").text = delivery_terms
                 
     def handle_rff(self, data):
         if not data or len(data) == 0:
             return
 
-        parts = data[0].split(":")
+        parts = data[0].components
         qualifier = parts[0] if len(parts) >= 1 else None
         ref_value = parts[1] if len(parts) >= 2 else ""  # fallback: empty string if no value provided
 
@@ -503,11 +602,11 @@ class EDIFACTToEnrichedXMLConverter:
 
         if qualifier == "VA" and self.last_party_element is not None and self.last_nad_role:
             tag = "Umsatzsteuernummer"
-            ET.SubElement(self.last_party_element, tag).text = ref_value
+            self.sub_element(self.last_party_element, tag).text = ref_value
         else:
             tag = f"Referenz_{qualifier}"
             target = self.current_item if self.current_item is not None else self.message
-            ET.SubElement(target, tag).text = ref_value
+            self.sub_element(target, tag).text = ref_value
 
     def handle_lin(self, data):
         if not data:
@@ -520,126 +619,75 @@ class EDIFACTToEnrichedXMLConverter:
         message_details = self.message.attrib.get("details", "Invoice1")  # fallback
 
         # Create LineItem with details attribute
-        self.current_item = ET.SubElement(self.message, "LineItem", {
+        self.current_item = self.sub_element(self.message, "LineItem", {
             "nid": line_id,
             "details": message_details
         })
 
         # Add the product identification element(s)
         if len(data) >= 3:
-            parts = data[2].split(':')
+            parts = data[2].components
             article_number = parts[0] if len(parts) >= 1 else ""
             qualifier = parts[1] if len(parts) >= 2 else ""
 
-            qualifier_map = {
-                "BP": "Teilnummer_des_Kaeufers",
-                "EN": "International_Article_Number",
-                "PV": "Nummer_der_Aktionsvariante",
-                "HS": "Harmonisiertes_System",
-                "GN": "Nationaler_Produktgruppencode",
-                "IN": "Artikelnummer_des_Kaeufers",
-                "MF": "Artikelnummer_des_Herstellers",
-                "LI": "Positionszeilennummer",
-                "SA": "Artikelnummer_des_Lieferanten",
-                "UP": "Universal_Product_Code"
-            }
-
-            tag = qualifier_map.get(qualifier, f"nicht_vorhanden_{qualifier}")
+            tag = PRODUCT_ID_QUALIFIERS.get(qualifier, f"nicht_vorhanden_{qualifier}")
             if article_number:
-                ET.SubElement(self.current_item, tag).text = article_number
-                ET.SubElement(self.current_item, "Produktidentifikation").text = qualifier_map.get(qualifier, f"nicht_vorhanden_{qualifier}")
+                self.sub_element(self.current_item, tag).text = article_number
+                self.sub_element(self.current_item, "Produktidentifikation").text = tag
 
         # Create InvoiceLine element (from D_1082, which is usually in data[1])
         if len(data) > 1 and data[1]:
-            ET.SubElement(self.current_item, "InvoiceLine").text = data[1]
+            self.sub_element(self.current_item, "InvoiceLine").text = data[1]
         else:
             # Always create it, even if empty
-            ET.SubElement(self.current_item, "InvoiceLine").text = ""
+            self.sub_element(self.current_item, "InvoiceLine").text = ""
 
 
     def handle_pia(self, data):
         if not self.current_item or not data:
             return
 
-
-        qualifier_map = {
-            "BP": "Teilnummer_des_Kaeufers",
-            "EN": "International_Article_Number",
-            "PV": "Nummer_der_Aktionsvariante",
-            "HS": "Harmonisiertes_System",
-            "GN": "Nationaler_Produktgruppencode",
-            "IN": "Artikelnummer_des_Kaeufers",
-            "MF": "Artikelnummer_des_Herstellers",
-            "LI": "Positionszeilennummer",
-            "SA": "Artikelnummer_des_Lieferanten",
-            "UP": "Universal_Product_Code"
-        }
-
         # Process each additional product identifier
         for item in data[1:]:
-            parts = item.split(':')
+            parts = item.components
             article_number = parts[0] if len(parts) >= 1 else ""
             qualifier = parts[1] if len(parts) >= 2 else ""
 
-            tag = qualifier_map.get(qualifier, f"nicht_vorhanden_{qualifier}")
+            tag = PRODUCT_ID_QUALIFIERS.get(qualifier, f"nicht_vorhanden_{qualifier}")
             if article_number:
-                ET.SubElement(self.current_item, tag).text = article_number
+                self.sub_element(self.current_item, tag).text = article_number
 
         # Determine the first additional product identifier (if any) and set as Zusaetzliche_Produktidentifikation
         zusatz_identifikation = "nicht_vorhanden"
         for item in data[1:]:
-            parts = item.split(':')
+            parts = item.components
             qualifier = parts[1] if len(parts) >= 2 else ""
-            zusatz_identifikation = qualifier_map.get(qualifier, f"nicht_vorhanden_{qualifier}")
+            zusatz_identifikation = PRODUCT_ID_QUALIFIERS.get(qualifier, f"nicht_vorhanden_{qualifier}")
             break  # only the first occurrence
 
-        ET.SubElement(self.current_item, "Zusaetzliche_Produktidentifikation").text = zusatz_identifikation
+        self.sub_element(self.current_item, "Zusaetzliche_Produktidentifikation").text = zusatz_identifikation
 
     def handle_qty(self, data):
         if self.current_item is None or not data or len(data) < 1:
             return
-        parts = data[0].split(':')
+        parts = data[0].components
         if len(parts) < 2:
             return
         qualifier, amount = parts[0], parts[1]
         unit = parts[2] if len(parts) > 2 else ""
 
-        # Mapping of qualifier to element name suffix
-        qualifier_map = {
-            "1": "Diskrete_Menge",
-            "12": "Ausgelieferte_Menge",
-            "46": "Gelieferte_Menge",
-            "47": "Berechnete_Menge",
-            "59": "Verbrauchereinheiten",
-            "61": "Retourmenge",
-            "131": "Liefermenge",
-            "192": "Menge_ohne_Berechnung",
-            "194": "Erhalten_und_akzeptiert"
-        }
-
-        # Translation of known EDIFACT unit codes
-        unit_translation = {
-            "PCE": "Stueck",
-            "C62": "Einheit",
-            "KGM": "Kilogramm",
-            "LTR": "Liter",
-            "MTR": "Meter",
-            "HUR": "Stunde",
-            "DAY": "Tag"
-            # Add more as needed
-        }
-
-        element_base = qualifier_map.get(qualifier, f"Menge_{qualifier}")
-        unit_readable = unit_translation.get(unit, unit)
+        # Qualifier gives the element name, known unit codes are translated
+        element_base = QTY_QUALIFIERS.get(qualifier, f"Menge_{qualifier}")
+        unit_readable = QTY_UNITS.get(unit, unit)
         # Create separate sub-elements
-        #ET.SubElement(self.current_item, f"{element_base}_Wert").text = amount
+        #self.sub_element(self.current_item, f"{element_base}_Wert").text = amount
         if unit:
-            ET.SubElement(self.current_item, f"{element_base}_Einheit").text = unit_readable
-            ET.SubElement(self.current_item, element_base).text = f"{amount} {unit_readable}"
-            ET.SubElement(self.current_item, "Mengen_Einheit").text = unit_readable
+            self.sub_element(self.current_item, f"{element_base}_Einheit").text = unit_readable
+            self.sub_element(self.current_item, element_base).text = f"{amount} {unit_readable}"
+            self.sub_element(self.current_item, "Mengen_Einheit").text = unit_readable
         else:
-            ET.SubElement(self.current_item, element_base).text = amount
-            ET.SubElement(self.current_item, f"{element_base}_Einheit").text = amount
+            self.sub_element(self.current_item, element_base).text = amount
+            self.sub_element(self.current_item, f"{element_base}_Einheit").text = amount
 
     def handle_cta(self, data):
         if not data or len(data) == 0:
@@ -652,28 +700,18 @@ class EDIFACTToEnrichedXMLConverter:
         # D_3412: Contact Name or Department
         contact_name = data[1].strip() if len(data) > 1 else ""
 
-        # Map for Contact Function Code
-        contact_function_map = {
-            "AD": "Sachbearbeiter",
-            "IC": "Informationskontakt",
-            "PD": "LeiterEinkauf",
-            "AP": "Kontaktperson",
-            "OD": "Bestellkontakt"
-            # Add more as needed
-        }
-
         # Determine the tag for the function code
-        function_tag = contact_function_map.get(contact_function_code, f"Kontakt_{contact_function_code}")
+        function_tag = CTA_FUNCTIONS.get(contact_function_code, f"Kontakt_{contact_function_code}")
 
         # Use the last_party_element if available, else fallback to message
         target = self.last_party_element if self.last_party_element is not None else self.message
 
         # Add function code element
-        ET.SubElement(target, "KontaktFunktion").text = function_tag
+        self.sub_element(target, "KontaktFunktion").text = function_tag
 
         # Add contact name element using the D_3412 element tag
         if contact_name:
-            ET.SubElement(target, "D_3412").text = contact_name
+            self.sub_element(target, "D_3412").text = contact_name
 
     def handle_com(self, data):
         if not data or len(data) == 0:
@@ -681,21 +719,13 @@ class EDIFACTToEnrichedXMLConverter:
 
 
         # Split the first entry by ':' to get the communication value and channel
-        parts = data[0].split(':', 1)
+        parts = data[0].components
         comm_value = parts[0].strip() if len(parts) > 0 else ""
-        comm_channel = parts[1].strip() if len(parts) > 1 else ""
-
-        # Determine the tag for communication channel
-        comm_tag_map = {
-            "EM": "EmailAdresse",
-            "TE": "TelefonNummer",
-            "FX": "TelefaxNummer",
-            "ED": "EDI-Adresse"
-            # Add more as needed
-        }
+        comm_channel = ":".join(parts[1:]).strip() if len(parts) > 1 else ""
 
-        # Fallback to generic channel if not in map
-        channel_label = comm_tag_map.get(comm_channel, f"Kommunikationskanal_{comm_channel}")
+        # Determine the tag for communication channel, with a generic
+        # fallback if it is not in the codelist
+        channel_label = COM_CHANNELS.get(comm_channel, f"Kommunikationskanal_{comm_channel}")
 
         # Final tag name: "Ansprechpartner_" + label
         final_tag = f"Ansprechpartner_{channel_label}"
@@ -705,7 +735,7 @@ class EDIFACTToEnrichedXMLConverter:
 
         # Add communication tag with value
         if comm_value:
-            ET.SubElement(target, final_tag).text = comm_value
+            self.sub_element(target, final_tag).text = comm_value
 
 
 
@@ -714,7 +744,7 @@ class EDIFACTToEnrichedXMLConverter:
         if self.current_item is None or not data or len(data) == 0:
             return
 
-        parts = data[0].split(':')
+        parts = data[0].components
         price_type_code = parts[0].strip() if len(parts) > 0 else ""
         price_value = parts[1].strip() if len(parts) > 1 else ""
         preisquelle = parts[2].strip() if len(parts) > 2 else ""
@@ -722,60 +752,33 @@ class EDIFACTToEnrichedXMLConverter:
         unit_code = parts[5].strip() if len(parts) > 5 and parts[5] else None
 
         # Tag naming based on D_5125
-        tag_map = {
-            "AAA": "Nettokalkulation",
-            "AAB": "Bruttokalkulation",
-            "GRP": "Bruttopreis_pro_Einheit",
-            "INV": "Rechnungspreis",
-            "NTP": "Nettopreis_pro_Einheit"
-        }
-        tag_name = tag_map.get(price_type_code, f"Preis_{price_type_code}")
+        tag_name = PRI_TYPES.get(price_type_code, f"Preis_{price_type_code}")
 
         # Add price value element
-        ET.SubElement(self.current_item, tag_name).text = price_value
+        self.sub_element(self.current_item, tag_name).text = price_value
 
         # 🔴 Add PreisArt if GRP or NTP
-        if price_type_code in ["GRP", "NTP"]:
-            ET.SubElement(self.current_item, "PreisArt").text = tag_name
-
-        # 🔴 PreisQuelle translation mapping
-        preisquelle_map = {
-            "CT": "Katalog",
-            "AA": "Herstellerangabe",
-            "AB": "Verkaeuferangabe",
-            "AC": "Kaeuferangabe"
-            # Add more as needed
-        }
+        if price_type_code in ("GRP", "NTP"):
+            self.sub_element(self.current_item, "PreisArt").text = tag_name
 
         # 🔴 Add PreisQuelle if present
         if preisquelle:
-            preisquelle_label = preisquelle_map.get(preisquelle, f"{preisquelle}_nicht_vorhanden")
-            ET.SubElement(self.current_item, "PreisQuelle").text = preisquelle_label
+            preisquelle_label = PRI_SOURCES.get(preisquelle, f"{preisquelle}_nicht_vorhanden")
+            self.sub_element(self.current_item, "PreisQuelle").text = preisquelle_label
 
         # Handle unit label only if unit_code is valid
-        unit_translation = {
-            "M": "Meter",
-            "PCE": "Stueck",
-            "PK": "Packet",
-            "PR": "Paar",
-            "CEL": "Celsius",
-            "GRM": "Gramm",
-            "MMT": "Millimeter",
-            "MTK": "Quadratmeter"
-        }
-
-        if unit_code and unit_code in unit_translation:
-            unit_label = unit_translation[unit_code]
+        if unit_code and unit_code in PRI_UNITS:
+            unit_label = PRI_UNITS[unit_code]
 
             # Add unit element
-            ET.SubElement(self.current_item, "Preis_Maßeinheit").text = unit_label
+            self.sub_element(self.current_item, "Preis_Maßeinheit").text = unit_label
 
             # Add combined price + unit
-            ET.SubElement(self.current_item, f"{tag_name}_Einheit").text = f"{price_value} {unit_label}"
+            self.sub_element(self.current_item, f"{tag_name}_Einheit").text = f"{price_value} {unit_label}"
 
             # Add unit base element only if present
             if unit_base:
-                ET.SubElement(self.current_item, "unitPriceBase").text = unit_base
+                self.sub_element(self.current_item, "unitPriceBase").text = unit_base
 
 
 
@@ -786,13 +789,13 @@ class EDIFACTToEnrichedXMLConverter:
             return
 
         qualifier = data[0].strip()  # D_4451
-        text_components = data[3].split(':') if len(data) >= 4 else []
+        text_components = data[3].components if len(data) >= 4 else []
         full_text = ' '.join(part.strip() for part in text_components if part.strip())
         tag = f"FTX_{qualifier if qualifier else 'UNDEFINED'}"
 
         target = self.current_item if self.current_item is not None else self.message
         if full_text:
-            ET.SubElement(target, tag).text = full_text
+            self.sub_element(target, tag).text = full_text
 
     def handle_unt(self, data):
         self.add_meta("totalNumberOfSegments", data[0])
@@ -804,56 +807,112 @@ class EDIFACTToEnrichedXMLConverter:
         self.add_meta("dataExchangeCounter", data[0])
         self.add_meta("exchangeReference", data[1])
 
-    def to_string(self):
-        rough = ET.tostring(self.root, 'utf-8')
-        reparsed = minidom.parseString(rough)
-        return reparsed.toprettyxml(indent="  ")
-
-def yarrrmlparser_bash():
-    p = Popen([folder_path + 'yarrrmlparser.sh'], stdout = PIPE , stderr = PIPE)
-    p.communicate()
-    p.wait()
-
-def rmlmapper_bash():
-    p = Popen([folder_path + 'rmlmapper.sh'], stdout = PIPE , stderr = PIPE)
+    def to_string(self, pretty=False):
+        # The enriched XML as text; pretty=True indents it (for reading it).
+        if self.sink is not None:
+            raise ValueError("No XML is built in direct graph mode")
+        return ET.tostring(self.pretty_root() if pretty else self.root, encoding="unicode")
+
+    def write_xml(self, file, pretty=False):
+        # Serialize the enriched XML straight from the tree to a path or a
+        # binary stream, without building the whole document as a string.
+        if self.sink is not None:
+            raise ValueError("No XML is built in direct graph mode")
+        tree = ET.ElementTree(self.pretty_root() if pretty else self.root)
+        tree.write(file, encoding="utf-8", xml_declaration=True)
+
+    def pretty_root(self):
+        # An indented copy; indenting the tree itself would add whitespace
+        # text the mapping could see.
+        root = copy.deepcopy(self.root)
+        ET.indent(root, space="  ")
+        return root
+
+def run_script(script, *args, cwd=None):
+    # Scripts take their input/output files as optional arguments; cwd lets
+    # each job run in its own workspace.
+    p = Popen([folder_path + script, *args], stdout = PIPE , stderr = PIPE, cwd = cwd)
     p.communicate()
-    p.wait()
+    return p.returncode
+
+def cached_yarrrmlparser(script, yarrrml_file="mapping.yarrrml", rml_file="mapping.rml.ttl"):
+    # Only run the Node.js parser when the YARRRML source changed; the
+    # compiled RML is kept in the mapping cache under the source hash.
+    with io.open(yarrrml_file, "rb") as f:
+        cached = cache_path(mapping_digest(f.read()), ".rml.ttl")
+    if os.path.isfile(cached):
+        with io.open(cached, "rb") as f:
+            atomic_write(os.path.abspath(rml_file), f.read())
+        return
+    returncode = run_script(script, os.path.abspath(yarrrml_file), os.path.abspath(rml_file))
+    if returncode == 0 and os.path.isfile(rml_file):
+        with io.open(rml_file, "rb") as f:
+            atomic_write(cached, f.read())
+
+def yarrrmlparser_bash(yarrrml_file="mapping.yarrrml", rml_file="mapping.rml.ttl"):
+    cached_yarrrmlparser('yarrrmlparser.sh', yarrrml_file, rml_file)
+
+def rmlmapper_bash(rml_file="mapping.rml.ttl", output_file="invoice.ttl", cwd=None):
+    run_script('rmlmapper.sh', rml_file, output_file, cwd=cwd)
     
-def yarrrmlparser_batch():
-    p = Popen([folder_path + 'yarrrmlparser.bat'], stdout = PIPE , stderr = PIPE)
-    p.communicate()
-    p.wait()
-
-def rmlmapper_batch():
-    p = Popen([folder_path + 'rmlmapper.bat'], stdout = PIPE , stderr = PIPE)
-    p.communicate()
-    p.wait()
-
-def validates(process):
-
-    data_graph = \
-        folder_path + 'invoice.ttl'
-    data_graph = path.abspath(data_graph)
-
-    process_type = process+ '.ttl'
-    shapes_graph = \
-        folder_path + process_type
-        
-    shapes_graph = path.abspath(shapes_graph)
-
-    conforms, v_graph, v_text = validate(data_graph,data_graph_format="ttl", shacl_graph=shapes_graph,
-                                        shacl_graph_format="ttl", inference='rdfs',advanced=True, debug=False, 
-                                        serialize_report_graph=True)
-    result = v_text.split("\n")
-    message_lines = [line for line in result if line.strip().startswith("Message:")]
-    for j in range(len(message_lines)):
-        parts = message_lines[j].split(';')
-        parts = [part.strip() for part in parts]
-        message = parts[0].replace('Message:', '')
-        print(message)   
-
-    return v_text
-
+def yarrrmlparser_batch(yarrrml_file="mapping.yarrrml", rml_file="mapping.rml.ttl"):
+    cached_yarrrmlparser('yarrrmlparser.bat', yarrrml_file, rml_file)
+
+def rmlmapper_batch(rml_file="mapping.rml.ttl", output_file="invoice.ttl", cwd=None):
+    run_script('rmlmapper.bat', rml_file, output_file, cwd=cwd)
+
+def validation_results(process, data_graph=None, shapes_graph=None, inference='rdfs', engine='pyshacl'):
+    # data_graph is an rdflib Graph handed over from the mapping stage, an
+    # iterable of triples, or a Turtle file (default: invoice.ttl next to
+    # this file). shapes_graph is a pre-loaded rdflib Graph; by default the
+    # shapes registry parses <process>.ttl once and reuses it.
+    # inference='precomputed' adds the RDFS entailments the shapes can see
+    # in one pass instead of running owlrl (see rdfs_inference.py).
+    # engine='native' evaluates the core constraints with compiled shapes and
+    # leaves the rest to pyshacl (see native_shacl.py); same report.
+    # The data graph is never changed: both engines validate a copy of it
+    # in canonical triple order. Returns a ValidationReport (see
+    # validation_results.py).
+    if data_graph is None:
+        data_graph = \
+            folder_path + 'invoice.ttl'
+    if isinstance(data_graph, str):
+        with stage("graph load"):
+            data_graph = Graph().parse(path.abspath(data_graph), format="turtle")
+    elif not isinstance(data_graph, Graph):
+        triples = data_graph
+        with stage("graph load"):
+            data_graph = Graph()
+            for triple in triples:
+                data_graph.add(triple)
+
+    if shapes_graph is None:
+        shapes_graph = shapes_registry.get(process)
+
+    if inference == 'precomputed':
+        with stage("inference"):
+            data_graph, inference = precomputed_inference(data_graph, shapes_graph)
+
+    if engine == 'native':
+        return validate_native(data_graph, shapes_graph, inference)
+    return validate_report(data_graph, shapes_graph, inference)
+
+def validation_report(process, data_graph=None, shapes_graph=None, inference='rdfs', engine='pyshacl'):
+    # pyshacl's (conforms, report graph as Turtle, report text), for callers
+    # that want the serialized report; see validation_results().
+    report = validation_results(process, data_graph, shapes_graph, inference, engine)
+    v_graph = report.serialize() if report.graph is not None else None
+    return report.conforms, v_graph, report.text
+
+def print_messages(results):
+    for result in results:
+        for message in result.messages:
+            print(message)
+
+def validates(process, data_graph=None, shapes_graph=None):
+    report = validation_results(process, data_graph, shapes_graph)
+    print_messages(report.results)
+    return report
 
 
 if __name__ == "__main__":
@@ -862,7 +921,4 @@ if __name__ == "__main__":
 
     converter = EDIFACTToEnrichedXMLConverter(edi_data)
     converter.convert()
-    enriched_xml = converter.to_string()
-
-    with open("enriched_output.xml", "w") as f:
-        f.write(enriched_xml)
+    converter.write_xml("enriched_output.xml", pretty=True)
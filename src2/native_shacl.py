@@ -0,0 +1,696 @@
+# native_shacl.py
+#
+# Fast path for the SHACL core constraints the process shapes are made of
+# (sh:minCount, sh:maxCount, sh:datatype, sh:minLength, sh:maxLength, sh:in,
+# sh:hasValue, sh:or, sh:not, sh:property and sh:sparql on sh:targetClass
+# shapes). Shapes are compiled once into checks over a subject/predicate index
+# of the data graph; SPARQL constraints are parsed and translated once, and
+# those comparing a total with the sum over related nodes (:SumNetPrice) are
+# evaluated by walking the graph instead. The pyshacl shape and constraint
+# objects are kept to word the results, so the report is the one pyshacl
+# would produce. Shapes using anything else are still validated by pyshacl,
+# on the part of the shapes graph they refer to.
+
+import math
+import weakref
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+import owlrl
+from pyshacl import Validator
+from pyshacl.constraints import CONSTRAINT_PARAMETERS_MAP
+from pyshacl.constraints.core.cardinality_constraints import (
+    MaxCountConstraintComponent, MinCountConstraintComponent)
+from pyshacl.constraints.core.logical_constraints import NotConstraintComponent, OrConstraintComponent
+from pyshacl.constraints.core.other_constraints import HasValueConstraintComponent, InConstraintComponent
+from pyshacl.constraints.core.shape_based_constraints import PropertyConstraintComponent
+from pyshacl.constraints.core.string_based_constraints import (
+    MaxLengthConstraintComponent, MinLengthConstraintComponent)
+from pyshacl.constraints.core.value_constraints import DatatypeConstraintComponent
+from pyshacl.constraints.sparql.sparql_based_constraints import SPARQLBasedConstraint
+from pyshacl.errors import ConstraintLoadWarning, ReportableRuntimeError, ValidationFailure
+from pyshacl.graph_abstraction import DataGraph
+from pyshacl.inference import CustomRDFSSemantics
+from pyshacl.shapes_graph import ShapesGraph
+from rdflib import BNode, Graph, Literal, Namespace, URIRef, Variable
+from rdflib.namespace import RDF, RDFS, XSD
+from rdflib.plugins.sparql import prepareQuery
+
+from stage_timer import stage
+from validation_results import ValidationReport, canonical_graph
+
+SH = Namespace("http://www.w3.org/ns/shacl#")
+
+# SHACL-AF features that run before validation or change what is validated;
+# shapes graphs using any of them are left to pyshacl entirely
+ADVANCED_PREDICATES = (SH.rule, SH.target, SH.entailment)
+ADVANCED_TYPES = (SH.SPARQLFunction, SH.SHACLFunction, SH.JSFunction, SH.SPARQLTargetType,
+                  SH.JSTargetType, SH.ConstraintComponent)
+
+NUMERIC_DATATYPES = frozenset([
+    XSD.decimal, XSD.float, XSD.double, XSD.integer, XSD.nonPositiveInteger, XSD.negativeInteger,
+    XSD.long, XSD.int, XSD.short, XSD.byte, XSD.nonNegativeInteger, XSD.unsignedLong,
+    XSD.unsignedInt, XSD.unsignedShort, XSD.unsignedByte, XSD.positiveInteger])
+
+_compiled = weakref.WeakKeyDictionary()
+
+
+class Unsupported(Exception):
+    """A shape uses something the native evaluator does not implement."""
+
+
+class DataIndex:
+    """Objects by (subject, predicate) for the paths the shapes use, subjects by class."""
+
+    def __init__(self, graph, predicates, classes, canonical=False):
+        self.values = values = {}
+        self.instances = instances = {}
+        for s, p, o in graph:
+            if p in predicates:
+                values.setdefault((s, p), set()).add(o)
+            if p == RDF.type and o in classes:
+                instances.setdefault(o, set()).add(s)
+        self.graph = graph
+        self._canonical = graph if canonical else None
+        self.has_subclasses = (None, RDFS.subClassOf, None) in graph
+
+    def canonical_graph(self):
+        """The graph in the triple order pyshacl validates it in (see validation_results.canonical_graph)."""
+        if self._canonical is None:
+            self._canonical = canonical_graph(self.graph)
+        return self._canonical
+
+    def objects(self, subject, predicate):
+        return self.values.get((subject, predicate), frozenset())
+
+    def focus_nodes(self, classes):
+        found = set()
+        for c in classes:
+            found.update(self.instances.get(c, ()))
+            if self.has_subclasses:
+                for subclass in self.graph.transitive_subjects(RDFS.subClassOf, c):
+                    if subclass != c:
+                        found.update(self.graph.subjects(RDF.type, subclass))
+        return found
+
+
+class CompiledShape:
+    """
+    One shape as a list of checks. validate() appends pyshacl result
+    tuples to `reports`, or with reports=None only answers whether the
+    focus nodes conform (sh:or / sh:not operands).
+    """
+
+    def __init__(self, shape, checks):
+        self.shape = shape
+        self.path = shape.path() if shape.is_property_shape else None
+        self.deactivated = shape.deactivated
+        self.checks = checks
+
+    def validate(self, index, focus_nodes, reports):
+        if self.deactivated or not focus_nodes:
+            return True
+        if self.path is None:
+            focus_value_nodes = {f: (f,) for f in focus_nodes}
+        else:
+            focus_value_nodes = {f: index.objects(f, self.path) for f in focus_nodes}
+        conforms = True
+        for check in self.checks:
+            if not check(index, focus_value_nodes, reports):
+                conforms = False
+                if reports is None:
+                    return False
+        return conforms
+
+
+def _datatype_matches(component, v):
+    # DatatypeConstraintComponent.evaluate, per value node
+    if not isinstance(v, Literal):
+        return False
+    rule = component.datatype_rule
+    if v.datatype == rule:
+        return getattr(v, "ill_typed", None) is not True and component._assert_actual_datatype(v, rule)
+    if rule == RDFS.Literal:
+        return True
+    if rule == RDFS.Datatype and v.datatype:
+        return True
+    if v.datatype is None and v.language is None and rule == XSD.string:
+        return component._assert_actual_datatype(v, rule)
+    if rule == RDF.langString and v.language:
+        return component._assert_actual_datatype(v, rule)
+    return False
+
+
+def _length_rules(component):
+    rules = component.string_rules if component.allow_multi_rules else component.string_rules[:1]
+    for rule in rules:
+        if not isinstance(rule, Literal) or not isinstance(rule.value, int) or rule.value < 0:
+            raise Unsupported(f"invalid length {rule}")
+    return [rule.value for rule in rules]
+
+
+def _value_check(component, passes):
+    """A check failing every value node for which passes(index, v) is false."""
+    def check(index, focus_value_nodes, reports):
+        conforms = True
+        for f, value_nodes in focus_value_nodes.items():
+            for v in value_nodes:
+                if not passes(index, v):
+                    if reports is None:
+                        return False
+                    conforms = False
+                    reports.append(component.make_v_result(index.graph, f, value_node=v))
+        return conforms
+    return check
+
+
+def _count_check(component, passes):
+    def check(index, focus_value_nodes, reports):
+        conforms = True
+        for f, value_nodes in focus_value_nodes.items():
+            if not passes(len(value_nodes)):
+                if reports is None:
+                    return False
+                conforms = False
+                reports.append(component.make_v_result(index.graph, f))
+        return conforms
+    return check
+
+
+class PreparedSelect:
+    """
+    The SELECT query of one sh:sparql constraint, with the prefixes and
+    $PATH applied and translated to algebra once. $this is bound per focus
+    node at evaluation, as pyshacl does on the query text.
+    """
+
+    def __init__(self, helper):
+        try:
+            binds, text = helper.pre_bind_variables(None)
+        except (ReportableRuntimeError, NotImplementedError, ValidationFailure) as e:
+            raise Unsupported(f"SPARQL constraint {helper.node}: {e}")
+        self.bind_this = "this" in binds
+        self.binds = {k: v for k, v in binds.items() if k != "this"}
+        try:
+            self.query = prepareQuery(helper.apply_prefixes(text))
+        except Exception as e:
+            # e.g. a prefix only the data graph binds
+            raise Unsupported(f"SPARQL constraint {helper.node}: {e}")
+
+    def violations(self, component, index, f, canonical=False):
+        binds = dict(self.binds)
+        if self.bind_this:
+            binds["this"] = f
+        graph = index.canonical_graph() if canonical else index.graph
+        return component._validate_sparql_query(self.query, binds, graph)
+
+
+def _numeric_value(literal):
+    """
+    The value SPARQL computes with for a numeric literal (int, Decimal, or
+    float for xsd:float and xsd:double), or None if it is not a finite one.
+    """
+    if not isinstance(literal, Literal) or literal.datatype not in NUMERIC_DATATYPES:
+        return None
+    if getattr(literal, "ill_typed", None) or not isinstance(literal.value, (int, float, Decimal)):
+        return None
+    try:
+        return literal.value if math.isfinite(literal.value) else None
+    except (InvalidOperation, OverflowError):
+        return None
+
+
+def _extends(node):
+    """Strip Extend nodes (BIND / SELECT expressions) off an algebra node."""
+    extends = {}
+    while node.name == "Extend":
+        extends[node.var] = node.expr
+        node = node.p
+    return extends, node
+
+
+def _chain(triples, start, end):
+    """
+    The (predicate, forward) steps of triple patterns forming a simple path
+    of variables from `start` to `end`, or None.
+    """
+    if any(not isinstance(p, URIRef) or not isinstance(s, Variable) or not isinstance(o, Variable)
+           for s, p, o in triples):
+        return None
+    remaining = list(triples)
+    steps, seen, node = [], {start}, start
+    while remaining:
+        touching = [t for t in remaining if node in (t[0], t[2])]
+        if len(touching) != 1:
+            return None
+        s, p, o = touching[0]
+        remaining.remove(touching[0])
+        node = o if s == node else s
+        if node in seen:
+            return None
+        seen.add(node)
+        steps.append((p, s != node))
+    return steps if node == end else None
+
+
+class SumEqualsTotal:
+    """
+    Native plan for SPARQL constraints of the form
+
+        SELECT $this (<total> AS ?path) (?total AS ?value) WHERE {
+            $this a <Class> ; <total> ?total .
+            { SELECT $this (sum(?amount) AS ?sum) { <path from ?amount to $this> } GROUP BY $this }
+            FILTER (?sum != ?total) }
+
+    The amounts are found by walking the path from each focus node, so the
+    cost is linear in the related nodes rather than a join over all of them.
+    The outcome is pyshacl's: integers and decimals are added exactly, as
+    SPARQL does, but once an xsd:float or xsd:double is involved rdflib adds
+    floats in the order the join yields them. The exact sum decides only
+    where no order of adding could change the outcome; a total within the
+    rounding error of the sum (like 645.63) and focus nodes with anything but
+    finite numeric literals are left to the prepared query, on the graph in
+    the order pyshacl sees it.
+    """
+
+    def __init__(self, prepared, classes, total_predicate, total, steps, projection):
+        self.prepared = prepared
+        self.classes = classes
+        self.total_predicate = total_predicate
+        self.total = total
+        self.steps = steps
+        self.projection = projection
+
+    @classmethod
+    def match(cls, prepared):
+        """The plan for a prepared query of this form, or None."""
+        algebra = prepared.query.algebra
+        if not prepared.bind_this or algebra.name != "SelectQuery" or algebra.datasetClause:
+            return None
+        project = algebra.p
+        if project.name != "Project":
+            return None
+        aliases, node = _extends(project.p)
+        if node.name != "Filter" or getattr(node.expr, "name", None) != "RelationalExpression" \
+                or node.expr.op != "!=":
+            return None
+        compared = {node.expr.expr, node.expr.other}
+        join = node.p
+        if join.name != "Join" or join.p1.name != "BGP" or join.p2.name != "ToMultiSet":
+            return None
+        this = Variable("this")
+
+        classes, totals = [], []
+        for s, p, o in join.p1.triples:
+            if s != this or not isinstance(p, URIRef):
+                return None
+            if p == RDF.type and isinstance(o, URIRef):
+                classes.append(o)
+            elif isinstance(o, Variable) and o != this:
+                totals.append((p, o))
+            else:
+                return None
+        if len(totals) != 1:
+            return None
+        total_predicate, total = totals[0]
+
+        subselect = join.p2.p
+        if subselect.name != "Project" or set(subselect.PV) != {this} | (compared - {total}):
+            return None
+        sub_extends, aggregate = _extends(subselect.p)
+        if aggregate.name != "AggregateJoin" or aggregate.p.name != "Group" \
+                or list(aggregate.p.expr or []) != [this] or aggregate.p.p.name != "BGP":
+            return None
+        functions = {a.res: a for a in aggregate.A}
+        sums = [var for var, res in sub_extends.items()
+                if res in functions and functions[res].name == "Aggregate_Sum"]
+        samples = [var for var, res in sub_extends.items()
+                   if res in functions and functions[res].name == "Aggregate_Sample"
+                   and functions[res].vars == this]
+        if len(sums) != 1 or samples != [this] or len(sub_extends) != 2 or compared != {sums[0], total}:
+            return None
+        summed = functions[sub_extends[sums[0]]]
+        if summed.distinct or not isinstance(summed.vars, Variable):
+            return None
+        steps = _chain(aggregate.p.p.triples, this, summed.vars)
+        if not steps:
+            return None
+
+        # what each projected variable is bound to, per total
+        projection = []
+        for var in project.PV:
+            source = aliases.get(var, var)
+            if str(var) == "failure" or not (source in (this, total) or isinstance(source, URIRef)):
+                return None
+            projection.append((str(var), source))
+        return cls(prepared, classes, total_predicate, total, steps, projection)
+
+    def violations(self, component, index, f):
+        graph = index.graph
+        if any((f, RDF.type, c) not in graph for c in self.classes):
+            return []
+        totals = list(graph.objects(f, self.total_predicate))
+        if not totals:
+            return []
+        reached = Counter({f: 1})
+        for p, forward in self.steps:
+            following = Counter()
+            for node, n in reached.items():
+                for o in graph.objects(node, p) if forward else graph.subjects(p, node):
+                    following[o] += n
+            reached = following
+        if not reached:
+            return []  # no group, no row
+        # the exact sum of the values, and with floats a bound on the rounding
+        # error of adding them in any order (n terms, unit roundoff 2**-53)
+        total_sum, magnitude, terms, floats = Decimal(0), Decimal(0), 0, False
+        for amount, n in reached.items():
+            number = _numeric_value(amount)
+            if number is None:
+                return self.prepared.violations(component, index, f)
+            floats = floats or isinstance(number, float)
+            total_sum += Decimal(number) * n
+            magnitude += abs(Decimal(number)) * n
+            terms += n
+        error = magnitude * terms * Decimal(2) ** -52
+
+        violations = []
+        for total in totals:
+            number = _numeric_value(total)
+            if number is None:
+                return self.prepared.violations(component, index, f)
+            difference = abs(Decimal(number) - total_sum)
+            if floats and difference <= error:
+                return self.prepared.violations(component, index, f, canonical=True)
+            if difference == 0:
+                continue
+            bound = {Variable("this"): f, self.total: total}
+            var_dict = {name: bound.get(source, source) for name, source in self.projection}
+            p = var_dict.pop("path", None)
+            v = var_dict.pop("value", None)
+            t = var_dict.pop("this", None)
+            if (p is not None) or (v is not None) or (t is not None):
+                if (t, p, v, var_dict) not in violations:
+                    violations.append((t, p, v, var_dict))
+        return violations
+
+
+def _sparql_check(component, plans):
+    """SPARQLBasedConstraint._evaluate_sparql_constraint over compiled query plans."""
+    result_val_of_focus = not component.shape.is_property_shape
+
+    def check(index, focus_value_nodes, reports):
+        conforms = True
+        for helper, plan in plans:
+            rept_kwargs = {"source_constraint": helper.node, "extra_messages": helper.messages or None}
+            for f in focus_value_nodes:
+                violations = plan.violations(component, index, f)
+                if not violations:
+                    continue
+                if reports is None:
+                    return False
+                conforms = False
+                result_val = f if result_val_of_focus else None
+                for violation in violations:
+                    if len(violation) == 2:
+                        reports.append(component.make_v_result(
+                            index.graph, f, value_node=result_val, bound_vars=violation[1], **rept_kwargs))
+                    else:
+                        t, p, v, vars_dict = violation
+                        if v is None:
+                            v = result_val
+                        reports.append(component.make_v_result(
+                            index.graph, t or f, value_node=v, result_path=p,
+                            bound_vars=(t, p, v, vars_dict), **rept_kwargs))
+        return conforms
+    return check
+
+
+class ShapeCompiler:
+    def __init__(self, sg):
+        self.sg = sg
+        self.compiled = {}
+        self.compiling = set()
+        self.predicates = set()
+
+    def compile(self, node):
+        if node in self.compiled:
+            return self.compiled[node]
+        if node in self.compiling:
+            raise Unsupported(f"recursive shape {node}")
+        self.compiling.add(node)
+        try:
+            try:
+                shape = self.sg.lookup_shape_from_node(node)
+            except (KeyError, AttributeError):
+                raise Unsupported(f"unknown shape {node}")
+            if shape.is_property_shape:
+                if not isinstance(shape.path(), URIRef):
+                    raise Unsupported(f"complex path on {node}")
+                self.predicates.add(shape.path())
+            component_types = []
+            for p, o in self.sg.graph.predicate_objects(node):
+                if p in (SH.expression, SH.js):
+                    raise Unsupported(f"{p} on {node}")
+                component_type = CONSTRAINT_PARAMETERS_MAP.get(p)
+                if component_type is not None and component_type not in component_types:
+                    component_types.append(component_type)
+            checks = []
+            for component_type in component_types:
+                try:
+                    component = component_type(shape)
+                except ConstraintLoadWarning:
+                    continue  # pyshacl skips these too
+                check = self.compile_component(component)
+                if check is not None:
+                    checks.append(check)
+            compiled = self.compiled[node] = CompiledShape(shape, checks)
+            return compiled
+        finally:
+            self.compiling.discard(node)
+
+    def compile_component(self, component):
+        kind = type(component)
+        if kind is MinCountConstraintComponent:
+            min_count = int(component.min_count.value)
+            if min_count == 0:
+                return None
+            return _count_check(component, lambda n: n >= min_count)
+        if kind is MaxCountConstraintComponent:
+            max_count = int(component.max_count.value)
+            return _count_check(component, lambda n: n <= max_count)
+        if kind is DatatypeConstraintComponent:
+            return _value_check(component, lambda index, v: _datatype_matches(component, v))
+        if kind is MinLengthConstraintComponent:
+            checks = [_value_check(component, lambda index, v, n=n: n == 0 or (
+                not isinstance(v, BNode) and len(component.value_node_to_string(v)) >= n))
+                for n in _length_rules(component)]
+            return _all_of(checks)
+        if kind is MaxLengthConstraintComponent:
+            checks = [_value_check(component, lambda index, v, n=n: not isinstance(v, BNode) and
+                                   len(component.value_node_to_string(v)) <= n)
+                      for n in _length_rules(component)]
+            return _all_of(checks)
+        if kind is InConstraintComponent:
+            in_vals = component.in_vals
+            return _value_check(component, lambda index, v: v in in_vals)
+        if kind is HasValueConstraintComponent:
+            return self.compile_has_value(component)
+        if kind is NotConstraintComponent:
+            return _all_of([_value_check(component, lambda index, v, operand=self.compile(node):
+                                         not operand.validate(index, (v,), None))
+                            for node in component.not_list])
+        if kind is OrConstraintComponent:
+            checks = []
+            for or_list in component.or_list:
+                operands = [self.compile(node) for node in set(self.sg.graph.items(or_list))]
+                if not operands:
+                    raise Unsupported("empty sh:or list")
+                checks.append(_value_check(component, lambda index, v, operands=operands: any(
+                    operand.validate(index, (v,), None) for operand in operands)))
+            return _all_of(checks)
+        if kind is PropertyConstraintComponent:
+            return self.compile_property(component)
+        if kind is SPARQLBasedConstraint:
+            return self.compile_sparql(component)
+        raise Unsupported(component.constraint_name())
+
+    def compile_sparql(self, component):
+        plans = []
+        for helper in component.sparql_constraints:
+            if helper.deactivated:
+                continue
+            prepared = PreparedSelect(helper)
+            plans.append((helper, SumEqualsTotal.match(prepared) or prepared))
+        return _sparql_check(component, plans) if plans else None
+
+    def compile_has_value(self, component):
+        values = list(component.has_value_set)
+
+        def check(index, focus_value_nodes, reports):
+            conforms = True
+            for hv in values:
+                for f, value_nodes in focus_value_nodes.items():
+                    if not any(v == hv for v in value_nodes):
+                        if reports is None:
+                            return False
+                        conforms = False
+                        reports.append(component.make_v_result(index.graph, f, value_node=None))
+            return conforms
+        return check
+
+    def compile_property(self, component):
+        property_shapes = []
+        for node in component.property_shapes:
+            compiled = self.compile(node)
+            if compiled.path is None:
+                raise Unsupported(f"sh:property {node} is not a property shape")
+            property_shapes.append(compiled)
+
+        def check(index, focus_value_nodes, reports):
+            conforms = True
+            for property_shape in property_shapes:
+                for f, value_nodes in focus_value_nodes.items():
+                    for v in value_nodes:
+                        if not property_shape.validate(index, (v,), reports):
+                            if reports is None:
+                                return False
+                            conforms = False
+            return conforms
+        return check
+
+
+def _all_of(checks):
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(index, focus_value_nodes, reports):
+        conforms = True
+        for c in checks:
+            if not c(index, focus_value_nodes, reports):
+                conforms = False
+                if reports is None:
+                    return False
+        return conforms
+    return check
+
+
+def _reachable_subgraph(graph, nodes):
+    """
+    The triples of `nodes` and of everything they refer to (nested shapes,
+    lists, SPARQL prefix declarations), with the namespace bindings.
+    """
+    subgraph = Graph(bind_namespaces="none")
+    for prefix, namespace in graph.namespace_manager.namespaces():
+        subgraph.bind(prefix, namespace, override=True, replace=True)
+    seen = set(nodes)
+    todo = list(nodes)
+    while todo:
+        node = todo.pop()
+        for p, o in graph.predicate_objects(node):
+            subgraph.add((node, p, o))
+            if not isinstance(o, Literal) and o not in seen:
+                seen.add(o)
+                todo.append(o)
+    return subgraph
+
+
+class _CollectingValidator(Validator):
+    """pyshacl Validator returning its raw results instead of building a report."""
+
+    def __init__(self, data_graph, shapes, options):
+        super().__init__(DataGraph.from_rdflib(data_graph), shacl_graph=shapes.graph, options=options)
+        self.shacl_graph = shapes  # parsed once, reused across runs
+        self.results = []
+
+    def create_validation_report(self, sg, conforms, results):
+        self.results = results
+        return None, None
+
+
+class CompiledShapes:
+    """
+    A shapes graph split into compiled top-level shapes and the rest, which
+    is validated by pyshacl. Built once per shapes graph (see compile_shapes).
+    """
+
+    def __init__(self, shapes_graph):
+        self.shapes_graph = shapes_graph
+        self.sg = ShapesGraph(shapes_graph)
+        self.targets = []
+        self.fallback = None
+        compiler = self.compiler = ShapeCompiler(self.sg)
+        fallback_nodes = []
+        advanced = any((None, p, None) in shapes_graph for p in ADVANCED_PREDICATES) or \
+            any((None, RDF.type, t) in shapes_graph for t in ADVANCED_TYPES)
+        for shape in self.sg.shapes:
+            target_nodes, target_classes, implicit, objects_of, subjects_of = map(list, shape.target())
+            if not (target_nodes or target_classes or implicit or objects_of or subjects_of):
+                continue  # only validated through other shapes
+            try:
+                if advanced or self.sg.custom_constraints:
+                    raise Unsupported("SHACL-AF features or custom constraint components")
+                if target_nodes or implicit or objects_of or subjects_of:
+                    raise Unsupported("target other than sh:targetClass")
+                self.targets.append((compiler.compile(shape.node), set(target_classes)))
+            except Unsupported:
+                fallback_nodes.append(shape.node)
+        self.classes = set().union(*(classes for compiled, classes in self.targets))
+        if advanced:
+            self.fallback = self.sg
+        elif fallback_nodes:
+            self.fallback = ShapesGraph(_reachable_subgraph(shapes_graph, fallback_nodes))
+
+    def validate(self, data_graph, canonical=False):
+        """
+        Validate a data graph on which any inference has been run; pyshacl
+        works on it in place. `canonical` tells that its triples are in the
+        order pyshacl would see them in. Returns a ValidationReport.
+        """
+        index = DataIndex(data_graph, self.compiler.predicates, self.classes, canonical)
+        reports = []
+        conforms = True
+        for compiled, classes in self.targets:
+            conforms = compiled.validate(index, index.focus_nodes(classes), reports) and conforms
+        if self.fallback is not None:
+            validator = _CollectingValidator(data_graph, self.fallback, {
+                "inference": "none", "inplace": True, "advanced": True})
+            try:
+                fallback_conforms, _, _ = validator.run()
+            except ValidationFailure as e:
+                return ValidationReport(False, [], "Validation Failure - {}".format(e.message))
+            conforms = conforms and fallback_conforms
+            reports.extend(validator.results)
+        return ValidationReport.from_results(self.sg, conforms, reports)
+
+
+def compile_shapes(shapes_graph):
+    """The CompiledShapes of a shapes graph, cached per graph."""
+    try:
+        return _compiled[shapes_graph]
+    except KeyError:
+        compiled = _compiled[shapes_graph] = CompiledShapes(shapes_graph)
+        return compiled
+
+
+def validate_native(data_graph, shapes_graph, inference="none"):
+    """
+    Drop-in for pyshacl.validate(data_graph, shacl_graph=shapes_graph,
+    inference=..., advanced=True) on an rdflib Graph, using the compiled
+    shapes. Returns a ValidationReport. As validate_report, it never
+    changes data_graph: whatever inference or pyshacl may write goes to a
+    canonical copy.
+    """
+    if inference not in (None, "none", "rdfs"):
+        raise ValueError(f"Unsupported inference for the native validator: {inference}")
+    compiled = compile_shapes(shapes_graph)
+    # The compiled shapes only read the data graph; it is copied when
+    # inference or the pyshacl part may write to it, in canonical order, so
+    # that the pyshacl part sees the graph validate_report gives pyshacl.
+    canonical = inference == "rdfs" or compiled.fallback is not None
+    if canonical:
+        data_graph = canonical_graph(data_graph)
+    if inference == "rdfs":
+        with stage("inference"):
+            owlrl.DeductiveClosure(CustomRDFSSemantics).expand(data_graph)
+    return compiled.validate(data_graph, canonical)
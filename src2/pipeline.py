@@ -0,0 +1,590 @@
+# pipeline.py
+#
+# Runs EDIFACT files through conversion, mapping and validation. Jobs hand
+# the data graph to validation in memory (the Java mapper works in its own
+# temporary workspace), so files can be processed in a process pool without
+# intermediate files clashing.
+# Interchanges with several messages are split at message boundaries; the
+# messages are validated as separate jobs and merged into one report.
+
+import contextlib
+import glob
+import hashlib
+import io
+import mmap
+import os
+import platform
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from rdflib import Graph
+
+from edifact_tokenizer import (
+    HEADER_BYTES, EdifactReader, SegmentTokenizer, InterchangeStream, fallback_encoding, syntax_identifier,
+    split_interchange, segment_tag, count_data_elements
+)
+from general_edifact_to_enriched_xml import (
+    EDIFACTToEnrichedXMLConverter,
+    yarrrmlparser_bash, rmlmapper_bash,
+    yarrrmlparser_batch, rmlmapper_batch,
+    validation_results, print_messages, folder_path
+)
+from rml_engine import load_mapping, GraphSink
+from resource_sampler import ResourceSampler, SamplerUnavailable, cpu_summary_row, write_cpu_summary
+from rmlmapper_worker import java_mapper, MapperUnavailable
+from shapes_registry import shapes_registry
+from stage_timer import (ELAPSED, ELAPSED_HEADER, StageTimer, stage, aggregate_breakdown, breakdown_row,
+                         elapsed_row, write_breakdown)
+
+# Files from this size on are memory-mapped rather than read into memory
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def find_edifact_files(inputs, pattern="*.edi"):
+    """Expand files, directories and glob patterns into a list of files."""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(glob.glob(os.path.join(item, pattern)))
+        elif glob.has_magic(item):
+            files.extend(glob.glob(item, recursive=True))
+        else:
+            files.append(item)
+    return list(dict.fromkeys(files))
+
+
+def read_edifact(edi_file):
+    """
+    The text of an EDIFACT file, read once: UTF-8, or else the character set
+    of the UNB syntax identifier (see EdifactReader).
+    """
+    with io.open(edi_file, "rb") as f:
+        text, reader = _decode(f.read())
+    if reader.encoding != "utf-8":
+        print(f"UTF-8 decoding failed, decoded as {reader.encoding} (syntax identifier {reader.identifier})"
+              + (", undecodable bytes replaced" if reader.errors != "strict" else ""))
+    return text
+
+
+def decode_edifact(data):
+    """EDIFACT text from bytes received over the wire, as read_edifact decodes files."""
+    return _decode(data)[0]
+
+
+def _decode(data):
+    """(text, reader) of the bytes of an interchange."""
+    reader = EdifactReader(data)
+    try:
+        return reader.read(), reader
+    except UnicodeDecodeError:
+        # Neither UTF-8 nor the declared character set: ISO-8859-3, -6 and -8
+        # leave byte values undefined, which are replaced rather than failing
+        reader = EdifactReader(data, reader.fallback, errors="replace")
+        return reader.read(), reader
+
+
+@contextlib.contextmanager
+def open_edifact(edi_file, encoding=None, errors="strict"):
+    """
+    An EdifactReader decoding the file as it is read, for the tokenizer.
+    The bytes are read once; files from MMAP_THRESHOLD bytes on are mapped
+    into memory instead.
+    """
+    with io.open(edi_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            yield EdifactReader(f.read(), encoding, errors)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield EdifactReader(data, encoding, errors)
+
+
+def message_offsets(interchange):
+    """
+    Converter counters at the start of each message, so that messages
+    converted on their own get the same node IRIs as in the whole interchange.
+    """
+    return [offsets for offsets, segments in iter_message_offsets(interchange.tokenizer, interchange.messages)]
+
+
+def iter_message_offsets(tokenizer, messages):
+    """(converter offsets, raw segments) per message; messages may be a lazy iterable."""
+    line_counter = 0
+    organisation_counters = Counter()
+    service = tokenizer.service
+    for number, segments in enumerate(messages, 1):
+        yield (number, line_counter, dict(organisation_counters)), segments
+        for segment in segments:
+            tag = segment_tag(segment, service)
+            if tag not in ("LIN", "NAD"):
+                continue
+            tag, data = tokenizer.tokenize(segment)
+            if data and tag == "LIN":
+                line_counter += 1
+            elif data:
+                organisation_counters[data[0]] += 1
+
+
+def interchange_parts(edi_data, split_messages=True, interchange=None):
+    """
+    The jobs of one interchange as (message number, text, converter offsets):
+    one per message when split_messages is set and there are several,
+    otherwise [(None, edi_data, None)]. `interchange` is edi_data already
+    split (split_interchange), to avoid tokenizing it again.
+    """
+    if split_messages and interchange is None:
+        interchange = split_interchange(edi_data)
+    elif not split_messages:
+        interchange = None
+    if interchange is not None and len(interchange.messages) > 1:
+        return [(number, interchange.message_text(number - 1), offsets)
+                for number, offsets in enumerate(message_offsets(interchange), 1)]
+    return [(None, edi_data, None)]
+
+
+def validate_edifact(edi_data, offsets=None, process="ProcessExample",
+                     use_java_mapper=False, xml_file=None, write_data_graph=False,
+                     inference="rdfs", shacl_engine="pyshacl", pretty_xml=False, direct_graph=False):
+    """
+    Convert, map and validate EDIFACT text. Returns (conforms, ValidationReport,
+    data graph as Turtle or None unless write_data_graph is set, seconds per
+    stage). The XML written to xml_file is only indented with pretty_xml.
+    The in-process mapper runs on the in-memory tree and hands its graph
+    straight to validation; only the Java mapper goes through files, in a
+    temporary workspace. With direct_graph the converter emits the graph
+    through a GraphSink instead of building the tree: the same graph, with
+    only the open message held, but no faster.
+    """
+    with StageTimer() as timer:
+        if direct_graph and not (use_java_mapper or xml_file):
+            with stage("mapping compile"):
+                mapping = load_mapping()
+            converter = EDIFACTToEnrichedXMLConverter(edi_data, sink=GraphSink(mapping))
+        else:
+            converter = EDIFACTToEnrichedXMLConverter(edi_data)
+        if offsets:
+            converter.start_at(*offsets)
+        with stage("convert"):
+            converter.convert()
+        if xml_file:
+            with stage("serialize"):
+                converter.write_xml(xml_file, pretty=pretty_xml)
+
+        if not use_java_mapper:
+            if converter.sink is not None:
+                with stage("mapping"):
+                    data_graph = converter.to_graph()
+            else:
+                with stage("mapping compile"):
+                    mapping = load_mapping()
+                with stage("mapping"):
+                    data_graph = mapping.execute(converter.root)
+        else:
+            data_graph = run_java_mapper(converter)
+
+        with stage("validate"):
+            report = validation_results(process, data_graph, inference=inference, engine=shacl_engine)
+        print_messages(report.results)
+        turtle = None
+        if write_data_graph:
+            with stage("serialize"):
+                turtle = data_graph.serialize(format="turtle")
+    return report.conforms, report, turtle, timer.seconds
+
+
+def run_java_mapper(converter):
+    """
+    Run yarrrml-parser and RMLMapper on the converter's XML; returns the data
+    graph. RMLMapper runs in this process's persistent worker JVM, or through
+    rmlmapper.sh/.bat when no worker can be started.
+    """
+    with tempfile.TemporaryDirectory(prefix="edifact-val-") as workspace:
+        xml_output_file = os.path.join(workspace, "enriched_output.xml")
+        data_graph_file = os.path.join(workspace, "invoice.ttl")
+        rml_file = os.path.join(workspace, "mapping.rml.ttl")
+        with stage("serialize"):
+            converter.write_xml(xml_output_file)
+
+        if platform.system() == "Windows":
+            yarrrmlparser, rmlmapper = yarrrmlparser_batch, rmlmapper_batch
+        elif platform.system() in ["Darwin", "Linux"]:
+            yarrrmlparser, rmlmapper = yarrrmlparser_bash, rmlmapper_bash
+        else:
+            raise RuntimeError("Unsupported platform")
+        with stage("mapping compile"):
+            yarrrmlparser(folder_path + "mapping.yarrrml", rml_file)
+        with stage("mapping"):
+            try:
+                java_mapper().map(rml_file, data_graph_file, cwd=workspace)
+            except MapperUnavailable:
+                rmlmapper(rml_file, data_graph_file, cwd=workspace)  # one JVM per file
+        if not os.path.isfile(data_graph_file):
+            raise RuntimeError("RMLMapper did not produce a data graph")
+        with stage("graph load"):
+            return Graph().parse(data_graph_file, format="turtle")
+
+
+def merge_outcomes(outcomes):
+    """
+    Per-message (conforms, report) outcomes, or the exceptions raised for
+    them, as (conforms, results, failure lines). Results shared by several
+    messages, e.g. on the envelope, are listed once.
+    """
+    results, failures = {}, []
+    conforms = True
+    for number, outcome in outcomes:
+        if isinstance(outcome, Exception):
+            failures.append(f"\tMessage {number}: {outcome}")
+            continue
+        conforms = conforms and outcome[0]
+        if not outcome[1].results and not outcome[0]:
+            failures.append(f"\tMessage {number}: {outcome[1].text.strip()}")
+        for result in outcome[1].results:
+            results.setdefault(result.text, result)
+    return conforms and not failures, [results[text] for text in sorted(results)], failures
+
+
+def merge_reports(outcomes):
+    """One interchange report text from per-message outcomes (see merge_outcomes)."""
+    conforms, results, failures = merge_outcomes(outcomes)
+    lines = ["Validation Report", f"Conforms: {conforms}"]
+    if results:
+        lines.append(f"Results ({len(results)}):")
+        lines.extend(result.text.rstrip("\n") for result in results)
+    if failures:
+        lines.append(f"Failed messages ({len(failures)}):")
+        lines.extend(failures)
+    return "\n".join(lines) + "\n"
+
+
+def write_outputs(edi_file, outcomes, process, output_dir):
+    """Write the (merged) validation report and, if kept, data graph of one file."""
+    base_name = os.path.splitext(os.path.basename(edi_file))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    graphs = [outcome[2] for number, outcome in outcomes
+              if not isinstance(outcome, Exception) and outcome[2] is not None]
+    if len(outcomes) == 1:
+        v_text = outcomes[0][1][1].text
+        data_graph = graphs[0] if graphs else None
+    else:
+        v_text = merge_reports(outcomes)
+        data_graph = None
+        if graphs:
+            graph = Graph()
+            for turtle in graphs:
+                graph.parse(data=turtle, format="turtle")
+            data_graph = graph.serialize(format="turtle")
+
+    validation_report_file = os.path.join(output_dir, f"{base_name}_{process}_validation_report.ttl")
+    with io.open(validation_report_file, "w", encoding="utf-8") as f:
+        f.write(v_text)
+    print(f"Validation report saved to {validation_report_file}")
+
+    if data_graph is not None:
+        final_output_file = os.path.join(output_dir, f"{base_name}.ttl")
+        with io.open(final_output_file, "w", encoding="utf-8") as f:
+            f.write(data_graph)
+        print(f"Final output file saved as {final_output_file}")
+    return validation_report_file
+
+
+def _run_jobs(jobs, workers):
+    """Yield (job, outcome) as jobs finish; outcome is the result or the exception."""
+    if workers == 1:
+        for job, (args, kwargs) in jobs:
+            try:
+                yield job, validate_edifact(*args, **kwargs)
+            except Exception as e:
+                yield job, e
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(validate_edifact, *args, **kwargs): job for job, (args, kwargs) in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+
+def _run_jobs_in_order(jobs, workers):
+    """
+    Like _run_jobs, for a lazy iterable of jobs, in their order; at most
+    2 * workers jobs (and their texts) are submitted at a time.
+    """
+    if workers == 1:
+        yield from _run_jobs(jobs, 1)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for job, (args, kwargs) in jobs:
+            window.append((job, pool.submit(validate_edifact, *args, **kwargs)))
+            if len(window) >= 2 * workers:
+                yield _outcome(*window.popleft())
+        while window:
+            yield _outcome(*window.popleft())
+
+
+def _outcome(job, future):
+    try:
+        return job, future.result()
+    except Exception as e:
+        return job, e
+
+
+def read_trailer(data, encoding, service, tail=64 * 1024):
+    """The raw segments after the last UNT (the UNZ), read from the end of the bytes (or memory map)."""
+    while True:
+        start = max(0, len(data) - tail)
+        # the first segment may be cut off, even within a character
+        tokenizer = SegmentTokenizer(data[start:].decode(encoding, errors="replace"))
+        tokenizer.service = service
+        segments = list(tokenizer.raw_segments())
+        tags = [segment_tag(segment, service) for segment in segments]
+        if "UNT" in tags:
+            return segments[len(tags) - tags[::-1].index("UNT"):]
+        if start == 0:
+            return []
+        tail *= 4
+
+
+def stream_file(edi_file, workers=1, process="ProcessExample", output_dir="evaluation",
+                write_enriched_xml=False, write_data_graph=False, count_elements=False, **options):
+    """
+    Validate a file of any size one message at a time, in constant memory:
+    segments are read lazily, each UNH..UNT message is converted, mapped and
+    validated on its own (as with split messages) and its results are
+    appended to the report, which is written as the file is read. With
+    `workers` > 1 up to twice as many messages are validated in parallel.
+    Returns (report path, number of data elements if count_elements,
+    seconds per stage).
+    """
+    try:
+        return _stream_file(edi_file, None, "strict", workers, process, output_dir, write_enriched_xml,
+                            write_data_graph, count_elements, options)
+    except UnicodeDecodeError:
+        # UTF-8 up to a point past the first non-ASCII character: start over,
+        # replacing bytes the declared character set leaves undefined (as read_edifact)
+        with io.open(edi_file, "rb") as f:
+            encoding = fallback_encoding(syntax_identifier(f.read(HEADER_BYTES)))
+        print(f"UTF-8 decoding failed, trying {encoding}")
+        return _stream_file(edi_file, encoding, "replace", workers, process, output_dir, write_enriched_xml,
+                            write_data_graph, count_elements, options)
+
+
+def _stream_file(edi_file, encoding, errors, workers, process, output_dir, write_enriched_xml,
+                 write_data_graph, count_elements, options):
+    base_name = os.path.splitext(os.path.basename(edi_file))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    report_file = os.path.join(output_dir, f"{base_name}_{process}_validation_report.ttl")
+    graph_file = os.path.join(output_dir, f"{base_name}.ttl")
+    timer = StageTimer()
+    data_elements = [0]
+
+    def count(segments):
+        if count_elements:
+            data_elements[0] += sum(1 for segment in segments
+                                    for element in stream.tokenizer.tokenize(segment)[1]
+                                    for component in element.components if component)
+
+    def jobs():
+        for offsets, segments in iter_message_offsets(stream.tokenizer, _timed(stream, "parse")):
+            number = offsets[0]
+            if number == 1:
+                with stage("parse"):
+                    stream.trailer = read_trailer(source.data, source.encoding, stream.tokenizer.service)
+                count(stream.header + stream.trailer)
+            count(segments)
+            xml_file = None
+            if write_enriched_xml:
+                xml_file = os.path.join(output_dir, f"{base_name}_{number}_enriched_output.xml")
+            kwargs = dict(options, process=process, xml_file=xml_file, write_data_graph=write_data_graph)
+            yield number, ((stream.message_text(segments), offsets), kwargs)
+
+    conforms, messages, failures, results = True, 0, [], 0
+    seen = set()  # digests of the results written, to list shared (envelope) results once
+    with open_edifact(edi_file, encoding, errors) as source, \
+            io.open(report_file, "w", encoding="utf-8") as report, \
+            (io.open(graph_file, "w", encoding="utf-8") if write_data_graph else contextlib.nullcontext()) as graph, \
+            timer:
+        stream = InterchangeStream(source)
+        report.write("Validation Report\n")
+        for number, outcome in _run_jobs_in_order(jobs(), workers):
+            messages += 1
+            if isinstance(outcome, Exception):
+                print(f"Failed to process {edi_file} message {number}: {outcome}")
+                failures.append(outcome)
+                report.write(f"Message {number}: failed: {outcome}\n")
+                continue
+            timer.add(outcome[3])
+            conforms = conforms and outcome[0]
+            report.write(f"Message {number}: Conforms: {outcome[0]}\n")
+            if not outcome[1].results and not outcome[0]:
+                report.write(outcome[1].text.rstrip("\n") + "\n")
+            for result in outcome[1].results:
+                digest = hashlib.blake2b(result.text.encode("utf-8"), digest_size=16).digest()
+                if digest not in seen:
+                    seen.add(digest)
+                    results += 1
+                    report.write(result.text.rstrip("\n") + "\n")
+            if graph is not None and outcome[2] is not None:
+                graph.write(outcome[2])  # Turtle allows prefixes to be declared again
+            report.flush()
+        report.write(f"Conforms: {conforms and not failures}\n"
+                     f"Messages: {messages}, failed: {len(failures)}, results: {results}\n")
+    if messages == 0:
+        raise ValueError(f"no UNH..UNT message in {edi_file}")
+    if len(failures) == messages:
+        raise failures[0]
+    print(f"Validation report saved to {report_file}")
+    if write_data_graph:
+        print(f"Final output file saved as {graph_file}")
+    return report_file, data_elements[0] if count_elements else None, timer.seconds
+
+
+def _timed(iterable, name):
+    """The items of iterable, the time to produce each booked on stage `name`."""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+
+def _write_file_breakdown(edi_file, measurement, output_dir):
+    base_name = os.path.splitext(os.path.basename(edi_file))[0]
+    write_breakdown(os.path.join(output_dir, f"{base_name}_runtime_breakdown.csv"), [breakdown_row(*measurement)])
+
+
+def run_batch(edi_files, workers=None, process="ProcessExample", output_dir="evaluation",
+              use_java_mapper=False, write_enriched_xml=False, split_messages=True,
+              write_data_graph=False, inference="rdfs", shacl_engine="pyshacl",
+              pretty_xml=False, timings=False, sample_interval=None, streaming=False, direct_graph=False):
+    """
+    Process files in a pool of `workers` processes (default: one per CPU).
+    With split_messages, each message of an interchange is a job of its own.
+    With streaming, the files are validated one after another, each one
+    message at a time in constant memory (see stream_file).
+    With timings, the seconds spent per stage are written as a runtime
+    breakdown (see stage_timer.py): <name>_runtime_breakdown.csv per file
+    and aggregated_runtime_breakdown.csv for the batch, and the wall time of
+    each file as elapsed_time.csv. With sample_interval
+    (seconds), CPU and memory use are sampled while the batch runs and
+    written as cpu_summary.csv (see resource_sampler.py).
+    Returns {edi_file: report path or the exception raised for it}.
+    """
+    shapes_registry.check(process)  # fail before any work on a bad shapes file
+    if not use_java_mapper:
+        load_mapping()  # compile once so the workers load it from the cache
+
+    sampler = None
+    if sample_interval:
+        try:
+            sampler = ResourceSampler(sample_interval)
+            sampler.start()
+        except SamplerUnavailable as e:
+            print(f"No resource sampling: {e}")
+            sampler = None
+
+    results, pending, jobs = {}, {}, []
+    file_timers, sizes, measurements = {}, {}, []
+    for edi_file in edi_files:
+        base_name = os.path.splitext(os.path.basename(edi_file))[0]
+        print(f"\n--- Processing {edi_file} ---")
+        if streaming:
+            started = time.perf_counter()
+            try:
+                results[edi_file], size, seconds = stream_file(
+                    edi_file, workers or os.cpu_count() or 1, process, output_dir, write_enriched_xml,
+                    write_data_graph, count_elements=bool(timings or sampler), use_java_mapper=use_java_mapper,
+                    inference=inference, shacl_engine=shacl_engine, pretty_xml=pretty_xml,
+                    direct_graph=direct_graph)
+            except Exception as e:
+                print(f"Failed to process {edi_file}: {e}")
+                results[edi_file] = e
+                continue
+            if timings or sampler:
+                sizes[edi_file] = size
+            if timings:
+                measurements.append((edi_file, (size, dict(seconds, **{ELAPSED: time.perf_counter() - started}))))
+                _write_file_breakdown(*measurements[-1], output_dir)
+            continue
+
+        file_timers[edi_file] = StageTimer()
+        try:
+            with file_timers[edi_file], stage("parse"):
+                edi_data = read_edifact(edi_file)
+                parts = interchange_parts(edi_data, split_messages)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            print(f"Failed to process {edi_file}: {e}")
+            results[edi_file] = e
+            continue
+        if timings or sampler:
+            sizes[edi_file] = count_data_elements(edi_data)
+
+        pending[edi_file] = {}
+        for number, text, offsets in parts:
+            xml_file = None
+            if write_enriched_xml:
+                os.makedirs(output_dir, exist_ok=True)
+                suffix = f"_{number}" if number else ""
+                xml_file = os.path.join(output_dir, f"{base_name}{suffix}_enriched_output.xml")
+            kwargs = {"process": process, "use_java_mapper": use_java_mapper, "xml_file": xml_file,
+                      "write_data_graph": write_data_graph, "inference": inference,
+                      "shacl_engine": shacl_engine, "pretty_xml": pretty_xml, "direct_graph": direct_graph}
+            jobs.append(((edi_file, number, len(parts)), ((text, offsets), kwargs)))
+
+    workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+    # A file's wall time: reading and splitting it, and the jobs from their
+    # start until its last message is done. The stage times of its messages
+    # add up to more than that when they are validated in parallel.
+    started = time.perf_counter()
+    for (edi_file, number, count), outcome in _run_jobs(jobs, workers):
+        if isinstance(outcome, Exception):
+            print(f"Failed to process {edi_file}" + (f" message {number}" if number else "") + f": {outcome}")
+        pending[edi_file][number] = outcome
+        if len(pending[edi_file]) < count:
+            continue
+        outcomes = sorted(pending.pop(edi_file).items(), key=lambda item: item[0] or 0)
+        if all(isinstance(outcome, Exception) for number, outcome in outcomes):
+            results[edi_file] = outcomes[0][1]
+            continue
+        try:
+            results[edi_file] = write_outputs(edi_file, outcomes, process, output_dir)
+            if timings:
+                file_timer = file_timers[edi_file]
+                elapsed = file_timer.seconds["parse"] + time.perf_counter() - started
+                for number, outcome in outcomes:
+                    if not isinstance(outcome, Exception):
+                        file_timer.add(outcome[3])
+                measurements.append((edi_file, (sizes[edi_file], dict(file_timer.seconds, **{ELAPSED: elapsed}))))
+                _write_file_breakdown(*measurements[-1], output_dir)
+        except OSError as e:
+            print(f"Failed to write results for {edi_file}: {e}")
+            results[edi_file] = e
+
+    if sampler is not None:
+        sampler.stop()
+        summary = sampler.summary()
+        if summary is not None:
+            summary_file = os.path.join(output_dir, "cpu_summary.csv")
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+                write_cpu_summary(summary_file, [cpu_summary_row(sum(sizes.values()), 1, summary)])
+                print(f"CPU and memory summary saved to {summary_file}")
+            except OSError as e:
+                print(f"Failed to write {summary_file}: {e}")
+
+    if measurements:
+        breakdown_file = os.path.join(output_dir, "aggregated_runtime_breakdown.csv")
+        elapsed_file = os.path.join(output_dir, "elapsed_time.csv")
+        try:
+            write_breakdown(breakdown_file, aggregate_breakdown(measurement for edi_file, measurement in measurements))
+            write_breakdown(elapsed_file, [elapsed_row(os.path.basename(edi_file), *measurement)
+                                           for edi_file, measurement in measurements], ELAPSED_HEADER)
+            print(f"Runtime breakdown saved to {breakdown_file}, elapsed times to {elapsed_file}")
+        except OSError as e:
+            print(f"Failed to write {breakdown_file}: {e}")
+    return {edi_file: results[edi_file] for edi_file in edi_files if edi_file in results}
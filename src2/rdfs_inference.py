@@ -0,0 +1,236 @@
+# rdfs_inference.py
+#
+# Cheaper replacement for pyshacl's inference='rdfs' on mapped invoice data.
+# The mapping output holds instance data only (no rdfs:subClassOf, domain,
+# range, ...), so the RDFS closure pyshacl computes reduces to a fixed set of
+# typing triples that can be written down in one pass over the graph. Which
+# of them the shapes can observe at all is worked out once per shapes graph;
+# when none are observable inference is skipped. Shapes that refer to RDF or
+# RDFS vocabulary in any other way are validated with the full closure.
+
+import weakref
+
+from pyshacl.rdfutil import clone_graph
+from rdflib import Namespace, URIRef, Variable
+from rdflib.collection import Collection
+from rdflib.namespace import RDF, RDFS
+from rdflib.plugins.sparql import prepareQuery
+
+SH = Namespace("http://www.w3.org/ns/shacl#")
+
+# Predicates the closure adds triples for, and the classes it types nodes with
+ENTAILED_PREDICATES = frozenset([RDF.type, RDFS.subPropertyOf])
+ENTAILED_CLASSES = frozenset([RDFS.Resource, RDF.Property])
+
+VOCABULARY_NAMESPACES = (str(RDF), str(RDFS))
+
+# Data triples that would make the closure depend on a schema
+SCHEMA_PREDICATES = frozenset([RDFS.subClassOf, RDFS.subPropertyOf, RDFS.domain, RDFS.range])
+SCHEMA_CLASSES = frozenset([RDFS.Class, RDF.Property, RDFS.Datatype, RDFS.ContainerMembershipProperty])
+
+PATH_PREDICATES = (SH.path, SH.equals, SH.disjoint, SH.lessThan, SH.lessThanOrEquals,
+                   SH.targetSubjectsOf, SH.targetObjectsOf)
+
+# Shape predicates that do not constrain the value nodes
+PASSIVE_SHAPE_PREDICATES = frozenset([RDF.type, SH.path, SH.message, SH.name, SH.description,
+                                      SH.severity, SH.deactivated, SH.order, SH.group])
+
+_shape_needs = weakref.WeakKeyDictionary()
+
+
+def _vocabulary(term):
+    """Whether term is an IRI of the RDF or RDFS vocabulary."""
+    return isinstance(term, URIRef) and str(term).startswith(VOCABULARY_NAMESPACES)
+
+
+def _path_terms(shapes_graph, path, seen=None):
+    """IRIs used as predicates in a SHACL property path."""
+    seen = seen if seen is not None else set()
+    if path in seen:
+        return
+    seen.add(path)
+    if isinstance(path, URIRef):
+        yield path
+        return
+    if (path, RDF.first, None) in shapes_graph:
+        for item in Collection(shapes_graph, path):
+            yield from _path_terms(shapes_graph, item, seen)
+        return
+    for p in (SH.inversePath, SH.alternativePath, SH.zeroOrMorePath,
+              SH.oneOrMorePath, SH.zeroOrOnePath):
+        for inner in shapes_graph.objects(path, p):
+            yield from _path_terms(shapes_graph, inner, seen)
+
+
+def _sparql_prefixes(shapes_graph, constraint):
+    prefixes = {}
+    for declarations in shapes_graph.objects(constraint, SH.prefixes):
+        for declaration in shapes_graph.objects(declarations, SH.declare):
+            prefix = shapes_graph.value(declaration, SH.prefix)
+            namespace = shapes_graph.value(declaration, SH.namespace)
+            if prefix is not None and namespace is not None:
+                prefixes[str(prefix)] = URIRef(str(namespace))
+    return prefixes
+
+
+def _query_triples(node):
+    """Triple patterns anywhere in a SPARQL algebra tree."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "triples" and isinstance(value, list):
+                yield from value
+            else:
+                yield from _query_triples(value)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            yield from _query_triples(item)
+
+
+# What validating against a shapes graph needs (see shapes_inference)
+NO_INFERENCE = "none"        # the shapes cannot observe any entailment
+ENTAILMENTS = "entailments"  # only those rdfs_entailments writes down
+FULL_CLOSURE = "rdfs"        # RDF/RDFS vocabulary beyond that; owlrl decides
+
+
+def _sparql_inference(shapes_graph, constraint, query_text):
+    # $this etc. are pre-bound by pyshacl; parse them as ordinary variables
+    try:
+        query = prepareQuery(query_text.replace("$", "?"),
+                             initNs=_sparql_prefixes(shapes_graph, constraint))
+    except Exception:
+        return FULL_CLOSURE
+    needs = NO_INFERENCE
+    for s, p, o in _query_triples(query.algebra):
+        if _vocabulary(s) or (_vocabulary(p) and p not in ENTAILED_PREDICATES) \
+                or (_vocabulary(o) and o not in ENTAILED_CLASSES):
+            return FULL_CLOSURE
+        if not isinstance(p, URIRef) or p == RDFS.subPropertyOf or o in ENTAILED_CLASSES:
+            needs = ENTAILMENTS
+        elif p == RDF.type and isinstance(o, Variable):
+            needs = ENTAILMENTS
+    return needs
+
+
+def shapes_inference(shapes_graph):
+    """
+    The inference validating against these shapes needs on schema-free
+    instance data: NO_INFERENCE when they cannot observe any triple the RDFS
+    closure adds, ENTAILMENTS when all they can observe is written down by
+    rdfs_entailments, or FULL_CLOSURE when they refer to other RDF or RDFS
+    vocabulary. Cached per shapes graph.
+    """
+    try:
+        return _shape_needs[shapes_graph]
+    except (KeyError, TypeError):
+        pass
+    needs = _analyse_shapes(shapes_graph)
+    try:
+        _shape_needs[shapes_graph] = needs
+    except TypeError:
+        pass
+    return needs
+
+
+def shapes_need_rdfs(shapes_graph):
+    """Whether validating against these shapes can observe any triple the RDFS closure adds."""
+    return shapes_inference(shapes_graph) != NO_INFERENCE
+
+
+def _observes_entailments(shapes_graph, shape):
+    # Only hasValue with an ordinary class is blind to the added typings:
+    # the value is present with or without them.
+    for p, o in shapes_graph.predicate_objects(shape):
+        if p == SH.hasValue and not _vocabulary(o):
+            continue
+        if p not in PASSIVE_SHAPE_PREDICATES:
+            return True
+    return False
+
+
+def _analyse_shapes(shapes_graph):
+    # A term of the RDF or RDFS vocabulary other than those the entailments
+    # consist of (ENTAILED_PREDICATES, ENTAILED_CLASSES) is left to owlrl, so
+    # the outcome never rests on what rdfs_entailments leaves out.
+    needs = NO_INFERENCE
+    for p in PATH_PREDICATES:
+        for shape, path in shapes_graph.subject_objects(p):
+            terms = [term for term in _path_terms(shapes_graph, path) if _vocabulary(term)]
+            if any(term not in ENTAILED_PREDICATES for term in terms):
+                return FULL_CLOSURE
+            if terms and (p != SH.path or _observes_entailments(shapes_graph, shape)):
+                needs = ENTAILMENTS
+    values = [o for p in (SH.targetClass, SH["class"], SH.targetNode, SH.hasValue)
+              for o in shapes_graph.objects(None, p)]
+    values += [item for items in shapes_graph.objects(None, SH["in"]) for item in Collection(shapes_graph, items)]
+    # implicit class targets
+    values += [shape for t in (SH.NodeShape, SH.PropertyShape) for shape in shapes_graph.subjects(RDF.type, t)]
+    if any(_vocabulary(value) and value not in ENTAILED_CLASSES for value in values):
+        return FULL_CLOSURE
+    # rdf:type with sh:hasValue of an ordinary class, as checked above, does
+    # not see the entailed classes
+    for p in (SH.targetClass, SH["class"], SH.targetNode):
+        if any(o in ENTAILED_CLASSES for o in shapes_graph.objects(None, p)):
+            needs = ENTAILMENTS
+    if any(shape in ENTAILED_CLASSES for t in (SH.NodeShape, SH.PropertyShape)
+           for shape in shapes_graph.subjects(RDF.type, t)):
+        needs = ENTAILMENTS
+    if (None, SH.closed, None) in shapes_graph:
+        needs = ENTAILMENTS
+    for p in (SH.select, SH.ask):
+        for constraint, query_text in shapes_graph.subject_objects(p):
+            query_needs = _sparql_inference(shapes_graph, constraint, str(query_text))
+            if query_needs == FULL_CLOSURE:
+                return FULL_CLOSURE
+            if query_needs == ENTAILMENTS:
+                needs = ENTAILMENTS
+    # SHACL-AF rules and custom targets may read anything
+    if any((None, p, None) in shapes_graph for p in (SH.rule, SH.target)):
+        return FULL_CLOSURE
+    return needs
+
+
+def has_schema_triples(data_graph):
+    if any((None, p, None) in data_graph for p in SCHEMA_PREDICATES):
+        return True
+    return any((None, RDF.type, c) in data_graph for c in SCHEMA_CLASSES)
+
+
+def rdfs_entailments(data_graph):
+    """
+    The triples pyshacl's RDFS closure adds to a graph without schema
+    triples: every subject and object is an rdfs:Resource, every predicate
+    an rdf:Property that is a sub-property of itself (rdf:type and
+    rdfs:subPropertyOf included, since the closure uses them). pyshacl runs
+    owlrl without the axiomatic triples and one-time rules, so the rules
+    that need a schema (rdfs:Class, rdfs:subClassOf, ...) never fire: no
+    class becomes an rdfs:Class or a sub-class of itself or rdfs:Resource.
+    """
+    nodes = set()
+    predicates = {RDF.type, RDFS.subPropertyOf} if len(data_graph) else set()
+    for s, p, o in data_graph:
+        nodes.add(s)
+        nodes.add(o)
+        predicates.add(p)
+    for node in nodes:
+        yield node, RDF.type, RDFS.Resource
+    for p in predicates:
+        yield p, RDF.type, RDF.Property
+        yield p, RDFS.subPropertyOf, p
+
+
+def precomputed_inference(data_graph, shapes_graph):
+    """
+    Prepare a data graph for validation without running owlrl. Returns
+    (graph, inference option for pyshacl): a clone with the entailments
+    added, the graph unchanged with inference skipped, or,
+    when the data carries schema triples or the shapes refer to RDF or
+    RDFS vocabulary the entailments do not cover, the graph for full 'rdfs'.
+    """
+    needs = shapes_inference(shapes_graph)
+    if needs == FULL_CLOSURE or has_schema_triples(data_graph):
+        return data_graph, "rdfs"
+    if needs == NO_INFERENCE:
+        return data_graph, "none"
+    graph = clone_graph(data_graph)
+    graph.addN((s, p, o, graph) for s, p, o in rdfs_entailments(data_graph))
+    return graph, "none"
@@ -0,0 +1,201 @@
+# resource_sampler.py
+#
+# Samples CPU and memory use from /proc in a background thread while the
+# pipeline runs (Linux only): the utilisation of every core from /proc/stat
+# and the resident memory of this process and all its descendants (pool
+# workers, the RMLMapper JVM, yarrrml-parser) from /proc/<pid>/status.
+#
+#   with ResourceSampler(interval=0.1) as sampler:
+#       run_batch(...)
+#   row = cpu_summary_row(data_elements, 1, sampler.summary())
+#
+# CPU is the busy share of all cores in percent, memory the resident set in
+# percent of the physical memory, as in evaluation/aggregated_cpu_summary_*.csv.
+
+import csv
+import io
+import os
+import threading
+import time
+
+# The evaluation machine had 48 cores; the schema has at least that many columns
+SCHEMA_CORES = 48
+
+
+class SamplerUnavailable(Exception):
+    """No /proc to sample from."""
+
+
+def read_cpu_times():
+    """(busy, total) jiffies of all cores together and of each core, from /proc/stat."""
+    overall, cores = None, []
+    with io.open("/proc/stat", encoding="ascii") as f:
+        for line in f:
+            if not line.startswith("cpu"):
+                break
+            fields = line.split()
+            # user nice system idle iowait irq softirq steal (guest time is part of user)
+            times = [int(value) for value in fields[1:9]]
+            total = sum(times)
+            busy = total - times[3] - times[4]
+            if fields[0] == "cpu":
+                overall = (busy, total)
+            else:
+                cores.append((busy, total))
+    return overall, cores
+
+
+def read_memory_total():
+    """Physical memory in kB, from /proc/meminfo."""
+    with io.open("/proc/meminfo", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1])
+    raise SamplerUnavailable("no MemTotal in /proc/meminfo")
+
+
+def process_tree(root):
+    """The pid `root` and the pids of all its descendants."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with io.open(f"/proc/{name}/stat", encoding="ascii", errors="replace") as f:
+                stat = f.read()
+        except OSError:
+            continue  # exited meanwhile
+        # the command name in parentheses may contain spaces; the parent pid follows it
+        parent = int(stat[stat.rfind(")") + 2:].split()[1])
+        children.setdefault(parent, []).append(int(name))
+    pids, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        pids.append(pid)
+        pending.extend(children.get(pid, ()))
+    return pids
+
+
+def resident_memory(pids):
+    """Resident set of the processes in kB, from /proc/<pid>/status."""
+    total = 0
+    for pid in pids:
+        try:
+            with io.open(f"/proc/{pid}/status", encoding="ascii", errors="replace") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total
+
+
+def _percent(previous, current):
+    busy, total = current[0] - previous[0], current[1] - previous[1]
+    return 100 * busy / total if total > 0 else 0.0
+
+
+class ResourceSampler:
+    """
+    Background thread taking a sample every `interval` seconds while active
+    (`with ResourceSampler() as sampler:`). Raises SamplerUnavailable on
+    systems without /proc.
+    """
+
+    def __init__(self, interval=0.1, pid=None):
+        if not os.path.exists("/proc/stat"):
+            raise SamplerUnavailable("resource sampling needs /proc (Linux)")
+        self.interval = interval
+        self.pid = pid or os.getpid()
+        self.memory_total = read_memory_total()
+        self.cpu, self.cores, self.memory = [], [], []
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._last = read_cpu_times()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()  # the time since the last sample, or all of it for short runs
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        overall, cores = read_cpu_times()
+        previous_overall, previous_cores = self._last
+        if overall[1] == previous_overall[1]:
+            return  # no clock tick since the last sample
+        self._last = overall, cores
+        self.cpu.append(_percent(previous_overall, overall))
+        self.cores.append([_percent(before, after) for before, after in zip(previous_cores, cores)])
+        self.memory.append(100 * resident_memory(process_tree(self.pid)) / self.memory_total)
+
+    def summary(self):
+        """Average, peak and minimum CPU, average and peak memory, and per-core averages and peaks."""
+        if not self.cpu:
+            return None
+        per_core = list(zip(*self.cores))
+        return {
+            "cpu": (sum(self.cpu) / len(self.cpu), max(self.cpu), min(self.cpu)),
+            "memory": (sum(self.memory) / len(self.memory), max(self.memory)),
+            "core_avg": [sum(core) / len(core) for core in per_core],
+            "core_peak": [max(core) for core in per_core],
+        }
+
+
+def cpu_summary_header(cores=SCHEMA_CORES):
+    cores = max(cores, SCHEMA_CORES)
+    return (["EDIFACT Data Elements", "Run", "Avg_CPU", "Peak_CPU", "Min_CPU", "Avg_Memory", "Peak_Memory"]
+            + [f"Core_{core}_Avg" for core in range(cores)]
+            + [f"Core_{core}_Peak" for core in range(cores)])
+
+
+def cpu_summary_row(data_elements, run, summary, cores=SCHEMA_CORES):
+    """One row of the CPU summary; columns of cores the machine lacks stay empty."""
+    cores = max(cores, len(summary["core_avg"]))
+    missing = [""] * (cores - len(summary["core_avg"]))
+    return ([data_elements, run] + [round(value, 2) for value in summary["cpu"] + summary["memory"]]
+            + [round(value, 2) for value in summary["core_avg"]] + missing
+            + [round(value, 2) for value in summary["core_peak"]] + missing)
+
+
+def aggregate_cpu_summary(rows):
+    """
+    Rows averaged per number of data elements, the run numbers included, as
+    in the aggregated CPU summary of the evaluation.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[0], []).append(row[1:])
+    aggregated = []
+    for data_elements, runs in groups.items():
+        columns = []
+        for values in zip(*runs):
+            values = [value for value in values if value != ""]
+            columns.append(round(sum(values) / len(values), 2) if values else "")
+        aggregated.append([data_elements] + columns)
+    return aggregated
+
+
+def write_cpu_summary(path, rows):
+    cores = max([(len(row) - 7) // 2 for row in rows] + [SCHEMA_CORES])
+    with io.open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(cpu_summary_header(cores))
+        writer.writerows(rows)
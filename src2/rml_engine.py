@@ -0,0 +1,501 @@
+# rml_engine.py
+#
+# In-process execution of the YARRRML mapping (mapping.yarrrml).
+# Replaces the yarrrml-parser + RMLMapper (Java) round trip for the subset of
+# YARRRML used by this project: xpath sources with absolute iterators,
+# IRI templates, references to child elements / attributes and typed literals.
+
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+import yaml
+from rdflib import BNode, Graph, Literal, URIRef
+
+from stage_timer import stage
+
+folder_path = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+# Compiled mappings are cached here under the hash of their YARRRML source,
+# as JSON: plain data, so whoever can write to the cache cannot make the
+# processes loading it run code. Bump CACHE_VERSION whenever the cached
+# form (dump_mapping/parse_mapping) changes.
+cache_folder = os.environ.get("EDIFACT_VAL_CACHE", folder_path + ".mapping-cache")
+CACHE_VERSION = "2"
+
+# Prefixes yarrrml-parser knows without a declaration
+DEFAULT_PREFIXES = {
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "xsd": "http://www.w3.org/2001/XMLSchema#",
+    "owl": "http://www.w3.org/2002/07/owl#",
+    "schema": "http://schema.org/",
+    "foaf": "http://xmlns.com/foaf/0.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+    "rr": "http://www.w3.org/ns/r2rml#",
+    "rml": "http://semweb.mmlab.be/ns/rml#",
+    "ql": "http://semweb.mmlab.be/ns/ql#",
+}
+
+RDF_TYPE = URIRef(DEFAULT_PREFIXES["rdf"] + "type")
+
+# Characters kept as-is when a value is substituted into an IRI template
+# (iunreserved of RFC 3987, as required by R2RML's "IRI-safe" rule)
+_IRI_SAFE = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def iri_safe(value):
+    return "".join(
+        c if c in _IRI_SAFE or ord(c) >= 0xA0 else "".join(f"%{b:02X}" for b in c.encode("utf-8"))
+        for c in value
+    )
+
+
+def _first(mapping, *keys, default=None):
+    for key in keys:
+        if key in mapping:
+            return mapping[key]
+    return default
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class Reference:
+    """An xpath reference such as ./PartyID, ./@details or ./Party/City."""
+
+    def __init__(self, expression):
+        expression = expression.strip()
+        if expression.startswith("./"):
+            expression = expression[2:]
+        if "@" in expression:
+            path, attribute = expression.rsplit("@", 1)
+            self.path, self.attribute = path.rstrip("/") or ".", attribute
+        else:
+            self.path, self.attribute = expression or ".", None
+
+    def values(self, node):
+        if self.path == ".":
+            targets = [node]
+        else:
+            targets = node.findall(self.path)
+        if self.attribute:
+            values = [target.get(self.attribute) for target in targets]
+        else:
+            values = ["".join(target.itertext()) for target in targets]
+        # Missing and empty values do not generate terms
+        return [value for value in values if value]
+
+
+class Template:
+    """A YARRRML value: constant text mixed with $(reference) parts."""
+
+    def __init__(self, text):
+        self.text = str(text)
+        self.parts = []
+        rest = self.text
+        while "$(" in rest:
+            start = rest.index("$(")
+            end = rest.index(")", start)
+            if start:
+                self.parts.append(rest[:start])
+            self.parts.append(Reference(rest[start + 2:end]))
+            rest = rest[end + 1:]
+        if rest:
+            self.parts.append(rest)
+        self.references = [part for part in self.parts if isinstance(part, Reference)]
+
+    @property
+    def is_constant(self):
+        return not self.references
+
+    @property
+    def is_reference(self):
+        return len(self.parts) == 1 and len(self.references) == 1
+
+    def values(self, node, iri=False):
+        if self.is_constant:
+            return [self.text]
+        candidates = []
+        for part in self.parts:
+            if isinstance(part, Reference):
+                found = part.values(node)
+                if not found:
+                    return []
+                if iri and not self.is_reference:
+                    found = [iri_safe(value) for value in found]
+                candidates.append(found)
+            else:
+                candidates.append([part])
+        return ["".join(combination) for combination in itertools.product(*candidates)]
+
+
+class TermMap:
+    def __init__(self, template, term_type="literal", datatype=None, language=None):
+        self.template = template
+        self.term_type = term_type
+        self.datatype = datatype
+        self.language = language
+
+    def terms(self, node):
+        if self.term_type == "iri":
+            return [URIRef(value) for value in self.template.values(node, iri=True)]
+        if self.term_type == "blank":
+            return [BNode(value) for value in self.template.values(node)]
+        return [Literal(value, datatype=self.datatype, lang=self.language)
+                for value in self.template.values(node)]
+
+
+class TriplesMap:
+    def __init__(self, name, source, subject_maps, predicate_object_maps):
+        self.name = name
+        self.source = source
+        self.subject_maps = subject_maps
+        self.predicate_object_maps = predicate_object_maps
+
+    def emit(self, node, graph):
+        subjects = [term for subject_map in self.subject_maps for term in subject_map.terms(node)]
+        if not subjects:
+            return
+        for predicates, object_maps in self.predicate_object_maps:
+            objects = [term for object_map in object_maps for term in object_map.terms(node)]
+            for subject in subjects:
+                for predicate in predicates:
+                    for obj in objects:
+                        graph.add((subject, predicate, obj))
+
+
+class Mapping:
+    """Compiled form of a YARRRML document, executed directly on XML trees."""
+
+    def __init__(self, prefixes, triples_maps):
+        self.prefixes = prefixes
+        self.triples_maps = triples_maps
+
+    def sources(self):
+        """Distinct (access, iterator) pairs in document order."""
+        seen = []
+        for triples_map in self.triples_maps:
+            if triples_map.source not in seen:
+                seen.append(triples_map.source)
+        return seen
+
+    def new_graph(self):
+        graph = Graph()
+        for prefix, namespace in self.prefixes.items():
+            graph.bind(prefix, namespace)
+        return graph
+
+    def execute(self, root=None, base_dir=None, graph=None):
+        """
+        Run all triples maps and return the resulting rdflib Graph.
+        `root` is an in-memory XML root (Element or ElementTree) used for every
+        source; without it each source's `access` file is parsed from base_dir.
+        """
+        if graph is None:
+            graph = self.new_graph()
+        if isinstance(root, ET.ElementTree):
+            root = root.getroot()
+        documents = {}
+        for access, iterator in self.sources():
+            if root is not None:
+                document = root
+            else:
+                if access not in documents:
+                    documents[access] = ET.parse(os.path.join(base_dir or os.getcwd(), access)).getroot()
+                document = documents[access]
+            maps = [tm for tm in self.triples_maps if tm.source == (access, iterator)]
+            for node in iterate(document, iterator):
+                for triples_map in maps:
+                    triples_map.emit(node, graph)
+        return graph
+
+
+class RecordNode:
+    """
+    Minimal stand-in for an ElementTree element, used when the converter
+    emits straight into a GraphSink. Supports what the converter and the
+    triples maps need: attrib/get, text, findall(tag) and itertext().
+    Children are also indexed by tag, so findall does not scan siblings.
+    """
+
+    __slots__ = ("tag", "attrib", "text", "path", "children", "by_tag")
+
+    def __init__(self, tag, attrib=None, path=()):
+        self.tag = tag
+        self.attrib = dict(attrib) if attrib else {}
+        self.text = None
+        self.path = path + (tag,)
+        self.children = []
+        self.by_tag = {}
+
+    def __len__(self):
+        # same truthiness as ElementTree elements: empty means falsy
+        return len(self.children)
+
+    def get(self, key, default=None):
+        return self.attrib.get(key, default)
+
+    def set(self, key, value):
+        self.attrib[key] = value
+
+    def append(self, child):
+        self.children.append(child)
+        tagged = self.by_tag.get(child.tag)
+        if tagged is None:
+            self.by_tag[child.tag] = [child]
+        else:
+            tagged.append(child)
+
+    def findall(self, path):
+        if "/" not in path and path not in ("", "."):
+            # a single step, as in most references of the mapping
+            return list(self.by_tag.get(path, ()))
+        nodes = [self]
+        for step in path.split("/"):
+            if step in ("", "."):
+                continue
+            nodes = [child for node in nodes for child in node.by_tag.get(step, ())]
+        return nodes
+
+    def itertext(self):
+        if not self.children:
+            return (self.text,) if self.text else ()
+        return self._itertext()
+
+    def _itertext(self):
+        if self.text:
+            yield self.text
+        for child in self.children:
+            yield from child.itertext()
+
+
+class GraphSink:
+    """
+    Triple sink for EDIFACTToEnrichedXMLConverter. The converter builds
+    RecordNodes instead of an XML tree and closes each node (Interchange,
+    Message, LineItem, Party) once it is complete; closing a node runs the
+    triples maps whose iterator selects it, so no XML is serialized, parsed
+    or queried with XPath.
+    """
+
+    def __init__(self, mapping, graph=None):
+        self.mapping = mapping
+        self.graph = graph if graph is not None else mapping.new_graph()
+        self.maps_by_path = {}
+        for triples_map in mapping.triples_maps:
+            iterator = triples_map.source[1]
+            path = tuple(step for step in iterator.strip().split("/") if step)
+            self.maps_by_path.setdefault(path, []).append(triples_map)
+
+    def root(self, tag, attrib=None):
+        return RecordNode(tag, attrib)
+
+    def element(self, parent, tag, attrib=None):
+        node = RecordNode(tag, attrib, parent.path)
+        parent.append(node)
+        return node
+
+    def close(self, node):
+        triples_maps = self.maps_by_path.get(node.path)
+        if triples_maps:
+            # runs within the converter's "convert" stage, but is the mapping
+            with stage("mapping"):
+                for triples_map in triples_maps:
+                    triples_map.emit(node, self.graph)
+        # a closed node is never read again
+        node.children = []
+        node.by_tag = {}
+
+
+def iterate(root, iterator):
+    """Elements selected by an absolute xpath iterator like /Interchange/Message."""
+    steps = [step for step in iterator.strip().split("/") if step]
+    if not iterator.strip().startswith("/") or any(c in step for step in steps for c in "[]@*()"):
+        raise ValueError(f"Unsupported iterator: {iterator}")
+    if not steps or root.tag != steps[0]:
+        return []
+    nodes = [root]
+    for step in steps[1:]:
+        nodes = [child for node in nodes for child in node.findall(step)]
+    return nodes
+
+
+def expand(value, prefixes):
+    if value == "a":
+        return RDF_TYPE
+    prefix, sep, local = value.partition(":")
+    if sep and prefix in prefixes and not local.startswith("//"):
+        return URIRef(prefixes[prefix] + local)
+    return URIRef(value)
+
+
+def _compile_term(spec, prefixes, default_type="literal"):
+    if not isinstance(spec, dict):
+        spec = {"value": spec}
+    value = str(spec["value"]).strip()
+    term_type = spec.get("type", default_type)
+    datatype = spec.get("datatype")
+    if term_type == "iri" and "$(" not in value:
+        value = str(expand(value, prefixes))
+    return TermMap(
+        Template(value),
+        term_type=term_type,
+        datatype=expand(datatype, prefixes) if datatype else None,
+        language=spec.get("language"),
+    )
+
+
+def _compile_predicate_object(entry, prefixes):
+    if isinstance(entry, list):
+        # short form [predicate, object(, datatype)]
+        predicates, objects = entry[0], entry[1]
+        if len(entry) > 2:
+            objects = {"value": objects, "datatype": entry[2]}
+    else:
+        predicates = _first(entry, "predicates", "predicate", "p")
+        objects = _first(entry, "objects", "object", "o")
+    predicate_terms = [expand(str(p).strip(), prefixes) for p in _as_list(predicates)]
+    object_maps = []
+    for obj in _as_list(objects):
+        if isinstance(obj, str) and obj.endswith("~iri"):
+            obj = {"value": obj[:-4], "type": "iri"}
+        object_maps.append(_compile_term(obj, prefixes))
+    return predicate_terms, object_maps
+
+
+def _compile_source(source, named_sources):
+    if isinstance(source, str):
+        source = named_sources[source]
+    if isinstance(source, list):
+        # short form [access~xpath, iterator]
+        access = source[0].split("~")[0]
+        return access, source[1]
+    formulation = source.get("referenceFormulation", "xpath")
+    if formulation != "xpath":
+        raise ValueError(f"Unsupported reference formulation: {formulation}")
+    return source["access"], source["iterator"]
+
+
+def compile_mapping(document):
+    """Compile a parsed YARRRML document (dict) into a Mapping."""
+    prefixes = dict(DEFAULT_PREFIXES)
+    prefixes.update({k: str(v).strip() for k, v in (document.get("prefixes") or {}).items()})
+    named_sources = document.get("sources") or {}
+
+    triples_maps = []
+    for name, spec in (document.get("mappings") or {}).items():
+        subjects = [_compile_term(s, prefixes, default_type="iri")
+                    for s in _as_list(_first(spec, "subjects", "subject", "s"))]
+        predicate_objects = [_compile_predicate_object(entry, prefixes)
+                             for entry in _as_list(_first(spec, "predicateobjects", "po"))]
+        # like yarrrml-parser: one triples map per source of a mapping
+        for source in _as_list(_first(spec, "sources", "source")):
+            triples_maps.append(TriplesMap(name, _compile_source(source, named_sources),
+                                           subjects, predicate_objects))
+    return Mapping(prefixes, triples_maps)
+
+
+def dump_mapping(mapping):
+    """The compiled mapping as JSON (bytes), for the cache."""
+    def term(term_map):
+        return {"template": term_map.template.text, "type": term_map.term_type,
+                "datatype": str(term_map.datatype) if term_map.datatype else None,
+                "language": term_map.language}
+    return json.dumps({
+        "prefixes": mapping.prefixes,
+        "triples_maps": [{"name": triples_map.name, "source": list(triples_map.source),
+                          "subjects": [term(subject) for subject in triples_map.subject_maps],
+                          "predicate_objects": [[[str(p) for p in predicates], [term(o) for o in object_maps]]
+                                                for predicates, object_maps in triples_map.predicate_object_maps]}
+                         for triples_map in mapping.triples_maps],
+    }).encode("utf-8")
+
+
+def parse_mapping(data):
+    """The Mapping of JSON written by dump_mapping."""
+    def term(spec):
+        return TermMap(Template(spec["template"]), term_type=spec["type"],
+                       datatype=URIRef(spec["datatype"]) if spec["datatype"] else None,
+                       language=spec["language"])
+    document = json.loads(data.decode("utf-8"))
+    return Mapping(document["prefixes"], [
+        TriplesMap(spec["name"], tuple(spec["source"]), [term(subject) for subject in spec["subjects"]],
+                   [([URIRef(p) for p in predicates], [term(o) for o in object_maps])
+                    for predicates, object_maps in spec["predicate_objects"]])
+        for spec in document["triples_maps"]])
+
+
+def mapping_digest(yarrrml_source):
+    """Content address of a YARRRML document (bytes)."""
+    return hashlib.sha256(CACHE_VERSION.encode() + b"\0" + yarrrml_source).hexdigest()
+
+
+def cache_path(digest, suffix, cache_dir=None):
+    return os.path.join(cache_dir or cache_folder, digest + suffix)
+
+
+def atomic_write(path, data):
+    """
+    Write via a temporary file and rename, so concurrent readers
+    (other worker processes) never see a partially written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Mappings already loaded by this process, by digest
+_loaded_mappings = {}
+
+
+def load_mapping(yarrrml_path=None, cache_dir=None, use_cache=True):
+    """
+    Load and compile a YARRRML file. The compiled form is stored in the
+    on-disk cache under the hash of the source and reused until it changes.
+    """
+    if yarrrml_path is None:
+        yarrrml_path = folder_path + "mapping.yarrrml"
+    with open(yarrrml_path, "rb") as f:
+        source = f.read()
+    if not use_cache:
+        return compile_mapping(yaml.safe_load(source.decode("utf-8")))
+
+    digest = mapping_digest(source)
+    if digest in _loaded_mappings:
+        return _loaded_mappings[digest]
+
+    compiled_path = cache_path(digest, ".json", cache_dir)
+    mapping = None
+    if os.path.isfile(compiled_path):
+        try:
+            with open(compiled_path, "rb") as f:
+                mapping = parse_mapping(f.read())
+        except (OSError, ValueError, LookupError, TypeError, AttributeError):
+            mapping = None  # unreadable entry, rebuild it
+    if mapping is None:
+        mapping = compile_mapping(yaml.safe_load(source.decode("utf-8")))
+        try:
+            atomic_write(compiled_path, dump_mapping(mapping))
+        except OSError as e:
+            print(f"Could not write mapping cache {compiled_path}: {e}")
+    _loaded_mappings[digest] = mapping
+    return mapping
+
+
+if __name__ == "__main__":
+    mapping = load_mapping()
+    mapping.execute().serialize(destination="invoice.ttl", format="turtle")
@@ -1,3 +1,9 @@
 @echo off 
+rem Usage: rmlmapper.bat [mapping.rml.ttl] [invoice.ttl]
 
-java -jar rmlmapper-7.3.3-r374-all.jar -s turtle -m mapping.rml.ttl -o invoice.ttl
+set MAPPING=%~1
+if "%MAPPING%"=="" set MAPPING=mapping.rml.ttl
+set OUTPUT=%~2
+if "%OUTPUT%"=="" set OUTPUT=invoice.ttl
+
+java -jar "%~dp0rmlmapper-7.3.3-r374-all.jar" -s turtle -m "%MAPPING%" -o "%OUTPUT%"
@@ -1,3 +1,4 @@
 #!/bin/bash
+# Usage: rmlmapper.sh [mapping.rml.ttl] [invoice.ttl]
 
-java -jar rmlmapper-6.1.3-r367-all.jar -s turtle -m mapping.rml.ttl -o invoice.ttl
+java -jar "$(dirname "$0")/rmlmapper-6.1.3-r367-all.jar" -s turtle -m "${1:-mapping.rml.ttl}" -o "${2:-invoice.ttl}"
@@ -0,0 +1,204 @@
+# rmlmapper_worker.py
+#
+# Keeps one RMLMapper JVM per process running (RMLMapperWorker.java) and
+# feeds it mapping jobs over its stdin/stdout, instead of starting a JVM via
+# rmlmapper.sh/.bat for every invoice. The worker is checked with a ping
+# after it has been idle, and restarted when it dies, hangs or stops
+# answering. A job whose worker crashed is retried once on a fresh worker;
+# one that timed out is not. The worker blocks RMLMapper's System.exit calls
+# with a security manager, which newer JVMs only allow with
+# -Djava.security.manager=allow; JVMs that do not know that value (Java 11)
+# are started without it.
+
+import atexit
+import glob
+import os
+import queue
+import subprocess
+import threading
+import time
+
+folder_path = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+WORKER_SOURCE = folder_path + "RMLMapperWorker.java"
+
+START_TIMEOUT = 120  # seconds; includes compiling the worker source
+PING_TIMEOUT = 10
+IDLE_BEFORE_PING = 30
+
+
+class MapperUnavailable(Exception):
+    """No Java runtime or RMLMapper jar to run the worker with."""
+
+
+class WorkerDied(Exception):
+    """The worker exited or stopped answering."""
+
+
+def find_rmlmapper_jar():
+    """$RMLMAPPER_JAR, or the newest rmlmapper-*-all.jar next to this file."""
+    jar = os.environ.get("RMLMAPPER_JAR")
+    if jar:
+        return jar
+    jars = sorted(glob.glob(folder_path + "rmlmapper-*-all.jar"))
+    if not jars:
+        raise MapperUnavailable("no rmlmapper-*-all.jar found in " + folder_path)
+    return jars[-1]
+
+
+class RMLMapperWorker:
+    """A supervised RMLMapper JVM taking one mapping job at a time."""
+
+    def __init__(self, jar=None, java="java", timeout=300):
+        self.jar = jar
+        self.java = java
+        self.timeout = timeout
+        self.process = None
+        self.replies = None
+        self.last_reply = 0.0
+        self.lock = threading.Lock()
+        self.allow_security_manager = True
+
+    def command(self):
+        options = ["-Djava.security.manager=allow"] if self.allow_security_manager else []
+        return [self.java] + options + ["-cp", self.jar or find_rmlmapper_jar(), WORKER_SOURCE]
+
+    def start(self):
+        """Start the JVM unless it is running; raises MapperUnavailable if it cannot."""
+        with self.lock:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self.process is not None and self.process.poll() is None:
+            return
+        try:
+            self._start()
+        except MapperUnavailable:
+            if not self.allow_security_manager:
+                raise
+            self.allow_security_manager = False  # "allow" is unknown before Java 12
+            self._start()
+
+    def _start(self):
+        try:
+            self.process = subprocess.Popen(self.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, encoding="utf-8", bufsize=1)
+        except OSError as e:
+            raise MapperUnavailable(f"cannot run {self.java}: {e}") from e
+        self.replies = queue.Queue()
+        threading.Thread(target=_read_replies, args=(self.process.stdout, self.replies), daemon=True).start()
+        try:
+            ready = self._reply(START_TIMEOUT)
+        except WorkerDied as e:
+            self._stop(kill=True)
+            raise MapperUnavailable(f"RMLMapper worker did not start: {e}") from e
+        if ready != "READY":
+            self._stop(kill=True)
+            raise MapperUnavailable(f"RMLMapper worker did not start: {ready}")
+
+    def _reply(self, timeout):
+        try:
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerDied(f"no answer within {timeout} s")
+        if reply is None:
+            raise WorkerDied(f"exited with code {self.process.wait()}")
+        self.last_reply = time.monotonic()
+        return reply
+
+    def _request(self, line, timeout):
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise WorkerDied(str(e))
+        return self._reply(timeout)
+
+    def healthy(self):
+        """Whether the worker is running and answers a ping."""
+        with self.lock:
+            return self._healthy()
+
+    def _healthy(self):
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            return self._request("PING", PING_TIMEOUT) == "PONG"
+        except WorkerDied:
+            return False
+
+    def map(self, rml_file, output_file, cwd):
+        """Run the RML mapping; relative sources are resolved against `cwd`."""
+        fields = [os.path.abspath(cwd), os.path.abspath(rml_file), os.path.abspath(output_file)]
+        if any("\t" in field or "\n" in field for field in fields):
+            raise ValueError("paths must not contain tabs or line breaks")
+        request = "\t".join(["MAP"] + fields)
+        with self.lock:
+            for attempt in (1, 2):
+                self._ensure_started()
+                if time.monotonic() - self.last_reply > IDLE_BEFORE_PING and not self._healthy():
+                    self._stop(kill=True)
+                    continue
+                try:
+                    reply = self._request(request, self.timeout)
+                except WorkerDied as e:
+                    crashed = self.process.poll() is not None
+                    self._stop(kill=True)
+                    if attempt == 2 or not crashed:  # a job that hung would hang again
+                        raise RuntimeError(f"RMLMapper worker failed: {e}") from e
+                    continue
+                if reply != "OK":
+                    raise RuntimeError(f"RMLMapper failed: {reply[4:] if reply.startswith('ERR ') else reply}")
+                return
+            raise RuntimeError("RMLMapper worker is not responding")
+
+    def _stop(self, kill=False):
+        """End the worker: by closing its stdin, or right away with kill."""
+        if self.process is None:
+            return
+        if kill:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def close(self):
+        with self.lock:
+            self._stop()
+
+
+def _read_replies(stream, replies):
+    for line in stream:
+        replies.put(line.rstrip("\r\n"))
+    replies.put(None)
+
+
+_worker = None
+_unavailable = None
+
+
+def java_mapper():
+    """
+    This process's RMLMapper worker, started on first use. Raises
+    MapperUnavailable (every time, without retrying) if it cannot start.
+    """
+    global _worker, _unavailable
+    if _unavailable is not None:
+        raise _unavailable
+    if _worker is None:
+        worker = RMLMapperWorker()
+        try:
+            worker.start()
+        except MapperUnavailable as e:
+            _unavailable = e
+            raise
+        _worker = worker
+        atexit.register(worker.close)
+    return _worker
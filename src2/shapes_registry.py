@@ -0,0 +1,83 @@
+# shapes_registry.py
+#
+# Keeps the SHACL shapes of each process parsed in memory, so a batch
+# parses <process>.ttl once per worker instead of once per invoice.
+# Entries are reloaded when the file changes on disk.
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from rdflib import Graph, Namespace
+from rdflib.namespace import RDF
+
+folder_path = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+SH = Namespace("http://www.w3.org/ns/shacl#")
+
+
+class ShapesEntry:
+    def __init__(self, path, stat, digest, graph):
+        self.path = path
+        self.stat = stat
+        self.digest = digest
+        self.graph = graph
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ShapesRegistry:
+    """
+    Parsed shapes graphs by process name. A changed mtime or size makes
+    the registry hash the file again; the graph is only re-parsed when the
+    content hash differs.
+    """
+
+    def __init__(self, shapes_dir=None):
+        self.shapes_dir = shapes_dir or folder_path
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def path(self, process):
+        return os.path.abspath(os.path.join(self.shapes_dir, process + ".ttl"))
+
+    def get(self, process):
+        """The shapes graph of `process`, parsed at most once per version of the file."""
+        path = self.path(process)
+        with self.lock:
+            entry = self.entries.get(process)
+            stat = _file_stat(path)
+            if entry is not None and entry.stat == stat:
+                return entry.graph
+            with open(path, "rb") as f:
+                source = f.read()
+            digest = hashlib.sha256(source).hexdigest()
+            if entry is not None and entry.digest == digest:
+                entry.stat = stat
+                return entry.graph
+            graph = parse_shapes(source, path)
+            self.entries[process] = ShapesEntry(path, stat, digest, graph)
+            return graph
+
+    def check(self, *processes):
+        """Load the shapes of each process up front; raises on a missing or invalid file."""
+        for process in processes:
+            self.get(process)
+
+
+def parse_shapes(source, path):
+    graph = Graph()
+    try:
+        graph.parse(data=source, format="turtle", publicID=Path(path).as_uri())
+    except Exception as e:
+        raise ValueError(f"Could not parse shapes file {path}: {e}") from e
+    if (None, RDF.type, SH.NodeShape) not in graph and (None, SH.targetClass, None) not in graph:
+        raise ValueError(f"Shapes file {path} does not define any SHACL shapes")
+    return graph
+
+
+shapes_registry = ShapesRegistry()
@@ -0,0 +1,125 @@
+# stage_timer.py
+#
+# High-resolution timers for the pipeline stages. Code marks a stage with
+# `with stage("convert"): ...`; the time is booked on the StageTimer active
+# in the current context, if any, so the stages cost nothing to mark when no
+# one is timing. A stage nested in another (inference inside validate) is
+# booked on its own and not on the outer stage, so the stages add up to the
+# total.
+#
+# The stages are reported in the schema of
+# evaluation/aggregated_runtime_breakdown_*.csv. Its "Total Time (s)" is the
+# sum of the stage times, which for messages validated in parallel is the
+# time spent in all workers together; the wall time each file took is
+# written to a file of its own (ELAPSED_HEADER), so the breakdowns keep the
+# columns of the evaluation.
+
+import csv
+import io
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+STAGES = ("parse", "convert", "serialize", "mapping compile", "mapping", "graph load",
+          "inference", "validate")
+
+# Wall time of a file, kept with its stage times but not one of them
+ELAPSED = "elapsed"
+
+ELAPSED_HEADER = ["File", "EDIFACT Data Elements", "Total Time (s)", "Elapsed Time (s)"]
+
+# Columns of the runtime breakdown: (name, short name for the share, stages)
+BREAKDOWN_COLUMNS = (
+    ("XML Conversion", "XML", ("parse", "convert", "serialize")),
+    ("YARRRML Parsing", "YARRRML", ("mapping compile",)),
+    ("RML Mapping", "RML", ("mapping", "graph load")),
+    ("Validation", "Validation", ("inference", "validate")),
+)
+
+BREAKDOWN_HEADER = (["EDIFACT Data Elements"]
+                    + [f"{name} (s)" for name, short, stages in BREAKDOWN_COLUMNS]
+                    + ["Total Time (s)"]
+                    + [f"{short} %" for name, short, stages in BREAKDOWN_COLUMNS])
+
+_active = ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """Seconds spent per stage while active (`with StageTimer() as timer:`)."""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self._nested = []
+        self._token = None
+
+    def __enter__(self):
+        self._token = _active.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.reset(self._token)
+
+    def add(self, seconds):
+        """Add the stage times of another timer (e.g. from a worker process)."""
+        for name, value in seconds.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + value
+
+    @property
+    def total(self):
+        return sum(self.seconds.values())
+
+
+@contextmanager
+def stage(name):
+    timer = _active.get()
+    if timer is None:
+        yield
+        return
+    timer._nested.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        inner = timer._nested.pop()
+        timer.seconds[name] = timer.seconds.get(name, 0.0) + elapsed - inner
+        if timer._nested:
+            timer._nested[-1] += elapsed
+
+
+def breakdown_row(data_elements, seconds):
+    """One runtime breakdown row from stage times."""
+    columns = [sum(seconds.get(s, 0.0) for s in stages) for name, short, stages in BREAKDOWN_COLUMNS]
+    total = sum(columns)
+    shares = [100 * column / total if total else 0.0 for column in columns]
+    return ([data_elements] + [round(column, 4) for column in columns] + [round(total, 4)]
+            + [round(share, 2) for share in shares])
+
+
+def elapsed_row(file_name, data_elements, seconds):
+    """One row of ELAPSED_HEADER: the total stage time and the ELAPSED wall time of a file."""
+    total = sum(seconds.get(s, 0.0) for name, short, stages in BREAKDOWN_COLUMNS for s in stages)
+    return [file_name, data_elements, round(total, 4), round(seconds.get(ELAPSED, total), 4)]
+
+
+def aggregate_breakdown(measurements):
+    """
+    Rows of (data elements, stage times) averaged per number of data
+    elements, as in the aggregated breakdown of the evaluation.
+    """
+    groups = {}
+    for data_elements, seconds in measurements:
+        groups.setdefault(data_elements, []).append(seconds)
+    rows = []
+    for data_elements, runs in groups.items():
+        mean = {name: sum(run.get(name, 0.0) for run in runs) / len(runs)
+                for name in set().union(*runs)}
+        rows.append(breakdown_row(data_elements, mean))
+    return rows
+
+
+def write_breakdown(path, rows, header=BREAKDOWN_HEADER):
+    with io.open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
@@ -0,0 +1,11 @@
+# conftest.py
+#
+# The src2 modules import each other as top-level modules, as when
+# edifact-val.py is run from src2; make them importable from the tests.
+#
+#   cd src2 && python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+# test_native_shacl.py
+#
+# The native evaluator (native_shacl.py) must give the results pyshacl
+# gives. It builds on pyshacl internals, so these tests are the check to
+# run before moving the pyshacl pin in requirements.txt.
+
+import io
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from benchmark.generator import generate_invoic
+from general_edifact_to_enriched_xml import EDIFACTToEnrichedXMLConverter, folder_path
+from native_shacl import validate_native
+from rml_engine import load_mapping
+from shapes_registry import shapes_registry
+from validation_results import validate_report
+
+EXAMPLE = os.path.join(folder_path, os.pardir, "example", "Anonymized.edi")
+
+
+def data_graph(edi_data):
+    converter = EDIFACTToEnrichedXMLConverter(edi_data)
+    converter.convert()
+    return load_mapping().execute(converter.root)
+
+
+def result_set(report):
+    return Counter((result.text, json.dumps(result.to_dict(), sort_keys=True)) for result in report.results)
+
+
+@pytest.fixture(scope="module")
+def shapes():
+    return shapes_registry.get("ProcessExample")
+
+
+@pytest.fixture(scope="module", params=["example", "generated"])
+def graph(request):
+    if request.param == "example":
+        with io.open(EXAMPLE, encoding="utf-8") as f:
+            edi_data = f.read()
+    else:
+        edi_data = generate_invoic(messages=3, lines=5, parties=5, charges=2)
+    return data_graph(edi_data)
+
+
+@pytest.mark.parametrize("inference", ["rdfs", "none"])
+def test_native_matches_pyshacl(graph, shapes, inference):
+    expected = validate_report(graph, shapes, inference)
+    actual = validate_native(graph, shapes, inference)
+    assert expected.results
+    assert actual.conforms == expected.conforms
+    assert result_set(actual) == result_set(expected)
+    assert actual.text == expected.text
+
+
+def test_example_results(shapes):
+    with io.open(EXAMPLE, encoding="utf-8") as f:
+        report = validate_native(data_graph(f.read()), shapes, "rdfs")
+    assert not report.conforms
+    assert len(report.results) == 14
@@ -0,0 +1,49 @@
+# test_validation_results.py
+#
+# ValidationReport reads its results from pyshacl's raw result triples
+# through a Validator subclass (_ReportingValidator) relying on pyshacl
+# internals; its results, text and graph must be those of pyshacl.validate.
+
+import io
+import json
+import os
+from collections import Counter
+
+import pytest
+from pyshacl import validate
+from rdflib.compare import isomorphic
+
+from general_edifact_to_enriched_xml import EDIFACTToEnrichedXMLConverter, folder_path
+from rml_engine import load_mapping
+from shapes_registry import shapes_registry
+from validation_results import SH, ValidationResult, canonical_graph, validate_report
+
+EXAMPLE = os.path.join(folder_path, os.pardir, "example", "Anonymized.edi")
+
+
+def result_set(results):
+    return Counter(json.dumps(result.to_dict(), sort_keys=True) for result in results)
+
+
+@pytest.fixture(scope="module")
+def graph():
+    with io.open(EXAMPLE, encoding="utf-8") as f:
+        converter = EDIFACTToEnrichedXMLConverter(f.read())
+    converter.convert()
+    return load_mapping().execute(converter.root)
+
+
+@pytest.mark.parametrize("inference", ["rdfs", "none"])
+def test_results_match_report_graph(graph, inference):
+    shapes = shapes_registry.get("ProcessExample")
+    report = validate_report(graph, shapes, inference)
+    # in place, so pyshacl sees the triples in the canonical order validate_report gives it
+    conforms, report_graph, text = validate(canonical_graph(graph), shacl_graph=shapes,
+                                            inference=inference, inplace=True, advanced=True)
+    expected = [ValidationResult.from_graph(report_graph, node)
+                for node in report_graph.objects(None, SH.result)]
+    assert expected
+    assert report.conforms == conforms
+    assert result_set(report.results) == result_set(expected)
+    assert report.text == text
+    assert isomorphic(report.graph, report_graph)
@@ -0,0 +1,192 @@
+# validation_results.py
+#
+# Validation outcomes as objects instead of pyshacl's report text. Each
+# result is read from pyshacl's raw result triples (focus node, path, value,
+# messages, severity, source shape); the report graph and the report text
+# are only built when asked for. Both the pyshacl and the native engine hand
+# back a ValidationReport.
+
+from functools import cached_property
+
+from pyshacl import Validator
+from pyshacl.errors import ValidationFailure
+from pyshacl.graph_abstraction import DataGraph
+from rdflib import Graph, Namespace
+
+from stage_timer import stage
+
+SH = Namespace("http://www.w3.org/ns/shacl#")
+
+
+class ValidationResult:
+    """One sh:ValidationResult; `text` is its block of the pyshacl text report."""
+
+    def __init__(self, focus_node, path, value, messages, severity, source_shape,
+                 constraint_component, source_constraint=None, text=None):
+        self.focus_node = focus_node
+        self.path = path
+        self.value = value
+        self.messages = messages
+        self.severity = severity
+        self.source_shape = source_shape
+        self.constraint_component = constraint_component
+        self.source_constraint = source_constraint
+        self.text = text
+
+    @classmethod
+    def from_triples(cls, node, triples, text=None):
+        """
+        The result `node` from pyshacl's raw result triples, whose objects
+        are terms or (graph, term) pairs, as the report graph would hold it.
+        """
+        values = {}
+        for s, p, o in triples:
+            if s == node:
+                values.setdefault(p, []).append(o[1] if isinstance(o, tuple) else o)
+
+        def value(p):
+            return values[p][0] if p in values else None
+        return cls(value(SH.focusNode), value(SH.resultPath), value(SH.value),
+                   sorted(str(m) for m in values.get(SH.resultMessage, ())),
+                   value(SH.resultSeverity), value(SH.sourceShape),
+                   value(SH.sourceConstraintComponent), value(SH.sourceConstraint), text)
+
+    @classmethod
+    def from_graph(cls, graph, node, text=None):
+        """The result `node` of a report graph."""
+        return cls(graph.value(node, SH.focusNode),
+                   graph.value(node, SH.resultPath),
+                   graph.value(node, SH.value),
+                   sorted((str(m) for m in graph.objects(node, SH.resultMessage))),
+                   graph.value(node, SH.resultSeverity),
+                   graph.value(node, SH.sourceShape),
+                   graph.value(node, SH.sourceConstraintComponent),
+                   graph.value(node, SH.sourceConstraint),
+                   text)
+
+    @property
+    def message(self):
+        return self.messages[0] if self.messages else None
+
+    def to_dict(self):
+        """The result with its nodes as strings (None where absent), e.g. for JSON."""
+        def text(node):
+            return None if node is None else str(node)
+        return {"focus_node": text(self.focus_node), "path": text(self.path), "value": text(self.value),
+                "messages": self.messages, "severity": text(self.severity),
+                "source_shape": text(self.source_shape),
+                "constraint_component": text(self.constraint_component)}
+
+    def __repr__(self):
+        return (f"ValidationResult(focus_node={self.focus_node!r}, path={self.path!r}, "
+                f"value={self.value!r}, message={self.message!r})")
+
+
+class ValidationReport:
+    """
+    Conformance, results and pyshacl's report text of one validation. The
+    text and the report graph are built on first use. The graph stays with
+    the process that validated: a pickled report (e.g. from a pool worker)
+    carries everything but the graph.
+    """
+
+    def __init__(self, conforms, results, text=None, graph=None):
+        self.conforms = conforms
+        self.results = results
+        if text is not None:
+            self.text = text
+        if graph is not None:
+            self.graph = graph
+        self._raw = None  # (shapes graph, pyshacl results) to build the graph from
+
+    @classmethod
+    def from_results(cls, sg, conforms, results):
+        """Build the report from pyshacl's raw (description, node, triples) results."""
+        if not conforms and not results:
+            raise RuntimeError("A Non-Conformant Validation Report must have at least one result.")
+        ordered = sorted(results, key=lambda r: r[0])  # the order of the text report
+        report = cls(conforms, [ValidationResult.from_triples(node, triples, desc)
+                                for desc, node, triples in ordered])
+        report._raw = sg, results
+        return report
+
+    @cached_property
+    def text(self):
+        """pyshacl's text report, from the text of each result."""
+        text = f"Validation Report\nConforms: {self.conforms}\n"
+        if self.results:
+            text += f"Results ({len(self.results)}):\n"
+        return text + "".join(result.text for result in self.results)
+
+    @cached_property
+    def graph(self):
+        """pyshacl's report graph, or None where it is not available."""
+        if self._raw is None:
+            return None
+        sg, results = self._raw
+        graph, _ = Validator.create_validation_report(sg, self.conforms, results)
+        return graph
+
+    @property
+    def messages(self):
+        return [m for result in self.results for m in result.messages]
+
+    def serialize(self, format="turtle"):
+        """The report graph as bytes in `format`."""
+        if self.graph is None:
+            raise ValueError("The report graph is not available")
+        return self.graph.serialize(None, encoding="utf-8", format=format)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["graph"] = None
+        state["_raw"] = None
+        return state
+
+
+class _ReportingValidator(Validator):
+    """
+    pyshacl Validator producing a ValidationReport; times the RDFS
+    inference. run() gets neither the report graph nor the text: they are
+    built when the report is asked for them.
+    """
+
+    def create_validation_report(self, sg, conforms, results):
+        self.report = ValidationReport.from_results(sg, conforms, results)
+        return None, None
+
+    @classmethod
+    def _run_pre_inference(cls, *args, **kwargs):
+        with stage("inference"):
+            return super()._run_pre_inference(*args, **kwargs)
+
+
+def canonical_graph(data_graph):
+    """
+    A copy of data_graph with its triples added in sorted order. SPARQL
+    constraints see the triples in insertion order; for a graph built in
+    memory that follows set iteration and so PYTHONHASHSEED, and float sums
+    such as the one of :SumNetPrice would differ from run to run.
+    """
+    graph = Graph()
+    for prefix, namespace in data_graph.namespaces():
+        graph.bind(prefix, namespace)
+    graph.addN((s, p, o, graph) for s, p, o in sorted(data_graph))
+    return graph
+
+
+def validate_report(data_graph, shapes_graph, inference="rdfs"):
+    """
+    pyshacl.validate(data_graph, shacl_graph=shapes_graph, inference=...,
+    advanced=True) on an rdflib Graph, as a ValidationReport. It always
+    validates a canonical copy of data_graph (see canonical_graph), which
+    pyshacl works on in place instead of its own clone: data_graph is left
+    unchanged and the report does not depend on how the graph was built.
+    """
+    validator = _ReportingValidator(DataGraph.from_rdflib(canonical_graph(data_graph)), shacl_graph=shapes_graph,
+                                    options={"inference": inference, "inplace": True, "advanced": True})
+    try:
+        validator.run()
+    except ValidationFailure as e:
+        return ValidationReport(False, [], "Validation Failure - {}".format(e.message))
+    return validator.report
@@ -0,0 +1,255 @@
+# validation_service.py
+#
+# Resident validation server. A fixed pool of worker processes keeps the
+# compiled mapping (or an RMLMapper JVM) and the parsed (and, for the native
+# engine, compiled) shapes warm, so a request only pays for converting,
+# mapping and validating its own interchange. Runs on a local TCP port or a
+# Unix socket:
+#
+#   POST /validate[?process=ProcessExample]   body: an EDIFACT interchange
+#   GET  /health
+#
+# /validate answers with JSON: conforms, the results and the report text;
+# a body without a UNH..UNT message gets 400. At most max_pending requests
+# are validated at a time; others get 503. A pool that lost a worker is
+# replaced and the request retried once; until then /health answers 503.
+
+import json
+import os
+import re
+import signal
+import stat
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlparse
+
+from edifact_tokenizer import split_interchange
+from native_shacl import compile_shapes
+from pipeline import decode_edifact, interchange_parts, merge_outcomes, merge_reports, validate_edifact
+from rdfs_inference import shapes_need_rdfs
+from rml_engine import load_mapping
+from rmlmapper_worker import java_mapper, MapperUnavailable
+from shapes_registry import shapes_registry
+
+# Process names select <process>.ttl in the shapes directory
+PROCESS_NAME = re.compile(r"^\w[\w-]*$")
+
+MAX_BODY = 64 * 1024 * 1024
+
+
+class NoMessage(ValueError):
+    """A request body without a UNH..UNT message."""
+
+
+def warm_up(process, use_java_mapper=False, inference="rdfs", shacl_engine="pyshacl"):
+    """Load everything a validation of `process` reuses into this process's caches."""
+    shapes = shapes_registry.get(process)
+    if not use_java_mapper:
+        load_mapping()
+    else:
+        try:
+            java_mapper()
+        except MapperUnavailable:
+            pass  # jobs fall back to rmlmapper.sh/.bat
+    if shacl_engine == "native":
+        compile_shapes(shapes)
+    if inference == "precomputed":
+        shapes_need_rdfs(shapes)
+
+
+class ValidationService:
+    """
+    Validates interchanges on a long-lived pool of `workers` processes
+    (default: one per CPU), with the messages of an interchange as separate
+    jobs as in run_batch. `slots` bounds the requests in progress. A worker
+    that dies (e.g. killed, or out of memory) breaks the whole pool, so a
+    broken pool is replaced by a fresh, warmed-up one.
+    """
+
+    def __init__(self, workers=None, max_pending=None, process="ProcessExample", use_java_mapper=False,
+                 split_messages=True, inference="rdfs", shacl_engine="pyshacl", direct_graph=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.process = process
+        self.split_messages = split_messages
+        self.options = {"use_java_mapper": use_java_mapper, "inference": inference,
+                        "shacl_engine": shacl_engine, "direct_graph": direct_graph}
+        self.warm = (process, use_java_mapper, inference, shacl_engine)
+        warm_up(*self.warm)  # fail early, and compile the mapping once for the workers
+        self.pool_lock = threading.Lock()
+        self.pool = self.new_pool()
+
+    def new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up, initargs=self.warm)
+
+    def replace_pool(self, broken):
+        """Replace `broken` unless another request already has."""
+        with self.pool_lock:
+            if self.pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.pool = self.new_pool()
+
+    def healthy(self):
+        """False while the pool is broken: it refuses new jobs then."""
+        try:
+            self.pool.submit(int)
+        except BrokenProcessPool:
+            return False
+        return True
+
+    def validate(self, edi_data, process=None):
+        """
+        (conforms, results, report text) of one interchange. Raises
+        NoMessage if it holds no UNH..UNT message, as there is nothing to
+        validate then.
+        """
+        interchange = split_interchange(edi_data)
+        if not interchange.messages:
+            raise NoMessage("no UNH..UNT message in the interchange")
+        kwargs = dict(self.options, process=process or self.process)
+        parts = list(interchange_parts(edi_data, self.split_messages, interchange))
+        pool = self.pool
+        try:
+            outcomes = self.run_parts(pool, parts, kwargs)
+        except BrokenProcessPool:
+            self.replace_pool(pool)
+            outcomes = self.run_parts(self.pool, parts, kwargs)
+        if all(isinstance(outcome, Exception) for number, outcome in outcomes):
+            raise outcomes[0][1]
+        if len(outcomes) == 1:
+            report = outcomes[0][1][1]
+            return report.conforms, report.results, report.text
+        conforms, results, _ = merge_outcomes(outcomes)
+        return conforms, results, merge_reports(outcomes)
+
+    @staticmethod
+    def run_parts(pool, parts, kwargs):
+        """(number, outcome) per part; raises BrokenProcessPool if the pool breaks."""
+        futures = [(number, pool.submit(validate_edifact, text, offsets, **kwargs))
+                   for number, text, offsets in parts]
+        outcomes = []
+        for number, future in futures:
+            try:
+                outcomes.append((number, future.result()))
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                outcomes.append((number, e))
+        return outcomes
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class ValidationHandler(BaseHTTPRequestHandler):
+    server_version = "edifact-val"
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            return self.send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+        service = self.server.service
+        if not service.healthy():
+            return self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"status": "unhealthy",
+                                                                   "error": "worker pool is broken"})
+        self.send_json(HTTPStatus.OK, {"status": "ok", "workers": service.workers,
+                                       "max_pending": service.max_pending})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/validate":
+            return self.send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+        service = self.server.service
+        process = parse_qs(url.query).get("process", [service.process])[0]
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            return self.send_json(HTTPStatus.LENGTH_REQUIRED, {"error": "Content-Length required"})
+        if length > MAX_BODY:
+            return self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "payload too large"})
+        data = self.rfile.read(length)
+        if not PROCESS_NAME.match(process):
+            return self.send_json(HTTPStatus.BAD_REQUEST, {"error": f"invalid process name {process!r}"})
+        try:
+            shapes_registry.check(process)
+        except (OSError, ValueError) as e:
+            return self.send_json(HTTPStatus.BAD_REQUEST, {"error": f"unknown process {process!r}: {e}"})
+
+        if not service.slots.acquire(blocking=False):
+            return self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "busy"}, {"Retry-After": "1"})
+        try:
+            conforms, results, text = service.validate(decode_edifact(data), process)
+        except NoMessage as e:
+            return self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception as e:
+            return self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+        finally:
+            service.slots.release()
+        self.send_json(HTTPStatus.OK, {"conforms": conforms,
+                                       "results": [result.to_dict() for result in results],
+                                       "report": text})
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return str(self.client_address[0]) if self.client_address else "local"
+
+
+class ValidationHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, ValidationHandler)
+        self.service = service
+
+
+class UnixValidationServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        # a socket left behind by a server that did not shut down cleanly
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        super().__init__(path, ValidationHandler)
+        self.service = service
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(service, host="127.0.0.1", port=8080, socket_path=None):
+    """Run the server until interrupted, then stop it and the worker pool."""
+    if socket_path:
+        server = UnixValidationServer(socket_path, service)
+        print(f"Validation service listening on {socket_path}")
+    else:
+        server = ValidationHTTPServer((host, port), service)
+        print(f"Validation service listening on http://{host}:{server.server_address[1]}")
+    # SIGTERM (e.g. from a service manager) stops the server like Ctrl-C
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
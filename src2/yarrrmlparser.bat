@@ -1,3 +1,9 @@
 @echo off 
+rem Usage: yarrrmlparser.bat [mapping.yarrrml] [mapping.rml.ttl]
 
-yarrrml-parser -i mapping.yarrrml -o mapping.rml.ttl
+set INPUT=%~1
+if "%INPUT%"=="" set INPUT=mapping.yarrrml
+set OUTPUT=%~2
+if "%OUTPUT%"=="" set OUTPUT=mapping.rml.ttl
+
+yarrrml-parser -i "%INPUT%" -o "%OUTPUT%"
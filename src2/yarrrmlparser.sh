@@ -1,3 +1,4 @@
 #!/bin/bash
+# Usage: yarrrmlparser.sh [mapping.yarrrml] [mapping.rml.ttl]
 
-yarrrml-parser -i mapping.yarrrml -o mapping.rml.ttl
+yarrrml-parser -i "${1:-mapping.yarrrml}" -o "${2:-mapping.rml.ttl}"